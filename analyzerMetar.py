@@ -1,7 +1,12 @@
-from collections import defaultdict
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+import calendar
+from datetime import date, datetime, timedelta
+import numpy as np
 import pandas as pd
+from cube import AvailabilityCube
+from station import StationRegistry, normalize_icao
+from timeutil import MINUTES_PER_DAY, parse_iso_wallclock
+
+SLOT_MENIT = 30  # lebar slot stasiun half-hourly (menit :00 dan :30)
 
 # ==== ANALYZE METAR (PERBAIKAN) ====
 def analyze_metar(metar_data, station_info_map, tahun, bulan, mode_interval):
@@ -11,122 +16,189 @@ def analyze_metar(metar_data, station_info_map, tahun, bulan, mode_interval):
     Stasiun half-hourly tetap dihitung 2 laporan per jam, meski paksa 1 jam.
     """
     
-    #Menyiapkan tanggal & wadah hasil
-    hasil, nomor = [], 1
+    acc = MetarAccumulator(station_info_map, tahun, bulan)
+    acc.add_page(metar_data)
+    return acc.result(mode_interval)
+
+
+class MetarAccumulator:
+    """
+    Akumulator METAR inkremental: tiap halaman data dilipat ke state begitu tiba,
+    sehingga parsing bisa berjalan bersamaan dengan fetch.
+
+    State berupa kunci integer unik (stasiun, hari, menit) — pengganti
+    harian[tanggal][cccc] = set("HH:MM") — yang dipadatkan menjadi AvailabilityCube.
+    """
+
+    def __init__(self, station_info_map, tahun, bulan):
+        self.stations = StationRegistry.from_any(station_info_map)
+        self.tahun = tahun
+        self.bulan = bulan
+        self.num_days = calendar.monthrange(tahun, bulan)[1]
+        self._station_index = pd.Index(list(self.stations), dtype=object)  # ICAO → posisi
+        self._keys = []  # array kunci unik per halaman
+
+    def add_page(self, items):
+        """Masukkan satu halaman record METAR; kembalikan tanggal (1..31) yang tersentuh."""
+        # ICAO dinormalisasi (tanpa spasi, huruf besar) seperti kunci StationRegistry
+        pairs = [
+            (normalize_icao(cccc), ts)
+            for item in items
+            if (cccc := item.get("cccc")) and (ts := item.get("timestamp_data"))
+        ]
+        if not pairs:
+            return np.empty(0, dtype=np.int64)
+        cccc, ts = zip(*pairs)
+
+        waktu = parse_iso_wallclock(ts)  # satu panggilan untuk seluruh halaman
+        posisi = self._station_index.get_indexer(pd.Index(cccc, dtype=object))
+        masuk = (
+            waktu["valid"] & (posisi >= 0)
+            & (waktu["year"] == self.tahun) & (waktu["month"] == self.bulan)
+        )
+        # kunci = ((stasiun * jumlah_hari) + hari) * 1440 + menit
+        sel = (posisi[masuk] * self.num_days + waktu["day"][masuk] - 1) * MINUTES_PER_DAY + waktu["minute"][masuk]
+        self._keys.append(np.unique(sel))
+        return np.unique(waktu["day"][masuk])
+
+    def cube(self, slot_minutes=SLOT_MENIT):
+        """AvailabilityCube [stasiun, hari, slot] dari seluruh record yang sudah masuk."""
+        keys = np.unique(np.concatenate(self._keys)) if self._keys else np.empty(0, dtype=np.int64)
+        self._keys = [keys]  # padatkan state
+        return AvailabilityCube.from_keys(
+            self._station_index, date(self.tahun, self.bulan, 1), self.num_days, keys, slot_minutes
+        )
+
+    def counts(self):
+        """
+        Hitungan per [stasiun, hari]:
+        - jumlah waktu "HH:MM" unik (dipakai stasiun hourly)
+        - jumlah slot 30 menit unik (dipakai stasiun half-hourly)
+        """
+        cube = self.cube()
+        return cube.per_day("events"), cube.per_day("slots")
+
+    def result(self, mode_interval, days=None):
+        """
+        Bangun DataFrame ketersediaan dari state saat ini.
+        days (opsional, tanggal 1..31) → hanya baris untuk tanggal tersebut (mode live).
+        """
+        n_waktu, n_slot = self.counts()
+        return _build_metar_frame(n_waktu, n_slot, self.stations, self.tahun, self.bulan, mode_interval, days=days)
+
+
+def _per_row(values, idx):
+    """Sebar nilai per-stasiun / per-hari ke tiap baris tanpa mengubah dtype hasil inferensi pandas."""
+    return pd.Series(values).take(idx).reset_index(drop=True)
+
+
+# Kode status harian METAR; teks emoji baru dirender saat membentuk kolom Catatan
+STATUS_OK, STATUS_KOSONG, STATUS_KURANG, STATUS_ANOMALI = 0, 1, 2, 3
+STATUS_LABEL = {
+    STATUS_KOSONG: "❌ Tidak ada data",
+    STATUS_KURANG: "⚠️ Kurang dari 50%",
+    STATUS_ANOMALI: "⚠️ Data anomali, melebihi ekspektasi",
+}
+
+
+def status_code(jumlah, maksimal):
+    """Kode status per baris dari jumlah laporan vs target (array)."""
+    return np.select(
+        [jumlah == 0, jumlah < maksimal * 0.5, jumlah > maksimal],
+        [STATUS_KOSONG, STATUS_KURANG, STATUS_ANOMALI],
+        STATUS_OK,
+    )
+
 
+def _catatan_text(kode_status, jam_operasi):
+    catatan = [STATUS_LABEL[kode_status]] if kode_status in STATUS_LABEL else []
+    if jam_operasi < 24:
+        catatan.append(f"🕒 Op: {jam_operasi} jam")
+    return "; ".join(catatan) if catatan else "✅ Lengkap"
+
+
+def _build_metar_frame(n_waktu, n_slot, station_info_map, tahun, bulan, mode_interval, days=None):
     start_date = datetime(tahun, bulan, 1)
-    end_date = start_date + relativedelta(months=1)
-    num_days = (end_date - start_date).days
-
-    #Mengelompokkan data mentah ke struktur harian
-    # Struktur data: harian[tanggal][cccc] = set(waktu)
-    harian = defaultdict(lambda: defaultdict(set)) # dict bertingkat
-    for item in metar_data:
-        cccc = item.get("cccc") # key level 2
-        ts = item.get("timestamp_data") # waktu asli dri data
-        if not cccc or not ts:
-            continue
-        try:
-            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            tanggal = dt.strftime("%Y-%m-%d") # key level 1
-            waktu = dt.strftime("%H:%M")  # nilai dalam set #value waktu "HH:MM" disimpan unik di dalam set.
-            harian[tanggal][cccc].add(waktu) 
-        except ValueError:
+    num_days = n_waktu.shape[1]
+    tanggal_list = [(start_date + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(num_days)]
+
+    # Atribut per stasiun dihitung sekali, bukan per hari
+    posisi, wmo, icao, nama, jam_op, interval_list, maks, half = [], [], [], [], [], [], [], []
+    for pos, (cccc, info) in enumerate(station_info_map.items()):
+        jam_operasi = info.get("jam_operasi", 24) # jam operasi default 24
+        is_half_hourly = info.get("sends_half_hourly", False) # apakah half -hourly
+
+        # Tentukan interval yang dipakai untuk analisis
+        if mode_interval == "Otomatis":
+            interval = "30 Menit" if is_half_hourly else "Interval 1 Jam"
+        else:
+            interval = mode_interval
+
+        # Skip AWOS jika interval 1 Jam
+        nama_stasiun = (info.get("stasiun") or "").strip().upper()
+        if interval == "Interval 1 Jam" and nama_stasiun.startswith("AWOS"):
             continue
 
-        #Loop tiap hari dan tiap stasiun
-    for day_offset in range(num_days):
-        tanggal_str = (start_date + timedelta(days=day_offset)).strftime("%Y-%m-%d")
-
-        for cccc, info in station_info_map.items():
-            jam_operasi = info.get("jam_operasi", 24) # jam operasi default 24
-            is_half_hourly = info.get("sends_half_hourly", False) # apakah half -hourly
-
-            # Tentukan interval yang dipakai untuk analisis
-            if mode_interval == "Otomatis":
-                interval = "30 Menit" if is_half_hourly else "Interval 1 Jam"
-            else:
-                interval = mode_interval
-
-            # Skip AWOS jika interval 1 Jam
-            nama_stasiun = (info.get("stasiun") or "").strip().upper()
-            if interval == "Interval 1 Jam" and nama_stasiun.startswith("AWOS"):
-                continue
-
-            # Frekuensi asli stasiun menentukan laporan per jam
-            laporan_per_jam = 2 if is_half_hourly else 1
-            # Stasiun half-hourly → 2 laporan per jam (mis. menit 00 dan 30).
-            # Stasiun hourly → 1 laporan per jam.
-            
-            # Sehari ada jam_operasi jam → target harian = jam_operasi * laporan_per_jam.
-            maksimal = jam_operasi * laporan_per_jam
-
-            # Menghitung jumlah laporan yang masuk
-            waktu_lapor = harian[tanggal_str].get(cccc, set())
-
-            # Hitung jumlah laporan sesuai interval
-            if laporan_per_jam == 2:  # half-hourly
-                slot = set() # agar tdk duplikat
-                for w in waktu_lapor:
-                    try:
-                        jam, menit = map(int, w.split(":")) 
-                        # w.split(":") --> Memisahkan string waktu seperti "15:14" menjadi dua bagian: ["15","14"].
-                        # map(int, ...) → Mengubah "15" dan "14" menjadi integer: jam = 15, menit = 14.
-                       
-                        menit_slot = "00" if menit < 30 else "30"                        
-                       # Menentukan slot waktu setengah jam:
-                       # menit < 30 → masuk ke slot :00
-                       # menit >= 30 → masuk ke slot :30
-
-                        slot.add(f"{jam:02d}:{menit_slot}")
-                        # Menambahkan slot ke set bernama slot.
-                        # f"{jam:02d}" memastikan jam selalu 2 digit, misal "05" bukan "5".
-                    
-                    except:
-                        continue #Jika parsing gagal (misal w bukan string waktu yang valid), abaikan saja.
-               
-                jumlah = len(slot) #Menghitung jumlah slot unik dalam satu hari
-           
-           # waktu_lapor kemungkinan adalah list yang berisi semua laporan yang masuk per jam.
-            else:  # hourly
-                jumlah = len(waktu_lapor) # len(waktu_lapor) → menghitung total laporan, tanpa mengelompokkan atau menyaring duplikasi.
-
-            # Persentase ketersediaan
-            persen = round((jumlah / maksimal) * 100, 1) if maksimal else 0
-            # if maksimal else 0, cek divisi 0 (ZeroDivisionError), jika max 0 artinya tidak ada target laporan sama sekali
-            
-            catatan = []
-            if jumlah == 0:
-                catatan.append("❌ Tidak ada data")
-            elif jumlah < maksimal * 0.5:
-                catatan.append("⚠️ Kurang dari 50%")
-            if jumlah > maksimal:
-                catatan.append("⚠️ Data anomali, melebihi ekspektasi")
-            if jam_operasi < 24:
-                catatan.append(f"🕒 Op: {jam_operasi} jam")
-
-            hasil.append({
-                "Nomor": nomor,
-                "WMO ID": str(info.get("wmo_id", "-")),
-                "Tanggal": tanggal_str,
-                "ICAO": cccc,
-                "Nama Stasiun": info.get("stasiun", "-"),
-                "Jam Operasional": jam_operasi,
-                "Interval Pengiriman": interval,
-                "Laporan Diharapkan": maksimal,
-                "Laporan Masuk": jumlah,
-                "Ketersediaan (%)": persen,
-                "Catatan": "; ".join(catatan) if catatan else "✅ Lengkap"
-            })
-            nomor += 1
-            
-    
-    df = pd.DataFrame(hasil)
+        # Frekuensi asli stasiun menentukan laporan per jam
+        # Stasiun half-hourly → 2 laporan per jam (slot :00 dan :30), hourly → 1 laporan per jam.
+        laporan_per_jam = 2 if is_half_hourly else 1
+
+        posisi.append(pos)
+        wmo.append(str(info.get("wmo_id", "-")))
+        icao.append(cccc)
+        nama.append(info.get("stasiun", "-"))
+        jam_op.append(jam_operasi)
+        interval_list.append(interval)
+        # Sehari ada jam_operasi jam → target harian = jam_operasi * laporan_per_jam.
+        maks.append(jam_operasi * laporan_per_jam)
+        half.append(laporan_per_jam == 2)
+
+    n_st = len(posisi)
+    day_idx = np.arange(num_days) if days is None else np.unique(np.asarray(days, dtype=np.int64)) - 1
+    if n_st == 0 or len(day_idx) == 0:
+        return pd.DataFrame()
+
+    # Jumlah laporan [stasiun, hari]: half-hourly pakai slot unik, hourly pakai waktu unik
+    posisi = np.asarray(posisi)
+    jumlah_st = np.where(np.asarray(half)[:, None], n_slot[posisi], n_waktu[posisi])
+
+    # Urutan baris sama seperti sebelumnya: hari di luar, stasiun di dalam
+    st_row = np.tile(np.arange(n_st), len(day_idx))
+    day_row = np.repeat(day_idx, n_st)
+    jumlah = jumlah_st[:, day_idx].T.ravel()
+    maksimal = np.asarray(maks, dtype=np.int64)[st_row]
+
+    # Persentase ketersediaan — round() Python dihitung per pasangan unik (jumlah, maksimal)
+    pasangan, inv_persen = np.unique(np.stack([jumlah, maksimal]), axis=1, return_inverse=True)
+    persen_unik = [
+        round((int(j) / int(m)) * 100, 1) if m else 0
+        for j, m in zip(pasangan[0], pasangan[1])
+    ]
+
+    # Catatan: kode status + jam operasi stasiun → teks dirender sekali per kombinasi unik
+    kode_status = status_code(jumlah, maksimal)
+    kombinasi, inv_kombinasi = np.unique(kode_status * n_st + st_row, return_inverse=True)
+    kode_catatan, kategori_catatan = pd.factorize(
+        pd.Series([_catatan_text(k // n_st, jam_op[k % n_st]) for k in kombinasi.tolist()])
+    )
+    catatan = pd.Categorical.from_codes(kode_catatan[inv_kombinasi.ravel()], categories=kategori_catatan)
+
+    df = pd.DataFrame({
+        "Nomor": day_row * n_st + st_row + 1,  # nomor tetap sama walau hanya sebagian hari dibangun
+        "WMO ID": _per_row(wmo, st_row),
+        "Tanggal": _per_row(tanggal_list, day_row),
+        "ICAO": _per_row(icao, st_row),
+        "Nama Stasiun": _per_row(nama, st_row),
+        "Jam Operasional": _per_row(jam_op, st_row),
+        "Interval Pengiriman": _per_row(interval_list, st_row),
+        "Laporan Diharapkan": _per_row(maks, st_row),
+        "Laporan Masuk": jumlah,
+        "Ketersediaan (%)": _per_row(persen_unik, inv_persen.ravel()),
+        "Catatan": catatan,
+    })
     
     # Tambahkan kolom Status Lengkap
-    df["Status Lengkap"] = df["Catatan"].apply(
-        lambda x: True if "✅ Lengkap" in str(x) else False
-    )
+    df["Status Lengkap"] = (kode_status == STATUS_OK) & (np.asarray(jam_op)[st_row] >= 24)
     
     return df
 
@@ -1,6 +1,12 @@
-from datetime import datetime
+from datetime import date, datetime
+import numpy as np
 import pandas as pd
 import calendar
+from cube import AvailabilityCube, SLOT_RESOLUTIONS
+from station import StationRegistry, station_map_manual  # station_map_manual: re-export untuk kompatibilitas
+from timeutil import parse_iso_wallclock
+
+RASON_DETAIL_COLUMNS = ["WMO ID", "Nama Stasiun", "Tanggal", "Jam", "Status Jam"]
 
 # ==== Helper Functions ====
 def kv_list_to_dict(items):
@@ -39,172 +45,248 @@ def has_obs_for(flat, hour):
     else:
         return True, "Lengkap"
 
-# ==== Record generator ====
-def iter_records(raw, tahun, bulan):
-    """Generator untuk membaca semua record RASON."""
-    if not raw:
-        return # klo data ksoong, langsung berhenti
-    
+# ==== Ekstraksi record (kolom) ====
+RASON_JAM = (("00Z", 0), ("12Z", 12))
+RASON_COLUMNS = ["date", "wmo_id", "station_name", "jam", "status"]
+
+
+def _normalize_raw(raw):
     #normalisasi data --> suapaya bs selalu di looping
     # dict dengan key items --> ambil list nya
     # list --> pakai langsung
     # 1 object --> ubah jdi list 1 elemen
-    rlist = raw.get("items", [raw]) if isinstance(raw, dict) else raw if isinstance(raw, list) else [raw]
-   
-    seen_global = set() # mencegah duplikat dengan mengingat record yg sdh diproses
+    return raw.get("items", [raw]) if isinstance(raw, dict) else raw if isinstance(raw, list) else [raw]
 
-   
-    
-    # jika item adalah dict langsung
-    for item in rlist:  # loop tiap item di data
+
+def _parse_waktu(values):
+    """
+    Parse semua timestamp sekaligus (jam dinding, seperti pd.to_datetime per nilai).
+    Nilai yang bukan ISO standar jatuh ke pd.to_datetime per nilai — jarang terjadi.
+    """
+    waktu = parse_iso_wallclock(values)
+    for i in np.flatnonzero(~waktu["valid"]):
+        dt = pd.to_datetime(values[i], errors="coerce")
+        if pd.isna(dt):
+            continue
+        waktu["year"][i], waktu["month"][i], waktu["day"][i] = dt.year, dt.month, dt.day
+        waktu["minute"][i] = dt.hour * 60 + dt.minute
+        waktu["valid"][i] = True
+    return waktu
+
+
+def _obs_status(flats, hour):
+    """
+    Versi kolom dari has_obs_for: status kelengkapan bagian A/B/C/D untuk jam tertentu,
+    dihitung untuk semua record key-value sekaligus ("Tidak Ada" / "Parsial" / "Lengkap").
+    """
+    hh = f"{hour:02d}:00"
+    cells = [f"{hh} {bagian}" for bagian in "ABCD"]
+    n_valid = np.zeros(len(flats), dtype=np.int64)
+    for k in cells:
+        vals = pd.Series([flat.get(k) for flat in flats], dtype=object)
+        stats = pd.Series([flat.get(f"{k}__status") for flat in flats], dtype=object)
+        valid = vals.notna() & ~vals.isin(["", "-", "M"]) & ~stats.isin(["missing", "no observation"])
+        n_valid += valid.to_numpy()
+    return np.select([n_valid == 0, n_valid < len(cells)], ["Tidak Ada", "Parsial"], "Lengkap")
+
+
+def extract_records(raw, tahun, bulan):
+    """
+    Ekstraksi record RASON satu halaman secara kolom.
+    Hasil: DataFrame (date, wmo_id, station_name, jam, status) urut seperti item asli
+    (00Z sebelum 12Z); duplikat (wmo_id, date, jam) di halaman ini sudah dibuang.
+    """
+    if not raw:
+        return pd.DataFrame(columns=RASON_COLUMNS) # klo data ksoong, langsung kosong
+
+    # Normalisasi ke kolom sekali jalan: item dict pakai timestamp_data,
+    # item list key-value diratakan dulu dan pakai periode
+    ts, wmo, nama, is_kv, flats = [], [], [], [], []
+    for item in _normalize_raw(raw):
         if isinstance(item, dict):
-            ts = item.get("timestamp_data")
-            dt = pd.to_datetime(ts, errors="coerce")
-            if pd.isna(dt) or dt.year != tahun or dt.month != bulan:
-                continue
-
-            wmo_id = str(item.get("station_wmo_id") or item.get("station_id") or "").strip()
-            if not wmo_id:
-                continue
-            name = item.get("station_name") or ""
-
-            for jam, hour in [("00Z", 0), ("12Z", 12)]:
-                if dt.hour == hour:
-                    key = (wmo_id, dt.date(), jam)
-                    if key in seen_global:
-                        continue
-                    seen_global.add(key)
-                    yield {
-                        "date": dt.date(),
-                        "wmo_id": wmo_id,
-                        "station_name": name,
-                        "jam": jam,
-                        "status": "Lengkap",
-                    }
-        # jika item adalah list key value
+            src, ts_key = item, "timestamp_data"
         elif isinstance(item, list):
-            flat = kv_list_to_dict(item)
-            dt = pd.to_datetime(flat.get("periode"), errors="coerce")
-            if pd.isna(dt) or dt.year != tahun or dt.month != bulan:
-                continue
-
-            wmo_id = str(flat.get("station_wmo_id") or flat.get("station_id") or "").strip()
-            if not wmo_id:
-                continue
-            name = flat.get("station_name") or ""
-
-            for jam, hour in [("00Z", 0), ("12Z", 12)]:
-                has_obs, status = has_obs_for(flat, hour)
-                key = (wmo_id, dt.date(), jam)
-                if has_obs and key not in seen_global: #“Kalau ada data observasi dan record ini belum tercatat, lanjut proses.”
-                    seen_global.add(key)
-                    yield { #Menghasilkan satu record RASON berupa dictionary:
-                        "date": dt.date(),
-                        "wmo_id": wmo_id,
-                        "station_name": name,
-                        "jam": jam,
-                        "status": status,
-                    }
-
-# ==== Manual mapping WMO → Nama Stasiun (fallback) ====
-station_map_manual = {
-    "96035": "Stasiun Meteorologi Kualanamu",
-    "96147": "Stasiun Meteorologi Ranai",
-    "96237": "Stasiun Meteorologi Depati Amir",
-    "96253": "Stasiun Meteorologi Fatmawati Soekarno",
-    "96509": "Stasiun Meteorologi Juwata",
-    "96581": "Stasiun Meteorologi Supadio",
-    "96633": "Stasiun Meteorologi Sultan Aji Muhammad Sulaiman Sepinggan",
-    "96645": "Stasiun Meteorologi Iskandar",
-
-    "96685": "Stasiun Meteorologi Syamsudin Noor",
-    "96749": "Stasiun Meteorologi Soekarno Hatta",
-    "96805": "Stasiun Meteorologi Tunggul wulung",
-    
-    "96935": "Stasiun Meteorologi Juanda",
-    "97230": "Stasiun Meteorologi I Gusti Ngurah Rai",
-    "97372": "Stasiun Meteorologi Eltari",
-    
-    "97502": "Stasiun Meteorologi Domine Eduard Osok",
-    "97560": "Stasiun Meteorologi Frans Kaisiepo",
-    "97690": "Stasiun Meteorologi Sentani",
-    "97980": "Stasiun Meteorologi Mopah",
-    "97686": "Stasiun Meteorologi Wamena",
-    "97300": "Stasiun Meteorologi Fransiskus Xaverius Seda"
-  
-    
-}
-
-def get_station_name_combined(wmo_id, station_info_map):
-    # Cek di mapping otomatis (BMKG)
-    if station_info_map:
-        for icao, info in station_info_map.items():
-            if str(info.get("wmo_id")) == str(wmo_id):
-                return info.get("stasiun") or info.get("station_name") or f"Stasiun {wmo_id}"
-    # Fallback manual
-    return station_map_manual.get(wmo_id, f"Stasiun {wmo_id or 'Unknown'}")
-
-
-# Tambahkan catatan status
-def status_bulanan(row):
-    if row["Jumlah Laporan"] == row["Target Bulanan"]:
-        return "✅ Lengkap"
-    elif row["Jumlah Laporan"] > row["Target Bulanan"]:
-        return "⚠️ Anomali"
-    elif 0 < row["Jumlah Laporan"] < row["Target Bulanan"]:
-        return "⚠️ Parsial"
-    else:
-        return "❌ Tidak Ada Data"
-        
+            src, ts_key = kv_list_to_dict(item), "periode"
+        else:
+            continue
+        ts.append(src.get(ts_key))
+        wmo.append(str(src.get("station_wmo_id") or src.get("station_id") or "").strip())
+        nama.append(src.get("station_name") or "")
+        is_kv.append(ts_key == "periode")
+        flats.append(src if ts_key == "periode" else {})
+
+    if not ts:
+        return pd.DataFrame(columns=RASON_COLUMNS)
+
+    waktu = _parse_waktu(ts)
+    wmo = np.asarray(wmo, dtype=object)
+    is_kv = np.asarray(is_kv, dtype=bool)
+    masuk = (
+        waktu["valid"] & (waktu["year"] == tahun) & (waktu["month"] == bulan) & (wmo != "")
+    )
+    jam_obs = waktu["minute"] // 60
+
+    # Tanggal sebagai datetime.date, lewat tabel hari → date
+    jumlah_hari = calendar.monthrange(tahun, bulan)[1]
+    tanggal = np.empty(32, dtype=object)
+    tanggal[1:jumlah_hari + 1] = [date(tahun, bulan, d) for d in range(1, jumlah_hari + 1)]
+    tanggal_rec = tanggal[np.where(masuk, waktu["day"], 0)]
+
+    kandidat = []
+    for urutan_jam, (jam, hour) in enumerate(RASON_JAM):
+        # dict → Lengkap bila jam pengamatan cocok; key-value → kelengkapan bagian A/B/C/D
+        status = np.where(is_kv, _obs_status(flats, hour), np.where(jam_obs == hour, "Lengkap", "Tidak Ada"))
+        pilih = np.flatnonzero(masuk & (status != "Tidak Ada"))
+        kandidat.append(pd.DataFrame({
+            "urutan": pilih * len(RASON_JAM) + urutan_jam,
+            "date": tanggal_rec[pilih],
+            "wmo_id": wmo[pilih],
+            "station_name": [nama[i] for i in pilih],
+            "jam": jam,
+            "status": status[pilih],
+        }))
+
+    # Urutkan seperti urutan item asli (00Z sebelum 12Z), lalu buang duplikat
+    records = (
+        pd.concat(kandidat, ignore_index=True)
+        .sort_values("urutan", kind="stable")
+        .drop_duplicates(subset=["wmo_id", "date", "jam"], keep="first")
+    )
+    return records[RASON_COLUMNS].reset_index(drop=True)
+
+
+# Kode status bulanan → label (urutan = kode)
+STATUS_BULANAN_LABELS = ["❌ Tidak Ada Data", "⚠️ Parsial", "✅ Lengkap", "⚠️ Anomali"]
+
+
+def status_bulanan_code(jumlah, target):
+    """Kode status bulanan per stasiun (array) dari jumlah laporan vs target: indeks ke STATUS_BULANAN_LABELS."""
+    return np.select(
+        [jumlah == target, jumlah > target, (jumlah > 0) & (jumlah < target)],
+        [2, 3, 1],
+        0,
+    )
+
+
 # ==== Main Analysis Function ====
 def analyze_rason(rason_data, station_info_map, tahun, bulan):
-    # membuat list record
-    rows = [] # membuat list kosong, nnti list akan di isi dengan record, setiap record itu dictionary {}
-    for rec in iter_records(rason_data, tahun, bulan):
-        wmo_id = rec["wmo_id"] #Ambil kode stasiun dari record
-        nama = rec.get("station_name") or get_station_name_combined(wmo_id, station_info_map) 
+    acc = RasonAccumulator(station_info_map, tahun, bulan)
+    acc.add_page(rason_data)
+    return acc.result()
+
+
+class RasonAccumulator:
+    """
+    Akumulator RASON inkremental: tiap halaman data langsung diekstrak menjadi
+    record (stasiun, tanggal, jam); duplikat lintas halaman dibuang dengan drop_duplicates.
+    """
+
+    def __init__(self, station_info_map, tahun, bulan):
+        self.stations = StationRegistry.from_any(station_info_map)
+        self.tahun = tahun
+        self.bulan = bulan
+        self._pages = [] # DataFrame record per halaman, digabung saat detail() dipanggil
+
+    def add_page(self, raw):
+        """Masukkan satu halaman data RASON mentah; kembalikan tanggal (1..31) yang tersentuh."""
+        rec = extract_records(raw, self.tahun, self.bulan)
+        if rec.empty:
+            return np.empty(0, dtype=np.int64)
+
         # ambil nama stasiun dari record, klo ga ada akan fallback mapping otomatis atau manual
-        
-        #membuat dict baru berisi info penting dari record, kemudian ditambahkan ke list rows
-        # jadi rows = list dari dict
-        # rows = kumpulan semua record siap pakai untuk dianalisis
-        rows.append({
-            "WMO ID": wmo_id,
+        fallback = {w: self.stations.name_for_wmo(w) for w in rec["wmo_id"].unique()}
+        nama = [n or fallback[w] for n, w in zip(rec["station_name"], rec["wmo_id"])]
+
+        self._pages.append(pd.DataFrame({
+            "WMO ID": rec["wmo_id"].tolist(),
             "Nama Stasiun": nama,
-            "Tanggal": rec["date"],
-            "Jam": rec["jam"],
-            "Status Jam": rec["status"],
-        })
+            "Tanggal": rec["date"].tolist(),
+            "Jam": rec["jam"].tolist(),
+            "Status Jam": rec["status"].tolist(),
+        }))
+        return np.unique([d.day for d in rec["date"]])
 
-    #jika data tidak ada, buat df kosong dengan kolom yg sesuai, agar aplikasi atau analisis selanjutnya tetap berjalan tanpa error
-    if not rows:
-        empty_harian = pd.DataFrame(columns=["WMO ID","Nama Stasiun","Tanggal","00Z","12Z","Jumlah Laporan"])
-        empty_bulanan = pd.DataFrame(columns=["WMO ID","Nama Stasiun","Bulan","Jumlah Laporan","Target Bulanan","Ketersediaan (%)","Catatan"])
-        return empty_harian, empty_bulanan
+    def detail(self):
+        """Semua record unik (WMO ID, Tanggal, Jam) yang sudah masuk, urut kedatangan."""
+        if not self._pages:
+            return pd.DataFrame(columns=RASON_DETAIL_COLUMNS)
+        detail = (
+            pd.concat(self._pages, ignore_index=True)
+            .drop_duplicates(subset=["WMO ID", "Tanggal", "Jam"], keep="first")
+            .reset_index(drop=True)
+        )
+        self._pages = [detail]  # padatkan state
+        return detail
 
-    df_rason_detail = pd.DataFrame(rows)
+    def result(self, days=None):
+        """
+        Bangun rekap harian dan bulanan dari record yang sudah terkumpul.
+        days (opsional, tanggal 1..31) → rekap harian & bulanan hanya dari tanggal tersebut (mode live);
+        rekap bulanan sebulan penuh disusun ulang dari gabungan harian lewat build_rason_bulanan.
+        """
+        detail = self.detail()
+        if days is not None:
+            tanggal = {date(self.tahun, self.bulan, int(d)) for d in days}
+            detail = detail[detail["Tanggal"].isin(tanggal)]
+        return _build_rason_frames(detail, self.tahun, self.bulan)
 
-    # ==== Rekap Harian ====
-    # df_rason_detail → tabel berisi semua record harian 
-    df_rason_harian = df_rason_detail.pivot_table(
-        index=["WMO ID","Nama Stasiun","Tanggal"],
-        columns="Jam",
-        values="Status Jam",
-        aggfunc="first"
-    ).reset_index()
-    df_rason_harian = df_rason_harian.rename_axis(None, axis=1)
 
-    # Pastikan kolom 00Z dan 12Z ada
-    for jam in ["00Z","12Z"]: # jika salah satu jam tidak ada karena data kosong
-        if jam not in df_rason_harian.columns:
-            df_rason_harian[jam] = None # buat kolom baru dengan isi NONE, agar tdk error
+def _build_rason_frames(df_rason_detail, tahun, bulan):
+    df_rason_harian = _build_rason_harian(df_rason_detail, tahun, bulan)
+    return df_rason_harian, build_rason_bulanan(df_rason_harian, tahun, bulan)
+
 
-    # Hitung jumlah laporan harian
-    df_rason_harian["Jumlah Laporan"] = df_rason_harian[["00Z","12Z"]].apply(
-        lambda x: sum(v in ["Lengkap","Parsial"] for v in x), axis=1
+def rason_cube(df_rason_detail, tahun, bulan):
+    """
+    AvailabilityCube [stasiun, hari, 00Z/12Z] dari record detail RASON.
+    Stasiun = pasangan (WMO ID, Nama Stasiun) terurut; kembalikan juga posisi sel tiap record.
+    """
+    kunci = pd.MultiIndex.from_frame(df_rason_detail[["WMO ID", "Nama Stasiun"]])
+    st_pos, stasiun = kunci.factorize(sort=True)
+    hari = np.asarray([t.day - 1 for t in df_rason_detail["Tanggal"]], dtype=np.int64)
+    menit = df_rason_detail["Jam"].map({jam: hour * 60 for jam, hour in RASON_JAM}).to_numpy(dtype=np.int64)
+    cube = AvailabilityCube.from_events(
+        stasiun.to_list(), date(tahun, bulan, 1), calendar.monthrange(tahun, bulan)[1],
+        st_pos, hari, menit, slot_minutes=SLOT_RESOLUTIONS["00Z/12Z"], distinct=False,
     )
+    return cube, (st_pos, hari, menit // cube.slot_minutes)
+
+
+def _build_rason_harian(df_rason_detail, tahun, bulan):
+    #jika data tidak ada, buat df kosong dengan kolom yg sesuai, agar aplikasi atau analisis selanjutnya tetap berjalan tanpa error
+    if df_rason_detail.empty:
+        return pd.DataFrame(columns=["WMO ID","Nama Stasiun","Tanggal","00Z","12Z","Jumlah Laporan"])
+
+    # ==== Rekap Harian ====
+    # Record detail sudah unik per (WMO ID, Tanggal, Jam) → satu record = satu sel cube
+    cube, sel = rason_cube(df_rason_detail, tahun, bulan)
+    status = np.full(cube.data.shape, None, dtype=object) # status per sel, None = tidak ada laporan
+    status[sel] = df_rason_detail["Status Jam"].to_numpy(dtype=object)
+
+    # Hitung jumlah laporan harian; hanya pasangan (stasiun, hari) yang punya laporan yang ditampilkan
+    jumlah = cube.per_day("slots")
+    st_pos, hari = np.nonzero(jumlah)
+    stasiun = cube.stations
+    tanggal = np.asarray([date(tahun, bulan, d + 1) for d in range(cube.num_days)], dtype=object)
+
+    df_rason_harian = pd.DataFrame({
+        "WMO ID": [w for w, _ in stasiun[st_pos]],
+        "Nama Stasiun": [n for _, n in stasiun[st_pos]],
+        "Tanggal": tanggal[hari].tolist(),
+        "00Z": status[st_pos, hari, 0],
+        "12Z": status[st_pos, hari, 1],
+        "Jumlah Laporan": jumlah[st_pos, hari],
+    })
     # df_rason_harian["Status Lengkap"] = (df_rason_harian["Jumlah Laporan"] == 2)
 
+    return df_rason_harian
+
+
+def build_rason_bulanan(df_rason_harian, tahun, bulan):
+    """Rekap bulanan per stasiun dari rekap harian (dipakai juga untuk menyusun ulang hasil mode live)."""
+    if df_rason_harian.empty:
+        return pd.DataFrame(columns=["WMO ID","Nama Stasiun","Bulan","Jumlah Laporan","Target Bulanan","Ketersediaan (%)","Catatan"])
+
     # ==== Rekap Bulanan ====
     jumlah_hari_bulan = calendar.monthrange(tahun, bulan)[1]
     target_bulanan = jumlah_hari_bulan * 2
@@ -217,10 +299,10 @@ def analyze_rason(rason_data, station_info_map, tahun, bulan):
     # df_rason_bulanan["Status Lengkap"] = df_rason_bulanan["Jumlah_Laporan"] >= target_bulanan
     df_rason_bulanan = df_rason_bulanan.rename(columns={"Jumlah_Laporan":"Jumlah Laporan"})
 
-        
-    df_rason_bulanan["Catatan"] = df_rason_bulanan.apply(status_bulanan, axis=1)
-    # Pastikan tipe kolom string agar emoji tampil
-    df_rason_bulanan["Catatan"] = df_rason_bulanan["Catatan"].astype(str)
+
+    # Catatan disimpan sebagai kategori: kode status, teks emoji hanya di daftar kategori
+    kode = status_bulanan_code(df_rason_bulanan["Jumlah Laporan"].to_numpy(), target_bulanan)
+    df_rason_bulanan["Catatan"] = pd.Categorical.from_codes(kode, categories=STATUS_BULANAN_LABELS)
     
-    return df_rason_harian, df_rason_bulanan
+    return df_rason_bulanan
 
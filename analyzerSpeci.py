@@ -1,6 +1,13 @@
-from collections import defaultdict # mirip dict tpi klo key blm ada, otomatis buat nilai default
-from datetime import datetime
+import calendar
+from datetime import date
+import numpy as np
 import pandas as pd
+from cube import AvailabilityCube, SLOT_RESOLUTIONS
+from station import StationRegistry
+from timeutil import MINUTES_PER_DAY, parse_iso_wallclock
+
+SPECI_HARIAN_COLUMNS = ["WMO ID", "ICAO", "Nama Stasiun", "Tanggal", "Jumlah SPECI Harian"]
+SPECI_BULANAN_COLUMNS = ["WMO ID", "ICAO", "Nama Stasiun", "Jumlah SPECI Bulanan", "Jam Puncak (UTC)"]
 
 # ==== ANALYZE SPECI ====
 def analyze_speci(speci_data, station_info_map, tahun, bulan):
@@ -8,67 +15,112 @@ def analyze_speci(speci_data, station_info_map, tahun, bulan):
     Analisis SPECI: menghasilkan DataFrame harian dan bulanan.
     Fallback mapping digunakan agar nama stasiun tetap muncul walaupun WMO ID atau ICAO kosong.
     """
-    if not speci_data:
-        print("[WARNING] Data SPECI kosong.")
-        return pd.DataFrame(), pd.DataFrame()
-
-    # Hitung jumlah laporan harian dan bulanan
-    jumlah_per_stasiun_harian = defaultdict(lambda: defaultdict(int)) #menyimpan jumlah laporan per stasiun per tanggal
-    jumlah_per_stasiun_bulanan = defaultdict(int) #menyimpan total laporan per stasiun untuk bulan itu
-
-
-# loop record speci
-    for item in speci_data:
-        cccc = (item.get("cccc") or "").strip().upper()
-        # sid = item.get("station_id") or item.get("wmo_id")
-
-        # skip kalau ICAO tidak valid
-        if not cccc or cccc not in station_info_map:
-            continue
-
-        ts = item.get("timestamp_data")
-        if not cccc or not ts:
-            continue
-        #Kalau ICAO kosong atau tidak ada di mapping stasiun,
-        #Maka lewatkan record ini dan langsung ke record SPECI berikutnya.
-
-        try:
-            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            if dt.year == tahun and dt.month == bulan:
-                tanggal = dt.strftime("%Y-%m-%d")
-                jumlah_per_stasiun_harian[cccc][tanggal] += 1 #dictionary bertingkat
-                jumlah_per_stasiun_bulanan[cccc] += 1 #dictionary biasa
-        except Exception:
-            continue
+    acc = SpeciAccumulator(station_info_map, tahun, bulan)
+    acc.add_page(speci_data or [])
+    return acc.result()
+
+
+class SpeciAccumulator:
+    """
+    Akumulator SPECI inkremental: tiap halaman data diproses per kolom lalu
+    dijumlahkan ke array hitungan [stasiun, hari, jam].
+    """
+
+    def __init__(self, station_info_map, tahun, bulan):
+        self.stations = StationRegistry.from_any(station_info_map)
+        self.tahun = tahun
+        self.bulan = bulan
+        self.num_days = calendar.monthrange(tahun, bulan)[1]
+        self.jumlah_record = 0  # total record mentah yang sudah diterima
+        self._station_index = pd.Index(list(self.stations), dtype=object)  # ICAO → posisi
+        self._slot_minutes = SLOT_RESOLUTIONS["1 Jam"]
+        # Hitungan laporan per stasiun per hari per jam; harian & bulanan = jumlah sumbu
+        self._counts = np.zeros(
+            len(self._station_index) * self.num_days * (MINUTES_PER_DAY // self._slot_minutes),
+            dtype=np.int64,
+        )
+
+    def add_page(self, items):
+        """Masukkan satu halaman record SPECI ke array hitungan; kembalikan tanggal yang tersentuh."""
+        self.jumlah_record += len(items)
+        if not items:
+            return np.empty(0, dtype=np.int64)
+
+        # Normalisasi ICAO sekaligus (tanpa spasi, huruf besar)
+        cccc = pd.Series([item.get("cccc") or "" for item in items], dtype=object).astype(str).str.strip().str.upper()
+        posisi = self._station_index.get_indexer(cccc)
+
+        # skip kalau ICAO tidak valid / tidak ada di mapping stasiun, atau timestamp di luar bulan
+        waktu = parse_iso_wallclock([item.get("timestamp_data") for item in items])
+        masuk = (
+            (posisi >= 0) & waktu["valid"]
+            & (waktu["year"] == self.tahun) & (waktu["month"] == self.bulan)
+        )
+        n_slot = MINUTES_PER_DAY // self._slot_minutes
+        sel = (
+            (posisi[masuk] * self.num_days + waktu["day"][masuk] - 1) * n_slot
+            + waktu["minute"][masuk] // self._slot_minutes
+        )
+        self._counts += np.bincount(sel, minlength=self._counts.size)
+        return np.unique(waktu["day"][masuk])
+
+    def cube(self):
+        """AvailabilityCube [stasiun, hari, jam] berisi jumlah record SPECI."""
+        data = self._counts.reshape(len(self._station_index), self.num_days, -1)
+        return AvailabilityCube(
+            self._station_index, date(self.tahun, self.bulan, 1),
+            data.astype(np.min_scalar_type(max(int(data.max(initial=0)), 1))),
+            self._slot_minutes,
+        )
+
+    def result(self, days=None):
+        """
+        Bangun DataFrame harian dan bulanan dari hitungan saat ini.
+        days (opsional, tanggal 1..31) → tabel harian hanya untuk tanggal tersebut (mode live).
+        """
+        if not self.jumlah_record:
+            print("[WARNING] Data SPECI kosong.")
+            return pd.DataFrame(), pd.DataFrame()
+        return _build_speci_frames(self.cube(), self.stations, days=days)
+
+
+def _build_speci_frames(cube, station_info_map, days=None):
+    # Hitungan harian [stasiun, hari]; hanya pasangan yang punya laporan yang ditampilkan
+    harian = cube.per_day("events")
+    terpilih = harian
+    if days is not None:
+        terpilih = np.zeros_like(harian)
+        kolom = np.unique(np.asarray(days, dtype=np.int64)) - 1
+        terpilih[:, kolom] = harian[:, kolom]
+    st_pos, hari = np.nonzero(terpilih)
+    bulanan = cube.per_station("events")
+    st_bulanan = np.flatnonzero(bulanan)
+    # Jam (UTC) dengan SPECI terbanyak sebulan, dari agregat per jam [stasiun, 24]
+    jam_puncak = cube.per_hour_of_day("events").argmax(axis=1)
+
+    # Atribut stasiun sebagai kolom, diambil per posisi
+    icao = cube.stations
+    info = [station_info_map.get(c, {}) for c in icao]
+    wmo = np.asarray([str(i.get("wmo_id", "-")) for i in info], dtype=object)
+    nama = np.asarray([i.get("stasiun", "-") for i in info], dtype=object)
+    tanggal = np.asarray(cube.dates, dtype=object)
 
     # DataFrame Harian
-    harian_records = [] #membuat list kosong yang nanti berisi list of dict
-    for cccc, tanggal_counts in jumlah_per_stasiun_harian.items():
-        info = station_info_map.get(cccc, {})
-        for tanggal, jumlah in tanggal_counts.items():
-            harian_records.append({
-                "WMO ID": str(info.get("wmo_id", "-")),
-                "ICAO": cccc,
-                "Nama Stasiun": info.get("stasiun", "-"),
-                "Tanggal": tanggal,
-                "Jumlah SPECI Harian": jumlah,
-            })
-
-    df_harian = pd.DataFrame(harian_records).sort_values(["ICAO", "Tanggal"]).reset_index(drop=True)
+    df_harian = pd.DataFrame({
+        "WMO ID": wmo[st_pos].tolist(),
+        "ICAO": icao[st_pos].tolist(),
+        "Nama Stasiun": nama[st_pos].tolist(),
+        "Tanggal": tanggal[hari].tolist(),
+        "Jumlah SPECI Harian": harian[st_pos, hari],
+    }, columns=SPECI_HARIAN_COLUMNS).sort_values(["ICAO", "Tanggal"]).reset_index(drop=True)
 
     # DataFrame Bulanan
-    bulanan_records = []
-    for cccc, jumlah in jumlah_per_stasiun_bulanan.items():
-        info = station_info_map.get(cccc, {})
-        bulanan_records.append({
-            "WMO ID": str(info.get("wmo_id", "-")),
-            "ICAO": cccc,
-            "Nama Stasiun": info.get("stasiun", "-"),
-            "Jumlah SPECI Bulanan": jumlah,
-        })
-
-    df_bulanan = pd.DataFrame(bulanan_records).sort_values("ICAO").reset_index(drop=True)
+    df_bulanan = pd.DataFrame({
+        "WMO ID": wmo[st_bulanan].tolist(),
+        "ICAO": icao[st_bulanan].tolist(),
+        "Nama Stasiun": nama[st_bulanan].tolist(),
+        "Jumlah SPECI Bulanan": bulanan[st_bulanan],
+        "Jam Puncak (UTC)": [f"{jam:02d}:00" for jam in jam_puncak[st_bulanan].tolist()],
+    }, columns=SPECI_BULANAN_COLUMNS).sort_values("ICAO").reset_index(drop=True)
 
     return df_harian, df_bulanan
-
-
@@ -1,44 +1,84 @@
 # libraries
 
 import streamlit as st
-import asyncio, nest_asyncio, aiohttp
+import time
 import pandas as pd
 import numpy as np
 import calendar
-import re
-from io import BytesIO
-import zipfile
 
+from async_executor import add_progress_total, advance_progress, executor, run_untracked
 from auth import get_bmkg_token
-from station import fetch_all_stations_info
-from fetcher import fetch_gts_data
-from runner import fetch_and_analyze_metar, fetch_and_analyze_speci, fetch_and_analyze_rason
+from http_session import get_session
+from station import fetch_all_stations_info, station_cache
+from store import fetch_gts_data_stored, is_closed_month
+from runner import fetch_and_analyze_metar, fetch_and_analyze_speci, fetch_and_analyze_rason, run_full_analysis, is_complete
+from runner import live_analyze_metar, live_analyze_rason, live_analyze_speci
+from export import build_png_zip, deferred_csv, deferred_excel
+from filter_index import filter_index, take_rows
+from memo import invalidate as invalidate_memo
+from table_view import paginated_table
+from trend import trend_table, missing_months, TREND_MONTHS
 from viz import show_metar_visualizations, show_speci_visualizations, show_rason_visualizations
 from streamlit_option_menu import option_menu
 
 
 
 # --- WRAPPERS ---
-async def fetch_and_analyze_metar_wrapper(tahun, bulan, mode, station_info_map):
-    token = await get_bmkg_token()
-    async with aiohttp.ClientSession() as session:
-        return await fetch_and_analyze_metar(
-            token, session, tahun, bulan, mode, station_info_map, fetch_gts_data
-        )
+# Semua wrapper memakai satu ClientSession bersama (http_session) → koneksi keep-alive
+# ke BMKG SATU dipakai ulang, tidak ada handshake TLS baru di tiap analisis.
+# live=True (hanya bulan berjalan) → ambil data baru sejak pembaruan terakhir saja.
+async def fetch_and_analyze_metar_wrapper(tahun, bulan, mode, station_info_map, live=False):
+    session = await get_session()
+    token = await get_bmkg_token(session)
+    if live:
+        return await live_analyze_metar(token, session, tahun, bulan, mode, station_info_map)
+    return await fetch_and_analyze_metar(
+        token, session, tahun, bulan, mode, station_info_map, fetch_gts_data_stored
+    )
 
-async def fetch_and_analyze_rason_wrapper(tahun, bulan, station_info_map):
-    token = await get_bmkg_token()
-    async with aiohttp.ClientSession() as session:
-        return await fetch_and_analyze_rason(
-            token, session, tahun, bulan, station_info_map, fetch_gts_data
-        )
+async def fetch_and_analyze_rason_wrapper(tahun, bulan, station_info_map, live=False):
+    session = await get_session()
+    token = await get_bmkg_token(session)
+    if live:
+        return await live_analyze_rason(token, session, tahun, bulan, station_info_map)
+    return await fetch_and_analyze_rason(
+        token, session, tahun, bulan, station_info_map, fetch_gts_data_stored
+    )
 
-async def fetch_and_analyze_speci_wrapper(tahun, bulan, station_info_map):
-    token = await get_bmkg_token()
-    async with aiohttp.ClientSession() as session:
-        return await fetch_and_analyze_speci(
-            token, session, tahun, bulan, station_info_map, fetch_gts_data
-        )
+async def fetch_and_analyze_speci_wrapper(tahun, bulan, station_info_map, live=False):
+    session = await get_session()
+    token = await get_bmkg_token(session)
+    if live:
+        return await live_analyze_speci(token, session, tahun, bulan, station_info_map)
+    return await fetch_and_analyze_speci(
+        token, session, tahun, bulan, station_info_map, fetch_gts_data_stored
+    )
+
+async def run_full_analysis_wrapper(tahun, bulan, mode, station_info_map):
+    session = await get_session()
+    token = await get_bmkg_token(session)
+    return await run_full_analysis(
+        tahun, bulan, mode, token, session, fetch_gts_data_stored, station_info_map
+    )
+
+async def backfill_aggregates_wrapper(daftar_bulan, mode, station_info_map):
+    """
+    Analisis gabungan untuk tiap (tahun, bulan) yang belum punya agregat tren,
+    satu per satu; progres job dihitung per bulan. Hasil: list (tahun, bulan, error) yang gagal.
+    """
+    session = await get_session()
+    token = await get_bmkg_token(session)
+    add_progress_total(len(daftar_bulan))
+    gagal = []
+    for th, bl in daftar_bulan:
+        try:
+            await run_untracked(run_full_analysis(
+                th, bl, mode, token, session, fetch_gts_data_stored, station_info_map
+            ))
+        except Exception as e:
+            gagal.append((th, bl, e))
+        advance_progress()
+    return gagal
         
 # --- Page Config ---        
 st.set_page_config(page_title="Analisis Ketersediaan Data Cuaca BMKG", layout="wide")
@@ -72,42 +112,84 @@ st.markdown("""
 
 
 # ======= Fungsi Async Wrapper =======
-# Streamlit tidak bisa langsung menjalankan fungsi async
-# Fungsi ini membuat kita bisa memanggil fungsi async secara sinkron   
-nest_asyncio.apply()
-
-def run_async(func, *args, **kwargs):
-    """Menjalankan fungsi async secara sinkron di Streamlit"""
-    loop = asyncio.get_event_loop()
-    return loop.run_until_complete(func(*args, **kwargs))
+# Streamlit tidak bisa langsung menjalankan fungsi async.
+# Semua coroutine dijalankan di satu event loop latar bersama (async_executor),
+# jadi fetch dari banyak user berjalan bersamaan dan thread script tidak memblok loop.
+# Analisis dikirim sebagai job yang disimpan di session_state: tetap berjalan walau
+# script di-rerun, menampilkan progres, dan dibatalkan kalau bulan / tab berubah.
+JOB_POLL_INTERVAL = 0.5  # detik antar rerun selama job masih berjalan
+JOB_TABS = {  # nama job → tab yang memilikinya
+    "METAR": "METAR",
+    "RASON": "RASON",
+    "SPECI": "SPECI",
+    "RINGKASAN": "RINGKASAN",
+    "RINGKASAN_AGREGAT": "RINGKASAN",
+}
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def start_job(name, params, func, *args, **kwargs):
+    """Kirim analisis ke loop latar; job lama dengan nama yang sama dibatalkan"""
+    cancel_job(name)
+    st.session_state[f"job_{name}"] = executor.submit(func(*args, **kwargs), label=name, params=params)
+
+def cancel_job(name):
+    job = st.session_state.pop(f"job_{name}", None)
+    if job is not None and not job.done():
+        job.cancel()
+
+def poll_job(name, params, pesan):
+    """
+    Cek job analisis `name`:
+    - job untuk pilihan lain (bulan / mode berubah) → dibatalkan
+    - masih berjalan → tampilkan progres + tombol batal, lalu rerun sebentar lagi
+    - selesai → (True, hasil); exception dari job diteruskan ke pemanggil
+    Kalau tidak ada hasil baru → (False, None).
+    """
+    job = st.session_state.get(f"job_{name}")
+    if job is None:
+        return False, None
+    if job.params != params:
+        cancel_job(name)
+        st.info("Analisis sebelumnya dibatalkan karena pilihan berubah.")
+        return False, None
+
+    if not job.done():
+        st.progress(job.progress, text=f"{pesan} ({job.elapsed:.0f} detik)")
+        if st.button("✖️ Batalkan", key=f"batal_{name}"):
+            cancel_job(name)
+            st.rerun()
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+    st.session_state.pop(f"job_{name}", None)
+    if job.cancelled():
+        return False, None
+    return True, job.result()
 
 async def get_stations_wrapper():
+    session = await get_session()
     try:
-        token = await get_bmkg_token()
+        token = await get_bmkg_token(session)
     except Exception as e:
         import traceback
         print("DEBUG LOGIN BMKG:", e)
         traceback.print_exc()
         raise 
-    async with aiohttp.ClientSession() as session:
-            stations = await fetch_all_stations_info(token, session)
+    stations = await fetch_all_stations_info(token, session)
     return stations
 
         
-# Ambil daftar stasiun sekali di awal aplikasi
-# Disimpan di session_state supaya bisa digunakan di seluruh tab
+# Ambil daftar stasiun dari cache bersama (memori proses + disk, dengan TTL).
+# Salinan lama tetap dipakai selama refresh berjalan di latar, jadi halaman
+# tidak perlu menunggu BMKG kecuali saat cache benar-benar kosong.
 
-if "stations_list_global" not in st.session_state:
+try:
     with st.spinner("Mengambil daftar stasiun..."):
-        try:
-            # Jalankan coroutine secara sinkron di Streamlit
-            st.session_state["stations_list_global"] = run_async(get_stations_wrapper)
-        except Exception as e:
-            st.error(f"Gagal mengambil daftar stasiun: {e}")
-            st.session_state["stations_list_global"] = {}
+        stations_list_global = station_cache.get(get_stations_wrapper)
+except Exception as e:
+    st.error(f"Gagal mengambil daftar stasiun: {e}")
+    stations_list_global = {}
 
-# Ambil dari session_state
-stations_list_global = st.session_state.get("stations_list_global", {})
 # Buat mapping ICAO untuk analisis
 station_info_map = stations_list_global
 
@@ -137,8 +219,8 @@ with st.sidebar:
 
     menu = option_menu(
         menu_title=None,
-        options=["METAR", "RASON", "SPECI"],
-        icons=["cloud", "bar-chart", "activity"],
+        options=["METAR", "RASON", "SPECI", "RINGKASAN"],
+        icons=["cloud", "bar-chart", "activity", "clipboard-data"],
         menu_icon="cast",
         default_index=0,
         styles={
@@ -167,6 +249,17 @@ with st.sidebar:
         }
     )
 
+    # Ganti tab → analisis yang masih berjalan di tab lain dibatalkan
+    for nama_job, tab in JOB_TABS.items():
+        if tab != menu:
+            cancel_job(nama_job)
+
+    # Hasil fetch & analisis di-memo untuk seluruh proses (memo.py);
+    # tombol ini membuang cache supaya analisis berikutnya mengambil ulang dari BMKG.
+    if st.button("🔄 Muat Ulang Data", use_container_width=True, key="memo_invalidate"):
+        jumlah = invalidate_memo()
+        st.toast(f"{jumlah} hasil tersimpan dibuang, analisis berikutnya mengambil ulang data.")
+
 
 # --- PENJELASAN MENU ---
 penjelasan = {
@@ -197,6 +290,16 @@ penjelasan = {
             "Formatnya mirip dengan METAR, namun fokus pada kondisi cuaca yang memerlukan perhatian segera, "
             "sehingga penting untuk pemantauan keselamatan dan peringatan dini."
         )
+    },
+    "RINGKASAN": {
+        "judul": "Ringkasan Bulanan METAR • RASON • SPECI",
+        "lengkap": (
+            "Analisis gabungan untuk laporan bulanan: data METAR, RASON, dan SPECI diambil bersamaan "
+            "dalam satu kali proses, lalu dianalisis paralel. Hasilnya berupa rapor per stasiun yang "
+            "berisi ketersediaan METAR, ketersediaan RASON, dan jumlah SPECI pada bulan yang dipilih. "
+            "Bulan yang sudah lewat disimpan sebagai agregat, sehingga tren 3/6/12 bulan, perbandingan "
+            "dengan tahun lalu, dan peringkat stasiun bisa ditampilkan tanpa mengambil ulang data."
+        )
     }
 }
 
@@ -207,6 +310,24 @@ def show_penjelasan(menu):
     with st.expander("📘 Penjelasan Singkat"):
         st.write(penjelasan[menu]["lengkap"])
 
+def toggle_live(key):
+    # Mode live hanya ditawarkan untuk bulan yang masih berjalan
+    if is_closed_month(tahun, bulan):
+        return False
+    return st.toggle(
+        "Mode live (bulan berjalan)",
+        key=key,
+        help="Hanya data baru sejak pembaruan terakhir yang diambil; tanggal yang berubah saja yang dihitung ulang.",
+    )
+
+def show_peringatan_kelengkapan(df):
+    # Beri tahu user kalau ada halaman yang tetap gagal diambil setelah retry
+    if not is_complete(df):
+        st.warning(
+            "⚠️ Sebagian halaman data gagal diambil setelah beberapa percobaan, hasil analisis belum lengkap. "
+            "Jalankan analisis lagi untuk melanjutkan dari halaman terakhir yang berhasil."
+        )
+
 
 # ================= TAB METAR =================
 # ================= TAB METAR =================
@@ -222,24 +343,28 @@ if menu == "METAR":
     bulan = col2.selectbox("Pilih Bulan", list(range(1, 13)), index=0)
 
     mode = st.radio("Mode Perhitungan", ["Otomatis", "Interval 1 Jam"], key="metar_mode")
+    live = toggle_live("metar_live")
     
     # # --- FILTER METAR ---
     # if not stations_list_global:
     #     st.warning("Daftar stasiun belum tersedia, coba muat ulang aplikasi.")
 
+    params = (tahun, bulan, mode, live)
     if st.button("Analisis METAR"):
-        with st.spinner("Mengambil dan menganalisis data METAR..."):
-            try:
-                    df_metar = run_async(fetch_and_analyze_metar_wrapper, tahun, bulan, mode, station_info_map)
-                    # simpan di session state supaya bisa diakses di filter dan di visualisasi
-                    st.session_state["df_metar_raw"] = df_metar
-                    st.session_state["metar_analisis_selesai"] = True
-            except Exception as e:
-                    st.error(f"Gagal analisis Metar:{e}")
+        start_job("METAR", params, fetch_and_analyze_metar_wrapper, tahun, bulan, mode, station_info_map, live)
+    try:
+        selesai, df_metar = poll_job("METAR", params, "Mengambil dan menganalisis data METAR...")
+        if selesai:
+            # simpan di session state supaya bisa diakses di filter dan di visualisasi
+            st.session_state["df_metar_raw"] = df_metar
+            st.session_state["metar_analisis_selesai"] = True
+    except Exception as e:
+        st.error(f"Gagal analisis Metar:{e}")
                     
     # jika analisis selesai    
     if st.session_state.get("metar_analisis_selesai", False):
-        metar_subtabs = st.tabs(["📄 Tabel Analisis", "📊 Visualisasi"])       
+        show_peringatan_kelengkapan(st.session_state["df_metar_raw"])
+        metar_subtabs = st.tabs(["📄 Tabel Analisis", "📊 Visualisasi"])
         
         with metar_subtabs[0]:  
             # Kalau analisis sudah selesai, tampilkan filter
@@ -289,91 +414,78 @@ if menu == "METAR":
 
                 st.markdown("<br>", unsafe_allow_html=True)
 
+                # indeks filter dibangun sekali per hasil analisis (lihat filter_index.py)
+                idx_metar = filter_index(df_metar, ["ICAO", "Status Lengkap", "Jam Operasional"])
+
                 with st.expander("⚙️ Filter Lanjutan"):
                     # --- Filter berdasarkan ICAO ---
-                    stasiun_opsi = sorted(df_metar["ICAO"].unique())
+                    stasiun_opsi = idx_metar.options("ICAO")
                     selected_stations = st.multiselect(
                                 "Pilih Stasiun (ICAO)",
                                 options=stasiun_opsi,
                                 default=stasiun_opsi, # default semua terpilih
                                 key="filter_metar_icao" 
                             )
-                    df_metar = df_metar[df_metar["ICAO"].isin(selected_stations)]     
                     
                     # --- Filter berdasarkan Status Ketersediaan ---
                     status_filter = st.selectbox("Filter Status Ketersediaan", 
                                                  ["Semua", "Lengkap", "Tidak Lengkap"], 
                                                  key="filter_metar_status")
-                    
-                    if status_filter == "Lengkap":
-                            df_metar = df_metar[df_metar["Status Lengkap"] == True]
-                    elif status_filter == "Tidak Lengkap":
-                            df_metar = df_metar[df_metar["Status Lengkap"] == False]
-                    
+                    status_terpilih = {"Lengkap": [True], "Tidak Lengkap": [False]}.get(status_filter)
+                    baris = idx_metar.select({"ICAO": selected_stations, "Status Lengkap": status_terpilih})
 
                     # --- Filter berdasarkan Jam Operasional --- 
-                    jam_opsi = sorted(df_metar["Jam Operasional"].unique())
+                    # opsi hanya jam operasional yang tersisa setelah filter di atas
+                    jam_opsi = idx_metar.options("Jam Operasional", baris)
                     selected_ops = st.multiselect(
                             "Pilih Jam Operasional",
                             options=jam_opsi,
                             default=jam_opsi,
                             key="filter_metar_jam"
                         )
-                    df_metar = df_metar[df_metar["Jam Operasional"].isin(selected_ops)]
-
-                # --- simpan hasil filter
+                    baris = idx_metar.select({
+                        "ICAO": selected_stations, "Status Lengkap": status_terpilih, "Jam Operasional": selected_ops
+                    })
+
+                # --- simpan hasil filter (tanpa filter → frame asli, tanpa salinan;
+                # filter yang sama di rerun berikutnya memakai salinan yang sama, lihat take_rows)
+                df_metar_tabel = df_metar
+                df_metar = take_rows(df_metar_tabel, baris)
                 st.session_state["df_metar"] = df_metar
 
-                # buat salinan khusus untuk display (tanpa kolom Status Lengkap)
-                df_metar_display = df_metar.copy()
-                if "Status Lengkap" in df_metar_display.columns:
-                        df_metar_display = df_metar_display.drop(columns=["Status Lengkap"])
-
                 st.markdown("<br>", unsafe_allow_html=True)  # spasi vertikal kecil
                 st.markdown("<div style='margin-top:20px;'></div>", unsafe_allow_html=True)  # spasi lebih besar
 
-                st.dataframe(df_metar_display, use_container_width=True)
+                # tabel berhalaman (lihat table_view.py), tanpa kolom Status Lengkap
+                paginated_table(df_metar_tabel, "tabel_metar", hide_columns=["Status Lengkap"], rows=baris)
 
-                # --- Download tetap pakai data asli 
-                df_metar_download = df_metar.copy()
-                if "Status Lengkap" in df_metar_download.columns:
-                    df_metar_download = df_metar_download.drop(columns=["Status Lengkap"])
-    
-                df_metar_download["Catatan"] = df_metar_download["Catatan"].apply(
-                        lambda x: re.sub(r"[^0-9A-Za-z\s\-]", "", str(x))
-                    )
-
-                csv = df_metar_download.to_csv(index=False).encode("utf-8")
-                st.download_button(
+                # --- Download tetap pakai data asli (file dibuat saat tombol diklik, lihat export.py)
+                col_csv, col_xlsx = st.columns(2)
+                col_csv.download_button(
                         label="📥Download CSV METAR",
-                        data=csv,
+                        data=deferred_csv(df_metar, "metar", drop=["Status Lengkap"], clean=["Catatan"]),
                         file_name=f"metar_{tahun}_{bulan}.csv",
                         mime="text/csv"
                     )
+                col_xlsx.download_button(
+                        label="📥Download Excel METAR",
+                        data=deferred_excel({"METAR": df_metar}, "metar", drop=["Status Lengkap"], clean=["Catatan"]),
+                        file_name=f"metar_{tahun}_{bulan}.xlsx",
+                        mime=XLSX_MIME
+                    )
                 
             # ================= TAB VISUALISASI =================
             with metar_subtabs[1]:
 
+                # frame hasil take_rows: objek yang sama selama filter tidak berubah,
+                # jadi agregat & heatmap yang di-cache per frame (viz.py) tetap terpakai
                 df_filtered = st.session_state["df_metar"]
                 figs = show_metar_visualizations(df_filtered, return_figs=True)
 
-                # buat ZIP
-                zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w") as zf:
-                    for filename, fig in figs:
-                        fig.update_layout(
-                        template="plotly_white",
-                        paper_bgcolor="white",
-                        plot_bgcolor="white"
-                    )
-                                
-                        img_bytes = fig.to_image(format="png", engine="kaleido") 
-                        # , width=1200, height=800, scale=2
-                        zf.writestr(f"{filename}.png", img_bytes)
-
+                # ZIP PNG dibuat hanya saat tombol diklik (lihat export.py)
                 st.download_button(
                     label="📥 Download Semua Grafik (ZIP)",
-                    data=zip_buffer.getvalue(),
+                    data=lambda figs=figs: build_png_zip(figs),
                     file_name=f"metar_grafik_{tahun}_{bulan}.zip",
                     mime="application/zip"
             )
@@ -395,22 +507,25 @@ if menu == "RASON":
     col1, col2 = st.columns(2)
     tahun = col1.selectbox("Pilih Tahun", options=list(range(2020, 2101)), index=5, key="rason_tahun")
     bulan = col2.selectbox("Pilih Bulan", list(range(1, 13)),  index=0, key="rason_bulan")
+    live = toggle_live("rason_live")
     
     # === TOMBOL ANALISIS ===
+    params = (tahun, bulan, live)
     if st.button("Analisis RASON"):
-        with st.spinner("Mengambil dan menganalisis data RASON..."):
-            try:
-                df_rason_harian, df_rason_bulanan = run_async(
-                    fetch_and_analyze_rason_wrapper, tahun, bulan, station_info_map
-                )
-                if not df_rason_harian.empty:
-                    st.session_state["df_rason"] = (df_rason_harian, df_rason_bulanan)
-                    st.session_state["rason_analisis_selesai"] = True
-            except Exception as e:
-                st.error(f"Gagal analisis RASON: {e}")
+        start_job("RASON", params, fetch_and_analyze_rason_wrapper, tahun, bulan, station_info_map, live)
+    try:
+        selesai, hasil = poll_job("RASON", params, "Mengambil dan menganalisis data RASON...")
+        if selesai:
+            df_rason_harian, df_rason_bulanan = hasil
+            if not df_rason_harian.empty:
+                st.session_state["df_rason"] = (df_rason_harian, df_rason_bulanan)
+                st.session_state["rason_analisis_selesai"] = True
+    except Exception as e:
+        st.error(f"Gagal analisis RASON: {e}")
 
     # === JIKA ANALISIS SELESAI ===
     if st.session_state.get("rason_analisis_selesai", False):
+        show_peringatan_kelengkapan(st.session_state["df_rason"][0])
         rason_subtabs = st.tabs(["📄 Tabel Analisis", "📊 Visualisasi"])
 
 
@@ -461,23 +576,25 @@ if menu == "RASON":
             st.markdown("<br>", unsafe_allow_html=True)
             
             # === FILTER WMO ===
-            opsi_wmo = sorted(df_rason_harian["WMO ID"].unique())
+            idx_harian = filter_index(df_rason_harian, ["WMO ID"])
+            idx_bulanan = filter_index(df_rason_bulanan, ["WMO ID"])
+            opsi_wmo = idx_harian.options("WMO ID") if "WMO ID" in idx_harian else []
             selected_wmo = st.multiselect(
                 "Filter Stasiun (WMO ID)",
                 options=opsi_wmo,
                 default=opsi_wmo,
                 key="filter_wmo_rason"
             )
-            if selected_wmo:
-                df_rason_harian = df_rason_harian[df_rason_harian["WMO ID"].isin(selected_wmo)]
-                df_rason_bulanan = df_rason_bulanan[df_rason_bulanan["WMO ID"].isin(selected_wmo)]
+            baris_harian = idx_harian.select({"WMO ID": selected_wmo}) if selected_wmo else None
+            baris_bulanan = idx_bulanan.select({"WMO ID": selected_wmo}) if selected_wmo else None
 
             # === TABEL HARIAN ===
             st.markdown('<h4 style="color:#000000;">Rekap Harian</h4>', unsafe_allow_html=True)
-            st.dataframe(df_rason_harian, use_container_width=True)
+            paginated_table(df_rason_harian, "tabel_rason_harian", rows=baris_harian)
+            df_rason_harian = take_rows(df_rason_harian, baris_harian)
             st.download_button(
                 label="📥 Download CSV RASON Harian",
-                data=df_rason_harian.to_csv(index=False).encode("utf-8"),
+                data=deferred_csv(df_rason_harian, "rason_harian"),
                 file_name=f"rason_harian_{tahun}_{bulan}.csv",
                 mime="text/csv"
             )
@@ -486,18 +603,22 @@ if menu == "RASON":
             
             # === TABEL BULANAN ===
             st.markdown('<h4 style="color:#000000;">Rekap Bulanan</h4>', unsafe_allow_html=True)
-            df_rason_bulanan_download = df_rason_bulanan.copy()
-            df_rason_bulanan_download["Catatan"] = df_rason_bulanan_download["Catatan"].apply(
-                lambda x: re.sub(r"[^0-9A-Za-z\s\-]", "", str(x))
-            )
-
-            st.dataframe(df_rason_bulanan, use_container_width=True)
+            paginated_table(df_rason_bulanan, "tabel_rason_bulanan", rows=baris_bulanan)
+            df_rason_bulanan = take_rows(df_rason_bulanan, baris_bulanan)
             st.download_button(
                 label="📥 Download CSV RASON Bulanan",
-                data=df_rason_bulanan_download.to_csv(index=False).encode("utf-8"),
+                data=deferred_csv(df_rason_bulanan, "rason_bulanan", clean=["Catatan"]),
                 file_name=f"rason_bulanan_{tahun}_{bulan}.csv",
                 mime="text/csv"
             )
+            st.download_button(
+                label="📥 Download Excel RASON (Harian & Bulanan)",
+                data=deferred_excel(
+                    {"Harian": df_rason_harian, "Bulanan": df_rason_bulanan}, "rason", clean=["Catatan"]
+                ),
+                file_name=f"rason_{tahun}_{bulan}.xlsx",
+                mime=XLSX_MIME
+            )
 
         # ================= TAB VISUALISASI =================
         with rason_subtabs[1]:
@@ -505,22 +626,10 @@ if menu == "RASON":
 
             figs = show_rason_visualizations(df_rason_harian_vis, df_rason_bulanan_vis, return_figs=True)
             
-            # === BUAT ZIP GRAFIK ===
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w") as zf:
-                for filename, fig in figs:
-                    fig.update_layout(
-                        template="plotly_white",
-                        paper_bgcolor="white",
-                        plot_bgcolor="white"
-                    )
-                    img_bytes = fig.to_image(format="png", engine="kaleido")
-                    zf.writestr(f"{filename}.png", img_bytes)
-
-            zip_buffer.seek(0)
+            # === ZIP GRAFIK (dibuat hanya saat tombol diklik, lihat export.py) ===
             st.download_button(
                 label="📥 Download Semua Grafik (ZIP)",
-                data=zip_buffer.getvalue(),
+                data=lambda figs=figs: build_png_zip(figs),
                 file_name=f"rason_grafik_{tahun}_{bulan}.zip",
                 mime="application/zip"
             )
@@ -540,22 +649,24 @@ if menu == "SPECI":
     col1, col2 = st.columns(2)
     tahun = col1.selectbox("Pilih Tahun",  options=list(range(2020, 2101)), index=5, key="speci_tahun")
     bulan = col2.selectbox("Pilih Bulan", list(range(1, 13)), index=0, key="speci_bulan")
+    live = toggle_live("speci_live")
 
     # === TOMBOL ANALISIS ===
+    params = (tahun, bulan, live)
     if st.button("Analisis SPECI"):
-        with st.spinner("Mengambil dan menganalisis data SPECI..."):
-            try:
-                df_speci_harian, df_speci_bulanan = run_async(
-                    fetch_and_analyze_speci_wrapper, tahun, bulan, station_info_map
-                )
-                st.session_state["df_speci"] = (df_speci_harian, df_speci_bulanan)
-                st.session_state["speci_analisis_selesai"] = True
-            except Exception as e:
-                    st.error(f"Gagal analisis SPECI: {e}")
+        start_job("SPECI", params, fetch_and_analyze_speci_wrapper, tahun, bulan, station_info_map, live)
+    try:
+        selesai, hasil = poll_job("SPECI", params, "Mengambil dan menganalisis data SPECI...")
+        if selesai:
+            st.session_state["df_speci"] = hasil
+            st.session_state["speci_analisis_selesai"] = True
+    except Exception as e:
+        st.error(f"Gagal analisis SPECI: {e}")
                     
                                 
     # === JIKA ANALISIS SELESAI ===       
     if st.session_state.get("speci_analisis_selesai", False):        
+        show_peringatan_kelengkapan(st.session_state["df_speci"][0])
         speci_subtabs = st.tabs(["📄 Tabel Analisis", "📊 Visualisasi"])
             
         # ================= TAB TABEL ===============   
@@ -605,25 +716,27 @@ if menu == "SPECI":
                 
                 # === FILTER ICAO ===
                 valid_icao = set(station_info_map.keys())
-                icao_options = sorted([icao for icao in df_speci_harian["ICAO"].unique() if icao in valid_icao])
+                idx_harian = filter_index(df_speci_harian, ["ICAO"])
+                idx_bulanan = filter_index(df_speci_bulanan, ["ICAO"])
+                icao_options = [icao for icao in idx_harian.options("ICAO") if icao in valid_icao] if "ICAO" in idx_harian else []
                 selected_icao_speci = st.multiselect(
                     "Filter Stasiun (ICAO)",
                     options=icao_options,
                     default=icao_options,
                     key="filter_icao_speci"
                 )
-                if selected_icao_speci:
-                    df_speci_harian = df_speci_harian[df_speci_harian["ICAO"].isin(selected_icao_speci)]
-                    df_speci_bulanan = df_speci_bulanan[df_speci_bulanan["ICAO"].isin(selected_icao_speci)]
+                baris_harian = idx_harian.select({"ICAO": selected_icao_speci}) if selected_icao_speci else None
+                baris_bulanan = idx_bulanan.select({"ICAO": selected_icao_speci}) if selected_icao_speci else None
 
                 st.markdown("<br>", unsafe_allow_html=True) 
                 
                 # === TABEL HARIAN ===
                 st.markdown('<h4 style="color:#000000;">Rekap Harian</h4>', unsafe_allow_html=True)
-                st.dataframe(df_speci_harian, use_container_width=True)
+                paginated_table(df_speci_harian, "tabel_speci_harian", rows=baris_harian)
+                df_speci_harian = take_rows(df_speci_harian, baris_harian)
                 st.download_button(
                     label="📥 Download CSV SPECI Harian",
-                    data=df_speci_harian.to_csv(index=False).encode("utf-8"),
+                    data=deferred_csv(df_speci_harian, "speci_harian"),
                     file_name=f"speci_harian_{tahun}_{bulan}.csv",
                     mime="text/csv"
                 )
@@ -631,13 +744,20 @@ if menu == "SPECI":
                 
                 # === TABEL BULANAN ===
                 st.markdown('<h4 style="color:#000000;">Rekap Bulanan</h4>', unsafe_allow_html=True)
-                st.dataframe(df_speci_bulanan, use_container_width=True)
+                paginated_table(df_speci_bulanan, "tabel_speci_bulanan", rows=baris_bulanan)
+                df_speci_bulanan = take_rows(df_speci_bulanan, baris_bulanan)
                 st.download_button(
                     label="📥 Download CSV SPECI Bulanan",
-                    data=df_speci_bulanan.to_csv(index=False).encode("utf-8"),
+                    data=deferred_csv(df_speci_bulanan, "speci_bulanan"),
                     file_name=f"speci_bulanan_{tahun}_{bulan}.csv",
                     mime="text/csv"
                 )
+                st.download_button(
+                    label="📥 Download Excel SPECI (Harian & Bulanan)",
+                    data=deferred_excel({"Harian": df_speci_harian, "Bulanan": df_speci_bulanan}, "speci"),
+                    file_name=f"speci_{tahun}_{bulan}.xlsx",
+                    mime=XLSX_MIME
+                )
 
         # ================= TAB VISUALISASI =================
         with speci_subtabs[1]:
@@ -648,22 +768,10 @@ if menu == "SPECI":
 
             figs = show_speci_visualizations(df_speci_harian, df_speci_bulanan, return_figs=True)
 
-            # === BUAT ZIP GRAFIK ===
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w") as zf:
-                for filename, fig in figs:
-                    fig.update_layout(
-                        template="plotly_white",
-                        paper_bgcolor="white",
-                        plot_bgcolor="white"
-                    )
-                    img_bytes = fig.to_image(format="png", engine="kaleido")
-                    zf.writestr(f"{filename}.png", img_bytes)
-
-            zip_buffer.seek(0)
+            # === ZIP GRAFIK (dibuat hanya saat tombol diklik, lihat export.py) ===
             st.download_button(
                 label="📥 Download Semua Grafik (ZIP)",
-                data=zip_buffer.getvalue(),
+                data=lambda figs=figs: build_png_zip(figs),
                 file_name=f"speci_grafik_{tahun}_{bulan}.zip",
                 mime="application/zip"
             )
@@ -671,3 +779,96 @@ if menu == "SPECI":
         st.warning("Lakukan analisis SPECI terlebih dahulu.")
 
 
+
+# ================= TAB RINGKASAN =================
+# ================= TAB RINGKASAN =================
+# ================= TAB RINGKASAN =================
+
+if menu == "RINGKASAN":
+    show_penjelasan("RINGKASAN")
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # === INPUT ===
+    col1, col2 = st.columns(2)
+    tahun = col1.selectbox("Pilih Tahun", options=list(range(2020, 2101)), index=5, key="ringkasan_tahun")
+    bulan = col2.selectbox("Pilih Bulan", list(range(1, 13)), index=0, key="ringkasan_bulan")
+
+    mode = st.radio("Mode Perhitungan METAR", ["Otomatis", "Interval 1 Jam"], key="ringkasan_mode")
+
+    # === TOMBOL ANALISIS ===
+    params = (tahun, bulan, mode)
+    if st.button("Analisis Semua"):
+        start_job("RINGKASAN", params, run_full_analysis_wrapper, tahun, bulan, mode, station_info_map)
+    try:
+        selesai, hasil = poll_job("RINGKASAN", params, "Mengambil dan menganalisis data METAR, RASON, dan SPECI...")
+        if selesai:
+            st.session_state["df_ringkasan"] = hasil
+            st.session_state["ringkasan_analisis_selesai"] = True
+    except Exception as e:
+        st.error(f"Gagal analisis gabungan: {e}")
+
+    # === JIKA ANALISIS SELESAI ===
+    if st.session_state.get("ringkasan_analisis_selesai", False):
+        df_scorecard = st.session_state["df_ringkasan"][-1]
+        show_peringatan_kelengkapan(df_scorecard)
+
+        st.markdown('<h4 style="color:#000000;">Rapor Bulanan per Stasiun</h4>', unsafe_allow_html=True)
+        paginated_table(df_scorecard, "tabel_ringkasan")
+        st.download_button(
+            label="📥 Download CSV Ringkasan",
+            data=deferred_csv(df_scorecard, "ringkasan"),
+            file_name=f"ringkasan_{tahun}_{bulan}.csv",
+            mime="text/csv"
+        )
+        df_metar, df_rason_harian, df_rason_bulanan, df_speci_harian, df_speci_bulanan, _ = st.session_state["df_ringkasan"]
+        st.download_button(
+            label="📥 Download Excel Ringkasan (semua tabel)",
+            data=deferred_excel(
+                {
+                    "Ringkasan": df_scorecard,
+                    "METAR": df_metar,
+                    "RASON Harian": df_rason_harian,
+                    "RASON Bulanan": df_rason_bulanan,
+                    "SPECI Harian": df_speci_harian,
+                    "SPECI Bulanan": df_speci_bulanan,
+                },
+                "ringkasan",
+                drop=["Status Lengkap"],
+                clean=["Catatan"],
+            ),
+            file_name=f"ringkasan_{tahun}_{bulan}.xlsx",
+            mime=XLSX_MIME
+        )
+    else:
+        st.warning("Lakukan analisis gabungan terlebih dahulu.")
+
+    # === TREN (dari agregat bulanan tersimpan) ===
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(f'<h4 style="color:#000000;">Tren {TREND_MONTHS} Bulan</h4>', unsafe_allow_html=True)
+    jenis_tren = st.radio("Jenis Data", ["METAR", "RASON"], horizontal=True, key="ringkasan_tren_jenis")
+    varian_tren = mode if jenis_tren == "METAR" else ""
+
+    # Lengkapi agregat berjalan sebagai job (bisa dibatalkan, progres per bulan)
+    try:
+        selesai, gagal = poll_job("RINGKASAN_AGREGAT", params, "Melengkapi agregat bulanan...")
+        if selesai:
+            for th, bl, e in gagal:
+                st.error(f"Gagal analisis {bl:02d}/{th}: {e}")
+    except Exception as e:
+        st.error(f"Gagal melengkapi agregat: {e}")
+
+    belum = missing_months(jenis_tren, tahun, bulan, varian=varian_tren)
+    if belum:
+        st.info(
+            f"{len(belum)} bulan dalam jendela tren belum punya agregat: "
+            + ", ".join(f"{bl:02d}/{th}" for th, bl in belum)
+        )
+        if st.button("Lengkapi Agregat", key="ringkasan_lengkapi_agregat"):
+            start_job("RINGKASAN_AGREGAT", params, backfill_aggregates_wrapper, belum, mode, station_info_map)
+            st.rerun()
+
+    df_tren = trend_table(jenis_tren, tahun, bulan, varian=varian_tren)
+    if df_tren.empty:
+        st.warning("Belum ada agregat untuk bulan ini. Jalankan analisis gabungan untuk bulan yang sudah lewat.")
+    else:
+        paginated_table(df_tren, "tabel_tren")
@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import CancelledError
+from http_session import close_session
+
+# ==== EVENT LOOP LATAR BERSAMA ====
+# Satu event loop berumur panjang di thread latar untuk seluruh proses Streamlit.
+# Script run hanya mengirim coroutine lalu memegang Job (future + progres), sehingga:
+# - fetch dari banyak user berjalan bersamaan di loop yang sama (session & semaphore dipakai bersama),
+# - fetch panjang tetap berjalan walau script di-rerun,
+# - job bisa dibatalkan saat user ganti bulan / tab.
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class Job:
+    """
+    Coroutine yang berjalan di loop latar.
+    params: parameter yang memicu job (mis. (tahun, bulan, mode)); dipakai UI untuk
+    membatalkan job kalau pilihan user sudah berubah.
+    """
+
+    def __init__(self, label="", params=None):
+        self.label = label
+        self.params = params
+        self.future = None
+        self.started_at = time.monotonic()
+        self._done_units = 0
+        self._total_units = 0
+        self._lock = threading.Lock()
+
+    # --- progres (dipanggil dari dalam loop) ---
+    def add_total(self, units):
+        with self._lock:
+            self._total_units += units
+
+    def advance(self, units=1):
+        with self._lock:
+            self._done_units += units
+
+    @property
+    def progress(self):
+        """Perkiraan progres 0..1 (0 kalau belum ada unit kerja yang terdaftar)."""
+        with self._lock:
+            if not self._total_units:
+                return 0.0
+            return min(1.0, self._done_units / self._total_units)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    # --- status ---
+    def done(self):
+        return self.future.done()
+
+    def cancelled(self):
+        return self.future.cancelled()
+
+    def cancel(self):
+        """Batalkan job; task di loop menerima CancelledError di titik await berikutnya."""
+        return self.future.cancel()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+def add_progress_total(units):
+    """Daftarkan unit kerja ke job yang sedang berjalan (no-op di luar job)."""
+    job = _current_job.get()
+    if job is not None:
+        job.add_total(units)
+
+
+def advance_progress(units=1):
+    """Tandai unit kerja selesai pada job yang sedang berjalan (no-op di luar job)."""
+    job = _current_job.get()
+    if job is not None:
+        job.advance(units)
+
+
+async def run_untracked(coro):
+    """
+    Jalankan coroutine di dalam job tanpa melaporkan progresnya ke job tersebut,
+    mis. satu bulan dari job multi-bulan yang progresnya dihitung per bulan oleh pemanggil.
+    """
+    ctx = contextvars.copy_context()
+    ctx.run(_current_job.set, None)
+    return await asyncio.create_task(coro, context=ctx)
+
+
+class AsyncExecutor:
+    """Event loop di thread daemon; dibuat saat pertama kali dipakai."""
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None or self._loop.is_closed() or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def _target(loop=self._loop):
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=_target, name="bmkg-async-loop", daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def submit(self, coro, label="", params=None):
+        """Jadwalkan coroutine di loop latar; kembalikan Job (tidak menunggu)."""
+        job = Job(label, params)
+
+        async def _run():
+            _current_job.set(job)
+            return await coro
+
+        job.future = asyncio.run_coroutine_threadsafe(_run(), self._ensure_loop())
+        return job
+
+    def shutdown(self):
+        """Tutup session HTTP milik loop latar lalu hentikan loop-nya."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close_session(), loop).result(10)
+        except (CancelledError, TimeoutError, RuntimeError):
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+executor = AsyncExecutor()
@@ -1,26 +1,136 @@
 import aiohttp 
 # untuk ambil data dari internet tanpa nunggu satu persatu, 
 # jadi prosesnya bisa jalan bareng dan lebih cepat bila ambil data dari banyak endpoint secara paralel
+import asyncio
+import base64
+import json
+import threading
+import time
+from concurrent.futures import Future
+from http_session import get_session
 
 
 LOGIN_URL = "https://bmkgsatu.bmkg.go.id/db/bmkgsatu/@login"
 USERNAME = "aksesdata"
 PASSWORD = "@ksesData"
 
-async def get_bmkg_token():
+REFRESH_MARGIN = 120      # detik; token diperbarui sedikit sebelum exp
+DEFAULT_TOKEN_TTL = 3600  # detik; dipakai kalau klaim exp tidak bisa dibaca
+
+
+def decode_jwt_exp(token):
+    """Baca klaim exp (epoch detik) dari payload JWT tanpa verifikasi tanda tangan."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)  # base64url tanpa padding
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class _LoginCancelled(Exception):
+    """Login bersama dibatalkan oleh pemiliknya; penunggu lain mencoba login sendiri."""
+
+
+class TokenManager:
+    """
+    Cache JWT BMKG SATU untuk seluruh proses.
+    Token dipakai ulang sampai REFRESH_MARGIN detik sebelum exp; pemanggil yang
+    bersamaan saat token perlu diperbarui menunggu satu login yang sama (single-flight),
+    juga lintas thread / event loop Streamlit.
+    """
+
+    def __init__(self):
+        self._token = None
+        self._expires_at = 0.0
+        self._inflight = None  # concurrent.futures.Future login yang sedang berjalan
+        self._lock = threading.Lock()
+
+    def _valid_token(self):
+        if self._token and time.time() < self._expires_at - REFRESH_MARGIN:
+            return self._token
+        return None
+
+    async def get_token(self, session=None):
+        while True:
+            with self._lock:
+                token = self._valid_token()
+                if token:
+                    return token
+                inflight = self._inflight
+                owner = inflight is None
+                if owner:
+                    inflight = self._inflight = Future()
+
+            if owner:
+                return await self._login_as_owner(inflight, session)
+            try:
+                # shield: pembatalan satu penunggu tidak ikut membatalkan Future bersama
+                return await asyncio.shield(asyncio.wrap_future(inflight))
+            except _LoginCancelled:
+                continue
+
+    async def _login_as_owner(self, inflight, session):
+        # apa pun yang terjadi, _inflight dibersihkan dan Future selalu diberi hasil/exception,
+        # supaya pemanggil yang menunggu tidak menggantung
+        try:
+            token = await _login(session)
+            if not token:
+                raise RuntimeError("Login BMKG berhasil tapi respons tidak berisi token.")
+            with self._lock:
+                self._token = token
+                self._expires_at = decode_jwt_exp(token) or (time.time() + DEFAULT_TOKEN_TTL)
+                self._inflight = None
+        except BaseException as e:
+            with self._lock:
+                if self._inflight is inflight:
+                    self._inflight = None
+            # pemilik dibatalkan (mis. job sesinya dibatalkan) → penunggu di sesi lain
+            # tidak ikut batal, melainkan mengulang login; CancelledError hanya untuk pemilik
+            inflight.set_exception(_LoginCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            raise
+        inflight.set_result(token)
+        return token
+
+    def invalidate(self, token=None):
+        """Buang token dari cache (mis. setelah 401). Kalau token diberikan, hanya dibuang bila masih sama."""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+
+
+token_manager = TokenManager()
+
+
+async def get_bmkg_token(session=None):
+    """
+    Kembalikan JWT token BMKG SATU dari cache proses; login hanya jika token
+    belum ada atau hampir kedaluwarsa.
+    """
+    return await token_manager.get_token(session)
+
+
+def invalidate_token(token=None):
+    token_manager.invalidate(token)
+
+
+async def _login(session=None):
     """
     Login ke BMKG SATU dan mengembalikan JWT token.
+    Memakai session HTTP bersama (http_session) kalau session tidak diberikan.
     """ # # Fungsi async untuk login ke API BMKG dan ambil token
     
     payload = {"username": USERNAME, "password": PASSWORD} # Data login yang dikirim ke server (isi username & password)
     try:
-        async with aiohttp.ClientSession() as session:# Buka sesi koneksi HTTP secara async (tidak nunggu satu-satu)
-            async with session.post(LOGIN_URL, json=payload, timeout=10) as response: # Kirim data login ke API dengan metode POST
-                # POST = kirim data dari client ke server
-                response.raise_for_status() 
-                # fungsi ini untuk ngecek status kode HTTP dari response, kalau diantara 200 - 299 artinya sukses, diluar itu artinya eror
-                data = await response.json() # jadi kan data dari server berupa string json, kita ubah ke objek python
-                return data.get("token") # mengambil nilai dari kunci "token" hasil login
+        if session is None:
+            session = await get_session() # Pakai ulang koneksi HTTP bersama (keep-alive), tidak buka sesi baru tiap login
+        async with session.post(LOGIN_URL, json=payload, timeout=aiohttp.ClientTimeout(total=10)) as response: # Kirim data login ke API dengan metode POST
+            # POST = kirim data dari client ke server
+            response.raise_for_status() 
+            # fungsi ini untuk ngecek status kode HTTP dari response, kalau diantara 200 - 299 artinya sukses, diluar itu artinya eror
+            data = await response.json() # jadi kan data dari server berupa string json, kita ubah ke objek python
+            return data.get("token") # mengambil nilai dari kunci "token" hasil login
     
     except aiohttp.ClientResponseError as e:  # Kalau server BMKG balas dengan error (misalnya 401, 500, dll)
         raise RuntimeError(f"HTTP Error saat login BMKG: {e.status} - {e.message}")
@@ -0,0 +1,113 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from timeutil import MINUTES_PER_DAY
+
+# Resolusi slot yang umum dipakai (menit per slot)
+SLOT_RESOLUTIONS = {
+    "30 Menit": 30,   # METAR half-hourly (:00 dan :30)
+    "1 Jam": 60,      # METAR hourly, SPECI
+    "00Z/12Z": 720,   # RASON
+}
+
+
+def _count_dtype(counts):
+    """dtype unsigned terkecil yang cukup untuk nilai hitungan (umumnya uint8)."""
+    maks = int(counts.max()) if counts.size else 0
+    return np.min_scalar_type(max(maks, 1))
+
+
+class AvailabilityCube:
+    """
+    Array padat ketersediaan berindeks [stasiun, hari, slot].
+
+    Isi sel = jumlah kejadian di slot itu (menit unik untuk METAR, jumlah record untuk SPECI
+    dan RASON), disimpan dengan dtype unsigned terkecil. Agregat harian, per jam dan
+    per stasiun cukup berupa reduksi sumbu.
+    """
+
+    def __init__(self, stations, start_date, data, slot_minutes=30):
+        if MINUTES_PER_DAY % slot_minutes:
+            raise ValueError(f"slot_minutes harus membagi 1440, dapat {slot_minutes}")
+        self.stations = pd.Index(stations, dtype=object)
+        self.start_date = start_date
+        self.slot_minutes = slot_minutes
+        self.data = data
+
+        expected = (len(self.stations), data.shape[1], MINUTES_PER_DAY // slot_minutes)
+        if data.shape != expected:
+            raise ValueError(f"Bentuk data {data.shape} tidak sesuai, seharusnya {expected}")
+
+    # ==== Konstruksi ====
+    @classmethod
+    def from_keys(cls, stations, start_date, num_days, keys, slot_minutes=30):
+        """
+        Bangun cube dari kunci integer unik (stasiun * num_days + hari) * 1440 + menit.
+        Kunci sudah unik → isi sel = jumlah menit berbeda di slot tersebut.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        n_slot = MINUTES_PER_DAY // slot_minutes
+        cell = keys // MINUTES_PER_DAY
+        flat = cell * n_slot + (keys % MINUTES_PER_DAY) // slot_minutes
+        counts = np.bincount(flat, minlength=len(stations) * num_days * n_slot)
+        data = counts.astype(_count_dtype(counts)).reshape(len(stations), num_days, n_slot)
+        return cls(stations, start_date, data, slot_minutes)
+
+    @classmethod
+    def from_events(cls, stations, start_date, num_days, station_pos, day, minute,
+                    slot_minutes=30, distinct=True):
+        """
+        Bangun cube dari array kejadian (posisi stasiun, hari ke-0.., menit sejak 00:00).
+        Kejadian di luar rentang (posisi < 0, hari di luar cube) dibuang.
+        distinct=False → tiap record dihitung, bukan hanya menit unik.
+        """
+        station_pos = np.asarray(station_pos, dtype=np.int64)
+        day = np.asarray(day, dtype=np.int64)
+        minute = np.asarray(minute, dtype=np.int64)
+
+        masuk = (station_pos >= 0) & (day >= 0) & (day < num_days)
+        keys = (station_pos[masuk] * num_days + day[masuk]) * MINUTES_PER_DAY + minute[masuk]
+        if distinct:
+            keys = np.unique(keys)
+        return cls.from_keys(stations, start_date, num_days, keys, slot_minutes)
+
+    # ==== Atribut ====
+    @property
+    def num_days(self):
+        return self.data.shape[1]
+
+    @property
+    def dates(self):
+        """Label tanggal sumbu hari, format YYYY-MM-DD."""
+        return [(self.start_date + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(self.num_days)]
+
+    def presence(self):
+        """bool [stasiun, hari, slot]: ada minimal satu kejadian di slot."""
+        return self.data > 0
+
+    # ==== Reduksi ====
+    def _values(self, kind):
+        if kind == "slots":
+            return self.presence()
+        if kind == "events":
+            return self.data
+        raise ValueError(f"kind harus 'slots' atau 'events', dapat {kind!r}")
+
+    def per_day(self, kind="slots"):
+        """[stasiun, hari]: jumlah slot terisi (kind='slots') atau jumlah kejadian (kind='events')."""
+        return self._values(kind).sum(axis=2, dtype=np.int64)
+
+    def per_station(self, kind="slots"):
+        """[stasiun]: total sebulan / seluruh rentang cube."""
+        return self._values(kind).sum(axis=(1, 2), dtype=np.int64)
+
+    def per_slot_of_day(self, kind="slots"):
+        """[stasiun, slot]: total per slot dalam sehari, dijumlah lintas hari."""
+        return self._values(kind).sum(axis=1, dtype=np.int64)
+
+    def per_hour_of_day(self, kind="slots"):
+        """[stasiun, jam 0..23]; hanya untuk slot ≤ 1 jam."""
+        if 60 % self.slot_minutes:
+            raise ValueError(f"Slot {self.slot_minutes} menit tidak bisa dipecah per jam")
+        per_slot = self.per_slot_of_day(kind)
+        return per_slot.reshape(len(self.stations), 24, 60 // self.slot_minutes).sum(axis=2)
@@ -0,0 +1,197 @@
+import os
+import hashlib
+import threading
+import multiprocessing
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from memo import MemoCache
+
+# ==== EXPORT GRAFIK (PNG / ZIP) ====
+# Render PNG lewat kaleido mahal (start Chromium + render serial), jadi:
+# - hanya dijalankan saat user benar-benar mengunduh (data download_button berupa callable),
+# - hasil di-cache per hash JSON figure → filter yang sama tidak dirender ulang,
+# - figure yang belum ada di cache dirender paralel di process pool yang tetap hidup
+#   (kaleido di worker sudah "panas" untuk ekspor berikutnya).
+
+PNG_WORKERS = int(os.environ.get("BMKG_PNG_WORKERS", 2))
+PNG_CACHE_MAX = int(os.environ.get("BMKG_PNG_CACHE_MAX", 128))  # jumlah gambar yang disimpan
+
+_png_cache = OrderedDict()  # sha256 JSON figure → bytes PNG
+_png_cache_lock = threading.Lock()
+_png_executor = None
+_png_executor_lock = threading.Lock()
+
+
+def _get_png_executor():
+    """Process pool khusus render PNG, dibuat sekali per proses ('spawn', seperti runner)."""
+    global _png_executor
+    with _png_executor_lock:
+        if _png_executor is None:
+            _png_executor = ProcessPoolExecutor(
+                max_workers=PNG_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _png_executor
+
+
+def _render_png(fig_json):
+    """Dijalankan di worker: JSON figure → bytes PNG."""
+    import plotly.io as pio
+    return pio.from_json(fig_json).to_image(format="png", engine="kaleido")
+
+
+def _prepare(fig):
+    """Latar putih untuk gambar unduhan (sama seperti tampilan ekspor sebelumnya)."""
+    fig.update_layout(template="plotly_white", paper_bgcolor="white", plot_bgcolor="white")
+    return fig.to_json()
+
+
+def figures_to_png(figs):
+    """
+    list figure plotly → list bytes PNG (urutan sama).
+    Gambar yang sudah pernah dirender diambil dari cache; sisanya dirender paralel.
+    """
+    jsons = [_prepare(fig) for fig in figs]
+    keys = [hashlib.sha256(j.encode("utf-8")).hexdigest() for j in jsons]
+
+    with _png_cache_lock:
+        hasil = {k: _png_cache[k] for k in keys if k in _png_cache}
+        for k in hasil:
+            _png_cache.move_to_end(k)
+
+    belum = {k: j for k, j in zip(keys, jsons) if k not in hasil}
+    if belum:
+        global _png_executor
+        try:
+            rendered = list(_get_png_executor().map(_render_png, belum.values()))
+        except BrokenProcessPool:
+            # pool rusak → buang, render di proses ini saja
+            with _png_executor_lock:
+                _png_executor = None
+            rendered = [_render_png(j) for j in belum.values()]
+
+        with _png_cache_lock:
+            for k, img in zip(belum, rendered):
+                hasil[k] = img
+                _png_cache[k] = img
+                _png_cache.move_to_end(k)
+            while len(_png_cache) > PNG_CACHE_MAX:
+                _png_cache.popitem(last=False)
+
+    return [hasil[k] for k in keys]
+
+
+def build_png_zip(figs):
+    """[(nama_file, figure)] → bytes ZIP berisi PNG tiap grafik."""
+    images = figures_to_png([fig for _, fig in figs])
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zf:
+        for (filename, _), img_bytes in zip(figs, images):
+            zf.writestr(f"{filename}.png", img_bytes)
+    return zip_buffer.getvalue()
+
+
+# ==== EXPORT TABEL (CSV / EXCEL) ====
+# File unduhan dibuat hanya saat tombol diklik (callable untuk download_button),
+# lalu bytes-nya di-cache per (dataset, format, isi tabel setelah filter), sehingga
+# interaksi widget lain tidak lagi meng-encode megabyte CSV yang tidak diunduh.
+
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("BMKG_EXPORT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+EXPORT_CACHE_TTL = 3600  # detik
+CATATAN_PATTERN = r"[^0-9A-Za-z\s\-]"  # karakter selain ini (mis. emoji status) dibuang dari Catatan
+
+_export_cache = MemoCache(max_bytes=EXPORT_CACHE_MAX_BYTES)
+
+
+def clean_text_column(series):
+    """
+    Buang karakter non-alfanumerik (emoji dsb.) seperti re.sub per baris sebelumnya.
+    Kolom kategori cukup dibersihkan per kategori, bukan per baris.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        bersih = pd.Index(series.cat.categories.astype(str)).str.replace(CATATAN_PATTERN, "", regex=True)
+        kode = series.cat.codes.to_numpy()
+        nilai = np.append(np.asarray(bersih, dtype=object), "nan")[kode]  # kode -1 (NaN) → "nan" seperti str(x)
+        return pd.Series(nilai, index=series.index, name=series.name)
+    return series.astype(str).str.replace(CATATAN_PATTERN, "", regex=True)
+
+
+def _for_download(df, drop=(), clean=()):
+    df = df.drop(columns=[c for c in drop if c in df.columns])
+    if clean:
+        df = df.copy()
+        for kolom in clean:
+            if kolom in df.columns:
+                df[kolom] = clean_text_column(df[kolom])
+    return df
+
+
+def _content_hash(frames):
+    """Sidik isi tabel (kolom + nilai); tabel hasil filter yang sama → hash yang sama."""
+    h = hashlib.sha256()
+    for df in frames:
+        h.update(repr(list(df.columns)).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _cached_export(dataset, fmt, frames, build):
+    key = ("export", dataset, fmt, _content_hash(frames))
+    data = _export_cache.get(key)
+    if data is None:
+        data = build()
+        _export_cache.put(key, data, EXPORT_CACHE_TTL)
+    return data
+
+
+def _excel_value(value):
+    """Nilai sel openpyxl: NaN/NA → kosong, skalar numpy → Python."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def build_excel(sheets):
+    """
+    {nama_sheet: DataFrame} → bytes .xlsx.
+    Memakai mode write-only openpyxl: baris ditulis berurutan tanpa menyimpan
+    seluruh sel di memori, cocok untuk workbook multi-sheet yang besar.
+    """
+    wb = Workbook(write_only=True)
+    for nama, df in sheets.items():
+        ws = wb.create_sheet(title=str(nama)[:31])  # batas panjang nama sheet Excel
+        ws.append([str(c) for c in df.columns])
+        for row in df.itertuples(index=False, name=None):
+            ws.append([_excel_value(v) for v in row])
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def deferred_csv(df, dataset, drop=(), clean=()):
+    """
+    Callable tanpa argumen untuk st.download_button(data=...): CSV UTF-8 dibuat saat diklik.
+    drop: kolom yang tidak ikut diunduh; clean: kolom teks yang dibersihkan (lihat clean_text_column).
+    """
+    def _build():
+        out = _for_download(df, drop, clean)
+        return _cached_export(dataset, "csv", [out], lambda: out.to_csv(index=False).encode("utf-8"))
+    return _build
+
+
+def deferred_excel(sheets, dataset, drop=(), clean=()):
+    """Seperti deferred_csv, untuk workbook Excel {nama_sheet: DataFrame}."""
+    def _build():
+        out = {nama: _for_download(df, drop, clean) for nama, df in sheets.items()}
+        return _cached_export(dataset, "xlsx", list(out.values()), lambda: build_excel(out))
+    return _build
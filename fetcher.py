@@ -1,72 +1,546 @@
 import calendar
-from datetime import datetime
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
 import aiohttp
 import asyncio
+from async_executor import add_progress_total, advance_progress
+from auth import get_bmkg_token, invalidate_token
+from http_session import get_session
 
 BASE_URL = "https://bmkgsatu.bmkg.go.id/db/bmkgsatu//@search"
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
-async def fetch_gts_data(token, session, tahun, bulan, type_message):
+# Mode sharding: rentang waktu dipecah menjadi jendela harian / per jam
+# (mode "bulan" mengikuti batas bulan kalender, lihat split_windows)
+SHARD_DELTA = {
+    "hari": timedelta(days=1),
+    "jam": timedelta(hours=1),
+}
+SHARD_MODES = ("bulan", *SHARD_DELTA)
+MAX_CONCURRENCY = 8  # batas request paralel ke BMKG SATU
+RANGE_MAX_CONCURRENCY = MAX_CONCURRENCY  # batas global untuk semua fetch_gts_range yang berjalan
+
+_range_semaphores = {}  # event loop → asyncio.Semaphore bersama untuk fetch rentang
+_range_semaphores_lock = threading.Lock()
+
+# Retry per halaman: exponential backoff + jitter
+MAX_RETRIES = 4          # percobaan ulang setelah request pertama gagal
+BACKOFF_BASE = 1.0       # detik, dikali 2^percobaan
+BACKOFF_MAX = 30.0       # batas atas jeda antar percobaan
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Checkpoint per pengambilan (kunci coalescing): untuk tiap jendela waktu, offset _from
+# terakhir yang sukses + record yang sudah terkumpul. Disimpan di memori proses, dihapus
+# begitu pengambilan selesai lengkap, dan kedaluwarsa setelah CHECKPOINT_TTL supaya
+# checkpoint dari percobaan lama tidak dipakai untuk pengambilan berikutnya.
+CHECKPOINT_TTL = int(os.environ.get("BMKG_CHECKPOINT_TTL", 15 * 60))  # detik
+_checkpoints = {}  # kunci coalescing → _Checkpoint
+_checkpoints_lock = threading.Lock()
+
+# Coalescing: pengambilan yang sedang berjalan per (type_message, start, end).
+# Memakai concurrent.futures.Future (bukan asyncio) karena tiap sesi Streamlit
+# menjalankan event loop sendiri; pemanggil dari loop mana pun bisa ikut menunggu.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class FetchResult(list):
     """
-    Ambil data GTS dari BMKG SATU berdasarkan bulan, tahun, dan jenis pesan.
-    type_message: 'METAR', 'SPECI', 'RASON'
+    List record hasil fetch, ditambah penanda kelengkapan.
+    complete=False berarti ada halaman yang tetap gagal setelah semua retry.
     """
-    headers = {"Authorization": f"Bearer {token}"}
 
-    # Hitung awal dan akhir bulan
+    def __init__(self, items=(), complete=True, errors=None):
+        super().__init__(items)
+        self.complete = complete
+        self.errors = list(errors or [])
+
+
+def month_range(tahun, bulan):
+    """Awal dan akhir (inklusif, resolusi detik) satu bulan kalender."""
     last_day = calendar.monthrange(tahun, bulan)[1]
     start_date = datetime(tahun, bulan, 1, 0, 0, 0)
     end_date = datetime(tahun, bulan, last_day, 23, 59, 59)
+    return start_date, end_date
+
+
+def split_windows(start_date, end_date, shard="hari"):
+    """
+    Pecah rentang [start_date, end_date] menjadi jendela waktu yang tidak tumpang tindih
+    (per bulan kalender, per hari, atau per jam).
+    Batas atas tiap jendela = awal jendela berikutnya dikurangi 1 detik,
+    karena filter timestamp_data__lte bersifat inklusif.
+    """
+    if shard not in SHARD_MODES:
+        raise ValueError(f"Mode shard tidak dikenal: {shard} (pilih {', '.join(SHARD_MODES)})")
+
+    windows = []
+    cursor = start_date
+    while cursor <= end_date:
+        if shard == "bulan":
+            berikut = datetime(cursor.year + cursor.month // 12, cursor.month % 12 + 1, 1)
+        else:
+            berikut = cursor + SHARD_DELTA[shard]
+        batas = min(berikut - timedelta(seconds=1), end_date)
+        windows.append((cursor, batas))
+        cursor = berikut
+    return windows
+
+
+def record_key(item):
+    """Kunci unik record GTS untuk de-duplikasi hasil gabungan shard."""
+    if not isinstance(item, dict):
+        return None
+    uid = item.get("@uid") or item.get("@id")
+    if uid:
+        return uid
+    return (item.get("timestamp_data"), item.get("cccc"), item.get("station_wmo_id"))
+
+
+def merge_records(chunks):
+    """
+    Gabungkan beberapa list record, buang duplikat, lalu urutkan berdasarkan timestamp_data.
+    Hasilnya FetchResult yang lengkap hanya jika semua potongan lengkap.
+    """
+    merged, seen = [], set()
+    for chunk in chunks:
+        for item in chunk:
+            key = record_key(item)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            merged.append(item)
+
+    merged.sort(key=lambda x: x.get("timestamp_data", "") if isinstance(x, dict) else "")
+    errors = [e for chunk in chunks for e in getattr(chunk, "errors", [])]
+    complete = all(getattr(chunk, "complete", True) for chunk in chunks)
+    return FetchResult(merged, complete=complete, errors=errors)
+
+
+class FetchError(Exception):
+    """Respon BMKG SATU tidak bisa dipakai (status bukan 200 / bukan JSON)."""
+
+
+def _backoff_delay(attempt):
+    """Jeda exponential backoff dengan full jitter."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+async def _get_page(session, headers, params, label):
+    """
+    Ambil satu halaman dengan retry.
+    Timeout, error koneksi, status 408/429/5xx dan respon bukan JSON dicoba ulang;
+    status 4xx lainnya langsung dianggap gagal.
+    Status 401 → token di-invalidate, login ulang, lalu dicoba sekali lagi
+    (headers diperbarui di tempat agar halaman berikutnya ikut memakai token baru).
+    """
+    last_error = None
+    token_refreshed = False
+    attempt = 0
+
+    while attempt <= MAX_RETRIES:
+        if attempt:
+            await asyncio.sleep(_backoff_delay(attempt - 1))
+        attempt += 1
+
+        try:
+            async with session.get(BASE_URL,
+                                   headers=headers,
+                                   params=params,
+                                   timeout=aiohttp.ClientTimeout(total=90)
+                                   ) as response:
+
+                if response.status == 401 and not token_refreshed:
+                    token_refreshed = True
+                    attempt -= 1  # login ulang tidak dihitung sebagai percobaan
+                    invalidate_token(headers["Authorization"].removeprefix("Bearer "))
+                    try:
+                        headers["Authorization"] = f"Bearer {await get_bmkg_token(session)}"
+                    except RuntimeError as e:
+                        raise FetchError(f"⚠️ Login ulang gagal saat ambil {label}: {e}")
+                    continue
+
+                if response.status != 200:
+                    last_error = f"⚠️ Gagal ambil data {label} ({response.status})"
+                    if response.status not in RETRY_STATUS:
+                        raise FetchError(last_error)
+                else:
+                    try:
+                        result = await response.json()
+                    except Exception as e:
+                        text = await response.text()
+                        last_error = f"⚠️ Response bukan JSON untuk {label} ({e}): {text[:200]}"
+                    else:
+                        return result.get("items", [])
+
+        except FetchError:
+            raise
+
+        except asyncio.TimeoutError:
+            last_error = f"⏳ Timeout saat ambil {label}"
+
+        except aiohttp.ClientError as e:
+            last_error = f"❌ Error: {e}"
+
+        print(f"{last_error} — percobaan {attempt}/{MAX_RETRIES + 1}")
+
+    raise FetchError(f"{last_error} (gagal setelah {MAX_RETRIES + 1} percobaan, _from={params.get('_from')})")
+
+
+async def _iter_window_pages(token, session, type_message, start_date, end_date, start_offset=0):
+    """
+    Async generator: hasilkan tiap halaman (_from offset) satu jendela waktu begitu tiba.
+    Melempar FetchError jika satu halaman tetap gagal setelah semua retry.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
 
     params_base = {
         "type_name": "GTSMessage",
         "_metadata": "timestamp_data,cccc,station_wmo_id",
         "type_message": type_message,
-        "timestamp_data__gte": start_date.strftime("%Y-%m-%dT%H:%M:%S"),
-        "timestamp_data__lte": end_date.strftime("%Y-%m-%dT%H:%M:%S"),
+        "timestamp_data__gte": start_date.strftime(TS_FORMAT),
+        "timestamp_data__lte": end_date.strftime(TS_FORMAT),
         "_size": 10000
     }
+    label = f"{type_message} {start_date:%Y-%m-%d %H:%M} s/d {end_date:%Y-%m-%d %H:%M}"
 
-    all_data = []
-    offset = 0
+    offset = start_offset
 
     while True:
         params = dict(params_base)
         params["_from"] = offset
 
+        items = await _get_page(session, headers, params, label)
+        if not items:
+            return
+
+        offset += len(items)
+        yield items
+
+
+class _Checkpoint:
+    """Progres jendela-jendela satu pengambilan; diubah hanya di bawah lock miliknya."""
+
+    def __init__(self):
+        self.windows = {}  # (start, end) → {"offset", "items", "done"}
+        self.expires_at = time.monotonic() + CHECKPOINT_TTL
+        self.lock = threading.Lock()
+
+
+def _get_checkpoint(key):
+    """Checkpoint untuk kunci coalescing `key`; checkpoint yang kedaluwarsa dibuang dulu."""
+    now = time.monotonic()
+    with _checkpoints_lock:
+        for k in [k for k, cp in _checkpoints.items() if cp.expires_at <= now]:
+            del _checkpoints[k]
+        checkpoint = _checkpoints.get(key)
+        if checkpoint is None:
+            checkpoint = _checkpoints[key] = _Checkpoint()
+        return checkpoint
+
+
+def clear_checkpoints(key):
+    """Hapus checkpoint pengambilan yang sudah selesai lengkap."""
+    with _checkpoints_lock:
+        _checkpoints.pop(key, None)
+
+
+def _month_closed(end_date):
+    """Bulan tempat end_date berada sudah lewat (UTC), jadi isinya tidak bertambah lagi."""
+    _, akhir_bulan = month_range(end_date.year, end_date.month)
+    return akhir_bulan < datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def _fetch_window(token, session, type_message, start_date, end_date, checkpoint):
+    """
+    Ambil semua halaman (_from offset) untuk satu jendela waktu.
+    Tiap halaman yang sukses dicatat di checkpoint, sehingga pemanggilan ulang
+    setelah gagal melanjutkan dari offset terakhir, bukan dari awal.
+    Jendela yang sudah selesai hanya dipakai ulang untuk bulan yang sudah tertutup;
+    jendela bulan berjalan selalu diambil ulang supaya record baru ikut terbawa.
+    """
+    window = (start_date.strftime(TS_FORMAT), end_date.strftime(TS_FORMAT))
+    with checkpoint.lock:
+        state = checkpoint.windows.get(window)
+        if state is not None and state["done"]:
+            if _month_closed(end_date):
+                return FetchResult(list(state["items"]))
+            state = None
+        if state is None:
+            state = checkpoint.windows[window] = {"offset": 0, "items": [], "done": False}
+        offset = state["offset"]
+
+    try:
+        async for items in _iter_window_pages(
+            token, session, type_message, start_date, end_date, start_offset=offset
+        ):
+            with checkpoint.lock:
+                state["items"].extend(items)
+                state["offset"] += len(items)
+    except FetchError as e:
+        print(e)
+        with checkpoint.lock:
+            return FetchResult(list(state["items"]), complete=False, errors=[str(e)])
+
+    with checkpoint.lock:
+        state["done"] = True
+        return FetchResult(list(state["items"]))
+
+
+def _mark_incomplete(status, error):
+    print(error)
+    if status is not None:
+        status["complete"] = False
+        status.setdefault("errors", []).append(str(error))
+
+
+async def iter_gts_window_pages(token, session, type_message, start_date, end_date,
+                                shard=None, max_concurrency=MAX_CONCURRENCY, status=None,
+                                semaphore=None):
+    """
+    Versi streaming fetch_gts_window: hasilkan halaman record (list) begitu tiba,
+    tanpa mengumpulkan / mengurutkan seluruh bulan di memori.
+    Dengan shard, beberapa jendela diambil paralel dan halamannya diteruskan
+    lewat antrean sesuai urutan kedatangan (tidak terurut waktu).
+    status (dict, opsional) diisi "complete" dan "errors" sebagai penanda kelengkapan.
+    semaphore (opsional) menggantikan batas max_concurrency, mis. batas global fetch rentang.
+    """
+    if status is not None:
+        status.setdefault("complete", True)
+
+    if shard is None:
         try:
-            async with session.get(BASE_URL, 
-                                   headers=headers, 
-                                   params=params, 
-                                   timeout=aiohttp.ClientTimeout(total=90)
-                                   ) as response:
-               
-                if response.status != 200:
-                    print(f"⚠️ Gagal ambil data {type_message} ({response.status})")
-                    return[]
-                
-                try:  
-                    result = await response.json()
-                except Exception as e:
-                    text = await response.text()
-                    print(f"⚠️ Response bukan JSON untuk {type_message} ({e}): {text[:200]}")
-                    return []  # hentikan fungsi
-                
-                items = result.get("items", [])
-
-                if not items:
-                    break
-
-                all_data.extend(items)
-                offset += len(items)
+            async for items in _iter_window_pages(token, session, type_message, start_date, end_date):
+                yield items
+        except FetchError as e:
+            _mark_incomplete(status, e)
+        return
 
-        except asyncio.TimeoutError:
-            print(f"⏳ Timeout saat ambil {type_message} bulan {bulan} {tahun}")
-            break
-        
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            break
-
-    # Urutkan berdasarkan timestamp_data
-    all_data.sort(key=lambda x: x.get("timestamp_data", ""))
-    return all_data
+    windows = split_windows(start_date, end_date, shard)
+    semaphore = semaphore or asyncio.Semaphore(max(1, max_concurrency))
+    queue = asyncio.Queue(maxsize=max(1, max_concurrency) * 2)  # batasi halaman yang menumpuk
+    selesai = object()
+
+    async def _produce(window_start, window_end):
+        try:
+            async with semaphore:
+                async for items in _iter_window_pages(token, session, type_message, window_start, window_end):
+                    await queue.put(items)
+        except FetchError as e:
+            _mark_incomplete(status, e)
+        finally:
+            await queue.put(selesai)
+
+    tasks = [asyncio.create_task(_produce(ws, we)) for ws, we in windows]
+    try:
+        sisa = len(tasks)
+        while sisa:
+            items = await queue.get()
+            if items is selesai:
+                sisa -= 1
+                continue
+            yield items
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class _LeaderCancelled(Exception):
+    """Pengambilan bersama dibatalkan oleh pemiliknya; penunggu lain mengambil alih."""
+
+
+async def _coalesce(key, factory):
+    """
+    Jalankan factory() sekali untuk semua pemanggil bersamaan dengan key yang sama.
+    Pemanggil pertama (leader) menjalankan request di loop-nya sendiri; pemanggil lain
+    menunggu Future bersama dan menerima hasil (atau exception) yang sama.
+    Kalau leader dibatalkan (mis. sesinya ditutup), salah satu penunggu menjadi leader baru.
+    """
+    while True:
+        with _inflight_lock:
+            future = _inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                _inflight[key] = future
+
+        if not leader:
+            add_progress_total(1)
+            try:
+                # shield: pembatalan satu penunggu tidak ikut membatalkan Future bersama
+                result = await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                continue
+            advance_progress()
+            return result
+
+        try:
+            result = await factory()
+        except BaseException as e:
+            # kunci dilepas dulu sebelum Future diselesaikan, supaya penunggu yang
+            # mengulang (mis. setelah _LeaderCancelled) tidak mengambil Future yang sama lagi
+            _release(key, future)
+            future.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            raise
+        _release(key, future)
+        future.set_result(result)
+        return result
+
+
+def _release(key, future):
+    """Hapus pengambilan `key` dari _inflight, hanya bila masih Future milik pemanggil."""
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+async def fetch_gts_window(token, session, type_message, start_date, end_date,
+                           shard=None, max_concurrency=MAX_CONCURRENCY, semaphore=None):
+    """
+    Ambil data GTS untuk rentang waktu bebas.
+    shard=None  → satu rangkaian paginasi berurutan untuk seluruh rentang.
+    shard='hari' / 'jam' → rentang dipecah per jendela dan diambil paralel
+    (dibatasi max_concurrency, atau semaphore bila diberikan) memakai session yang sama.
+    Pemanggilan bersamaan untuk (type_message, rentang) yang sama digabung menjadi satu
+    pengambilan; semua pemanggil menerima FetchResult yang sama (jangan diubah di tempat).
+    Hasilnya FetchResult; cek .complete sebelum menganggap data satu rentang utuh.
+    """
+    return await _coalesce(
+        (type_message, start_date, end_date),
+        lambda: _fetch_gts_window(
+            token, session, type_message, start_date, end_date,
+            shard=shard, max_concurrency=max_concurrency, semaphore=semaphore,
+        ),
+    )
+
+
+async def _fetch_gts_window(token, session, type_message, start_date, end_date,
+                            shard=None, max_concurrency=MAX_CONCURRENCY, semaphore=None):
+    # hanya leader _coalesce yang sampai di sini, jadi satu kunci = satu pemakai checkpoint
+    key = (type_message, start_date, end_date)
+    checkpoint = _get_checkpoint(key)
+
+    if shard is None:
+        add_progress_total(1)
+        result = merge_records([
+            await _fetch_window(token, session, type_message, start_date, end_date, checkpoint)
+        ])
+        advance_progress()
+        if result.complete:
+            clear_checkpoints(key)
+        return result
+
+    windows = split_windows(start_date, end_date, shard)
+    semaphore = semaphore or asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _limited(window_start, window_end):
+        async with semaphore:
+            chunk = await _fetch_window(token, session, type_message, window_start, window_end, checkpoint)
+        advance_progress()  # progres job (lihat async_executor): satu jendela selesai
+        return chunk
+
+    add_progress_total(len(windows))
+    chunks = await asyncio.gather(*(
+        _limited(window_start, window_end)
+        for window_start, window_end in windows
+    ))
+    result = merge_records(chunks)
+    # Jendela yang sudah selesai tetap disimpan sampai semua jendela lengkap,
+    # supaya pemanggilan ulang hanya mengambil jendela yang gagal.
+    if result.complete:
+        clear_checkpoints(key)
+    return result
+
+
+async def fetch_gts_data(token, session, tahun, bulan, type_message,
+                         shard=None, max_concurrency=MAX_CONCURRENCY):
+    """
+    Ambil data GTS dari BMKG SATU berdasarkan bulan, tahun, dan jenis pesan.
+    type_message: 'METAR', 'SPECI', 'RASON'
+    shard: None (berurutan), 'hari', atau 'jam' untuk pengambilan paralel per jendela waktu.
+    """
+    # Hitung awal dan akhir bulan
+    start_date, end_date = month_range(tahun, bulan)
+    return await fetch_gts_window(
+        token, session, type_message, start_date, end_date,
+        shard=shard, max_concurrency=max_concurrency
+    )
+
+
+async def fetch_gts_data_sharded(token, session, tahun, bulan, type_message,
+                                 shard="hari", max_concurrency=MAX_CONCURRENCY):
+    """Varian fetch_gts_data yang selalu memakai mode sharding (default per hari)."""
+    return await fetch_gts_data(
+        token, session, tahun, bulan, type_message,
+        shard=shard, max_concurrency=max_concurrency
+    )
+
+
+# ==== Fetch rentang bebas (multi-bulan / multi-tahun) ====
+def _range_semaphore():
+    """Semaphore bersama untuk event loop yang sedang berjalan (batas global fetch rentang)."""
+    loop = asyncio.get_running_loop()
+    with _range_semaphores_lock:
+        for old_loop in [lp for lp in _range_semaphores if lp.is_closed()]:
+            _range_semaphores.pop(old_loop, None)
+        semaphore = _range_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(RANGE_MAX_CONCURRENCY)
+            _range_semaphores[loop] = semaphore
+        return semaphore
+
+
+def range_bounds(start, end):
+    """
+    Batas rentang [start, end] sebagai datetime.
+    date → awal hari untuk start, akhir hari (23:59:59) untuk end, sehingga end inklusif.
+    """
+    if not isinstance(start, datetime):
+        start = datetime(start.year, start.month, start.day)
+    if not isinstance(end, datetime):
+        end = datetime(end.year, end.month, end.day, 23, 59, 59)
+    if end < start:
+        raise ValueError(f"Rentang tidak valid: {start} > {end}")
+    return start, end
+
+
+async def _range_context(token, session):
+    session = session or await get_session()
+    token = token or await get_bmkg_token(session)
+    return token, session
+
+
+async def fetch_gts_range(start, end, type_message, shard="bulan", token=None, session=None):
+    """
+    Ambil data GTS untuk rentang tanggal bebas (mis. satu kuartal / satu tahun).
+    Rentang dipecah per bulan ('bulan') atau per hari ('hari' / 'jam') dan semua shard
+    diambil bersamaan, dibatasi semaphore global RANGE_MAX_CONCURRENCY yang dipakai
+    bersama oleh semua fetch rentang di event loop yang sama.
+    Session bersama dan token dari token manager dipakai bila tidak diberikan.
+    Hasilnya satu FetchResult gabungan, tanpa duplikat, terurut timestamp_data.
+    """
+    start_date, end_date = range_bounds(start, end)
+    token, session = await _range_context(token, session)
+    return await fetch_gts_window(
+        token, session, type_message, start_date, end_date,
+        shard=shard, semaphore=_range_semaphore()
+    )
+
+
+async def iter_gts_range(start, end, type_message, shard="bulan", token=None, session=None, status=None):
+    """
+    Versi streaming fetch_gts_range: halaman record dihasilkan begitu tiba
+    (urutan kedatangan, tidak terurut waktu); status diisi penanda kelengkapan.
+    """
+    start_date, end_date = range_bounds(start, end)
+    token, session = await _range_context(token, session)
+    async for items in iter_gts_window_pages(
+        token, session, type_message, start_date, end_date,
+        shard=shard, status=status, semaphore=_range_semaphore()
+    ):
+        yield items
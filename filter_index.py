@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+
+# ==== INDEKS FILTER (panel "Filter Lanjutan") ====
+# Hasil analisis bisa berisi setahun data untuk ribuan stasiun; menghitung ulang
+# mask isin di seluruh frame pada tiap rerun terasa lambat. Indeks ini dibangun sekali
+# per hasil analisis: kode kategori per kolom + array posisi baris per nilai,
+# sehingga filter cukup menggabung / mengiris array posisi baris.
+
+class FilterIndex:
+    """
+    Indeks baris per nilai untuk beberapa kolom DataFrame.
+    Posisi baris (untuk .iloc) per kunci disimpan terurut naik.
+    select() mengembalikan None kalau tidak ada baris yang tersaring (semua baris lolos).
+    """
+
+    def __init__(self, df, columns):
+        self.num_rows = len(df)
+        self._codes = {}
+        self._uniques = {}
+        self._rows = {}
+        for kolom in columns:
+            if kolom not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[kolom], sort=True)
+            codes = codes.astype(np.int32, copy=False)
+            order = np.argsort(codes, kind="stable")
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            start = int((codes < 0).sum())  # kode -1 (NaN) ada di depan, tidak diindeks
+            batas = start + np.cumsum(counts)
+            self._codes[kolom] = codes
+            self._uniques[kolom] = pd.Index(uniques)
+            self._rows[kolom] = np.split(order[start:], batas[:-1] - start) if len(uniques) else []
+
+    def __contains__(self, kolom):
+        return kolom in self._codes
+
+    def options(self, kolom, rows=None):
+        """Nilai unik kolom (terurut), opsional hanya yang muncul di posisi baris `rows`."""
+        uniques = self._uniques[kolom]
+        if rows is None:
+            return uniques.tolist()
+        kode = np.unique(self._codes[kolom][rows])
+        return uniques[kode[kode >= 0]].tolist()
+
+    def rows_for(self, kolom, values):
+        """Posisi baris yang nilainya ada di `values`; None kalau semua nilai terpilih."""
+        kode = self._uniques[kolom].get_indexer(list(values))
+        kode = np.unique(kode[kode >= 0])
+        if len(kode) == len(self._uniques[kolom]) and not (self._codes[kolom] < 0).any():
+            return None
+        if not len(kode):
+            return np.empty(0, dtype=np.intp)
+        if len(kode) == 1:
+            return self._rows[kolom][kode[0]]
+        return np.sort(np.concatenate([self._rows[kolom][k] for k in kode]))
+
+    def select(self, filters):
+        """
+        filters: { kolom: nilai-nilai yang dipilih } (None = kolom tidak difilter).
+        Hasil: irisan posisi baris dari semua filter, atau None kalau tidak ada yang tersaring.
+        """
+        rows = None
+        for kolom, values in filters.items():
+            if values is None or kolom not in self:
+                continue
+            r = self.rows_for(kolom, values)
+            if r is None:
+                continue
+            rows = r if rows is None else np.intersect1d(rows, r, assume_unique=True)
+        return rows
+
+    @staticmethod
+    def take(df, rows):
+        """
+        Irisan baris; tanpa filter → frame asli apa adanya (tanpa salinan).
+        Dengan filter, df.iloc[rows] menyalin baris-baris tersebut: untuk tabel cukup kirim
+        `rows` ke table_view.paginated_table, dan untuk pemakaian berulang tiap rerun pakai take_rows.
+        """
+        return df if rows is None else df.iloc[rows]
+
+
+_frame_cache = {}  # id(DataFrame) → (weakref DataFrame, {kunci: nilai turunan})
+_frame_cache_lock = threading.Lock()
+
+
+def cached_for_frame(df, key, build):
+    """
+    Nilai turunan dari `df` (indeks filter, agregat grafik, ...) yang dihitung sekali
+    per objek DataFrame. Hasil analisis yang di-memo (memo.py) dipakai bersama semua sesi,
+    jadi nilai turunannya juga; entri dibuang otomatis begitu DataFrame-nya tidak dipakai lagi.
+    """
+    frame_id = id(df)
+    with _frame_cache_lock:
+        entry = _frame_cache.get(frame_id)
+        if entry is not None and entry[0]() is df and key in entry[1]:
+            return entry[1][key]
+
+    nilai = build()
+    with _frame_cache_lock:
+        entry = _frame_cache.get(frame_id)
+        if entry is None or entry[0]() is not df:
+            if entry is None:
+                weakref.finalize(df, _frame_cache.pop, frame_id, None)
+            entry = (weakref.ref(df), {})
+            _frame_cache[frame_id] = entry
+        entry[1][key] = nilai
+    return nilai
+
+
+def take_rows(df, rows):
+    """
+    Seperti FilterIndex.take, tetapi salinan hasil filter terakhir per DataFrame dipakai ulang
+    selama posisi barisnya sama. Rerun dengan filter yang sama tidak menyalin ulang, dan
+    nilai turunan dari frame hasil filter (cached_for_frame) tetap kena cache.
+    Hanya satu hasil filter yang disimpan per DataFrame.
+    """
+    if rows is None:
+        return df
+    kunci = hashlib.sha1(np.ascontiguousarray(rows, dtype=np.intp).tobytes()).hexdigest()
+    terakhir = cached_for_frame(df, "take_rows", dict)
+    with _frame_cache_lock:
+        if terakhir.get("rows") == kunci:
+            return terakhir["frame"]
+    frame = df.iloc[rows]
+    with _frame_cache_lock:
+        terakhir.update(rows=kunci, frame=frame)
+    return frame
+
+
+def filter_index(df, columns):
+    """FilterIndex untuk hasil analisis `df`, dibangun sekali per objek DataFrame."""
+    columns = tuple(columns)
+    return cached_for_frame(df, ("filter_index", columns), lambda: FilterIndex(df, columns))
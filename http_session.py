@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import aiohttp
+
+# Satu ClientSession bersama per event loop, dipakai ulang oleh login, stasiun, dan fetch GTS.
+# Koneksi keep-alive + cache DNS membuat handshake TLS tidak diulang di tiap analisis.
+CONNECTOR_LIMIT = 32            # total koneksi terbuka
+CONNECTOR_LIMIT_PER_HOST = 16   # koneksi paralel ke bmkgsatu.bmkg.go.id
+KEEPALIVE_TIMEOUT = 60          # detik koneksi idle tetap dibuka
+DNS_CACHE_TTL = 600             # detik hasil DNS di-cache
+
+_sessions = {}  # event loop → aiohttp.ClientSession
+_sessions_lock = threading.Lock()
+
+
+def _new_session():
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTOR_LIMIT,
+        limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def get_session():
+    """
+    Ambil ClientSession bersama untuk event loop yang sedang berjalan.
+    Session aiohttp terikat ke satu loop, jadi tiap loop punya satu session;
+    session milik loop yang sudah ditutup dibuang otomatis.
+    """
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        for old_loop in [lp for lp in _sessions if lp.is_closed()]:
+            _sessions.pop(old_loop, None)
+
+        session = _sessions.get(loop)
+        if session is None or session.closed:
+            session = _new_session()
+            _sessions[loop] = session
+        return session
+
+
+async def close_session():
+    """Tutup session milik loop yang sedang berjalan (mis. saat shutdown)."""
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
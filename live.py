@@ -0,0 +1,199 @@
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+from analyzerMetar import MetarAccumulator
+from analyzerRason import RasonAccumulator, build_rason_bulanan, kv_list_to_dict
+from analyzerSpeci import SpeciAccumulator
+from fetcher import fetch_gts_window, month_range
+from station import StationRegistry
+from store import _storage_key, is_closed_month, parse_timestamp, utc_text
+
+# ==== MODE LIVE (BULAN BERJALAN) ====
+# Bulan berjalan tidak perlu diambil ulang sebulan penuh tiap kali diperbarui:
+# monitor mengingat timestamp_data terakhir per jenis pesan, hanya mengambil record
+# setelah titik itu, melipatnya ke akumulator analyzer, lalu membangun ulang
+# baris untuk tanggal yang tersentuh saja.
+
+LIVE_INITIAL_SHARD = "hari"  # pengambilan awal sebulan: paralel per hari
+
+_ACCUMULATORS = {
+    4: MetarAccumulator,   # METAR
+    3: RasonAccumulator,   # TEMP/RASON
+    5: SpeciAccumulator,   # SPECI
+}
+
+
+def _item_timestamp(item):
+    """
+    timestamp_data record (dict) atau periode (record RASON key-value), sebagai teks UTC
+    seragam (lihat store.utc_text) supaya bisa dibandingkan walau offsetnya campuran.
+    """
+    if isinstance(item, dict):
+        ts = item.get("timestamp_data")
+    elif isinstance(item, list):
+        ts = kv_list_to_dict(item).get("periode")
+    else:
+        ts = None
+    return (utc_text(ts) if ts else None) or ""
+
+
+def splice_days(cached, partial, tanggal, sort_by):
+    """
+    Ganti baris cached untuk tanggal-tanggal tertentu dengan baris hasil hitung ulang.
+    Kolom kategori (mis. Catatan) disatukan kategorinya sebelum digabung.
+    """
+    sisa = cached[~cached["Tanggal"].isin(tanggal)]
+    if partial.empty:
+        return sisa.reset_index(drop=True)
+
+    sisa, partial = sisa.copy(), partial.copy()
+    for kolom in sisa.columns.intersection(partial.columns):
+        if isinstance(sisa[kolom].dtype, pd.CategoricalDtype) and isinstance(partial[kolom].dtype, pd.CategoricalDtype):
+            kategori = sisa[kolom].cat.categories.union(partial[kolom].cat.categories, sort=False)
+            sisa[kolom] = sisa[kolom].cat.set_categories(kategori)
+            partial[kolom] = partial[kolom].cat.set_categories(kategori)
+
+    gabung = pd.concat([sisa, partial], ignore_index=True) if not sisa.empty else partial
+    return gabung.sort_values(sort_by, kind="stable").reset_index(drop=True)
+
+
+class LiveMonitor:
+    """
+    State live satu jenis pesan untuk satu bulan: akumulator analyzer,
+    timestamp_data terakhir yang sudah masuk, dan hasil analisis yang di-cache.
+    Hasil result() dipakai bersama semua sesi: jangan diubah di tempat.
+    """
+
+    def __init__(self, type_message, tahun, bulan, station_info_map):
+        self.type_message = type_message
+        self.tahun = tahun
+        self.bulan = bulan
+        self._lock = threading.Lock()
+        self._reset(StationRegistry.from_any(station_info_map))
+
+    def _reset(self, stations):
+        """Mulai dari kosong dengan registry `stations` (pembaruan berikutnya ambil sebulan penuh)."""
+        self.stations_fingerprint = stations.fingerprint
+        self.acc = _ACCUMULATORS[self.type_message](stations, self.tahun, self.bulan)
+        self.last_timestamp = None  # waktu (teks UTC) terbesar yang sudah dilipat
+        self.complete = True        # pengambilan terakhir lengkap?
+        self._boundary = set()      # kunci record ber-timestamp == last_timestamp (diambil ulang oleh filter gte)
+        self._results = {}          # mode interval METAR ("" untuk RASON/SPECI) → hasil analisis
+
+    def use_stations(self, station_info_map):
+        """Pakai registry terkini; kalau isinya berubah, state live dibangun ulang dari awal."""
+        stations = StationRegistry.from_any(station_info_map)
+        with self._lock:
+            if stations.fingerprint != self.stations_fingerprint:
+                self._reset(stations)
+
+    # ==== Ingest ====
+    def ingest(self, items):
+        """Lipat record baru ke akumulator; kembalikan tanggal (1..31) yang tersentuh."""
+        with self._lock:
+            baru, ts_baru = [], []
+            for item in items:
+                ts = _item_timestamp(item)
+                if self.last_timestamp:
+                    if ts < self.last_timestamp:
+                        continue  # sudah dilipat di pembaruan sebelumnya
+                    if ts == self.last_timestamp and _storage_key(item) in self._boundary:
+                        continue
+                baru.append(item)
+                ts_baru.append(ts)
+            if not baru:
+                return np.empty(0, dtype=np.int64)
+
+            days = self.acc.add_page(baru)
+
+            terbaru = max(ts_baru)
+            if terbaru != self.last_timestamp:
+                self.last_timestamp = terbaru
+                self._boundary = set()
+            self._boundary.update(_storage_key(item) for item, ts in zip(baru, ts_baru) if ts == terbaru)
+
+            if len(days):
+                self._update_results(days)
+            return days
+
+    def _update_results(self, days):
+        """Bangun ulang hanya baris untuk tanggal yang tersentuh pada setiap hasil yang di-cache."""
+        for varian, cached in list(self._results.items()):
+            self._results[varian] = self._recompute(cached, varian, days)
+
+    def _tanggal_labels(self, days):
+        return {f"{self.tahun:04d}-{self.bulan:02d}-{int(d):02d}" for d in days}
+
+    def _recompute(self, cached, varian, days):
+        if self.type_message == 4:
+            if cached.empty:
+                return self.acc.result(varian)
+            return splice_days(cached, self.acc.result(varian, days=days), self._tanggal_labels(days), "Nomor")
+
+        df_harian, _ = cached
+        if df_harian.empty or "Tanggal" not in df_harian:
+            return self.acc.result()
+
+        if self.type_message == 5:
+            part_harian, df_bulanan = self.acc.result(days=days)
+            df_harian = splice_days(df_harian, part_harian, self._tanggal_labels(days), ["ICAO", "Tanggal"])
+            return df_harian, df_bulanan
+
+        # RASON: Tanggal berupa datetime.date
+        part_harian, _ = self.acc.result(days=days)
+        tanggal = {date(self.tahun, self.bulan, int(d)) for d in days}
+        df_harian = splice_days(df_harian, part_harian, tanggal, ["WMO ID", "Nama Stasiun", "Tanggal"])
+        return df_harian, build_rason_bulanan(df_harian, self.tahun, self.bulan)
+
+    # ==== Fetch delta ====
+    async def refresh(self, token, session, station_info_map=None, fetch_func=fetch_gts_window):
+        """
+        Ambil record sejak timestamp_data terakhir (atau sebulan penuh saat pertama kali)
+        lalu lipat ke state. Pengambilan yang tidak lengkap tidak dilipat, sehingga
+        pembaruan berikutnya mengulang rentang yang sama (lanjut dari checkpoint halaman).
+        station_info_map: registry terkini dari pemanggil (lihat use_stations).
+        """
+        if station_info_map is not None:
+            self.use_stations(station_info_map)
+        start_date, end_date = month_range(self.tahun, self.bulan)
+        if self.last_timestamp:
+            try:
+                start_date = max(start_date, parse_timestamp(self.last_timestamp))
+            except ValueError:
+                pass
+
+        items = await fetch_func(
+            token, session, self.type_message, start_date, end_date,
+            shard=None if self.last_timestamp else LIVE_INITIAL_SHARD,
+        )
+        self.complete = getattr(items, "complete", True)
+        if not self.complete:
+            print(f"[WARNING] Pembaruan live type_message={self.type_message} belum lengkap, dicoba lagi nanti.")
+            return np.empty(0, dtype=np.int64)
+        return self.ingest(items)
+
+    def result(self, varian=""):
+        """Hasil analisis terkini (di-cache per mode interval METAR)."""
+        with self._lock:
+            if varian not in self._results:
+                self._results[varian] = self.acc.result(varian) if self.type_message == 4 else self.acc.result()
+            return self._results[varian]
+
+
+_monitors = {}  # (type_message, tahun, bulan) → LiveMonitor
+_monitors_lock = threading.Lock()
+
+
+def get_live_monitor(type_message, tahun, bulan, station_info_map):
+    """Monitor live bersama untuk seluruh proses; monitor bulan yang sudah tertutup dibuang."""
+    with _monitors_lock:
+        for key in [k for k in _monitors if is_closed_month(k[1], k[2]) and k[1:] != (tahun, bulan)]:
+            _monitors.pop(key, None)
+
+        key = (type_message, tahun, bulan)
+        monitor = _monitors.get(key)
+        if monitor is None:
+            monitor = LiveMonitor(type_message, tahun, bulan, station_info_map)
+            _monitors[key] = monitor
+        return monitor
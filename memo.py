@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import inspect
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+from station import StationRegistry
+from store import is_closed_month
+
+# ==== MEMOIZATION HASIL FETCH & ANALISIS (SELURUH PROSES) ====
+# Dipakai bersama semua sesi Streamlit: dua user yang membuka bulan yang sama
+# hanya membayar sekali, dan ganti mode interval METAR cukup analisis ulang
+# dari record mentah yang sudah di-cache.
+
+MEMO_CLOSED_TTL = int(os.environ.get("BMKG_MEMO_CLOSED_TTL", 24 * 3600))  # detik, bulan tertutup
+MEMO_OPEN_TTL = int(os.environ.get("BMKG_MEMO_OPEN_TTL", 10 * 60))        # detik, bulan berjalan
+MEMO_MAX_BYTES = int(os.environ.get("BMKG_MEMO_MAX_BYTES", 512 * 1024 * 1024))
+
+_SIZE_SAMPLE = 200  # jumlah record contoh untuk perkiraan ukuran list record
+
+
+def estimate_size(value):
+    """Perkiraan ukuran memori (byte) nilai yang di-cache: DataFrame, list record, atau tuple keduanya."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, tuple):
+        return sum(estimate_size(v) for v in value)
+    if isinstance(value, list):
+        if not value:
+            return sys.getsizeof(value)
+        step = max(1, len(value) // _SIZE_SAMPLE)
+        sample = value[::step]
+        # dict Python kira-kira 3x ukuran JSON-nya
+        per_item = sum(len(json.dumps(v, ensure_ascii=False, default=str)) for v in sample) / len(sample) * 3
+        return int(sys.getsizeof(value) + per_item * len(value))
+    return sys.getsizeof(value)
+
+
+def ttl_for(tahun, bulan):
+    """Bulan tertutup jarang berubah → TTL panjang; bulan berjalan → TTL pendek."""
+    return MEMO_CLOSED_TTL if is_closed_month(tahun, bulan) else MEMO_OPEN_TTL
+
+
+class MemoCache:
+    """
+    Cache LRU dengan TTL per entri dan batas total memori (perkiraan).
+    Kunci berupa tuple, mis. ("raw", type_message, tahun, bulan) atau
+    ("analysis", type_message, tahun, bulan, mode, hash_registry).
+    """
+
+    def __init__(self, max_bytes=MEMO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key → (value, nbytes, expires_at)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Nilai yang masih berlaku, atau None (entri kedaluwarsa langsung dibuang)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl):
+        nbytes = estimate_size(value)
+        if nbytes > self.max_bytes:
+            print(f"[WARNING] Hasil {key} terlalu besar untuk di-cache ({nbytes / 1e6:.0f} MB).")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, nbytes, time.monotonic() + ttl)
+            self._nbytes += nbytes
+            # buang entri yang paling lama tidak dipakai sampai muat
+            while self._nbytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._nbytes -= nbytes
+
+    def invalidate(self, type_message=None, tahun=None, bulan=None):
+        """
+        Buang entri yang cocok (None = semua nilai). Kunci berbentuk
+        (jenis_entri, type_message, tahun, bulan, ...). Mengembalikan jumlah entri yang dibuang.
+        """
+        with self._lock:
+            cocok = [
+                key for key in self._entries
+                if (type_message is None or key[1] == type_message)
+                and (tahun is None or key[2] == tahun)
+                and (bulan is None or key[3] == bulan)
+            ]
+            for key in cocok:
+                self._drop(key)
+            return len(cocok)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+memo_cache = MemoCache()
+
+
+def invalidate(type_message=None, tahun=None, bulan=None):
+    """Invalidasi eksplisit cache memo (mis. setelah data BMKG dikoreksi)."""
+    return memo_cache.invalidate(type_message, tahun, bulan)
+
+
+async def memo_fetch(fetch_func, token, session, tahun, bulan, type_message):
+    """
+    Record mentah satu bulan, dari cache bila masih berlaku.
+    Hanya hasil fetch yang lengkap yang di-cache, supaya halaman yang gagal tetap diambil ulang.
+    """
+    key = ("raw", type_message, tahun, bulan)
+    data = memo_cache.get(key)
+    if data is not None:
+        return data
+
+    data = await fetch_func(token, session, tahun, bulan, type_message)
+    if getattr(data, "complete", True):
+        memo_cache.put(key, data, ttl_for(tahun, bulan))
+    return data
+
+
+async def memo_analysis(type_message, tahun, bulan, variant, data, stations, compute):
+    """
+    Hasil analisis dari cache, atau hitung lewat compute() (fungsi biasa atau coroutine function).
+    Hanya disimpan bila data mentahnya lengkap. variant: mode interval METAR ("" untuk RASON/SPECI).
+    stations: registry yang dipakai analisis; hash isinya ikut jadi kunci, jadi registry
+    yang diperbarui tidak memakai hasil dari daftar stasiun lama.
+    Hasil di-cache dipakai bersama semua sesi: jangan diubah di tempat.
+    """
+    key = ("analysis", type_message, tahun, bulan, variant, StationRegistry.from_any(stations).fingerprint)
+    result = memo_cache.get(key)
+    if result is not None:
+        return result
+
+    result = compute()
+    if inspect.isawaitable(result):
+        result = await result
+    if getattr(data, "complete", True):
+        memo_cache.put(key, result, ttl_for(tahun, bulan))
+    return result
@@ -1,45 +1,216 @@
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
 from analyzerMetar import analyze_metar
 from analyzerRason import analyze_rason
 from analyzerSpeci import analyze_speci
+from live import get_live_monitor
+from memo import memo_analysis, memo_fetch
+from station import StationRegistry
+from trend import materialize_month
 
 # ==== FULL ANALYSIS RUNNER ====
 
 # berguna untuk sekali panggil --> dapat semua jenis data
 
-# async def run_full_analysis(tahun, bulan, interval_mode, token, session, fetch_func, station_info_map):
-#     """
-#     Ambil data METAR, RASON (TEMP), dan SPECI, lalu analisis lengkap.
-#     """
+ANALYSIS_WORKERS = 3  # satu proses per jenis pesan
 
-#     metar_data, rason_data, speci_data = await asyncio.gather(
-#         fetch_func(token, session, tahun, bulan, 4),  # METAR (type_message=4)
-#         fetch_func(token, session, tahun, bulan, 3),  # TEMP/RASON (type_message=3)
-#         fetch_func(token, session, tahun, bulan, 5),  # SPECI (type_message=5)
-#     )
+_executor = None
 
-#     df_metar = analyze_metar(metar_data, station_info_map, tahun, bulan, interval_mode)
-#     df_rason_harian, df_rason_bulanan = analyze_rason(rason_data, station_info_map, tahun, bulan)
-#     df_speci_harian, df_speci_bulanan = analyze_speci(speci_data, station_info_map, tahun, bulan)
 
-#     return df_metar, df_rason_harian, df_rason_bulanan, df_speci_harian, df_speci_bulanan
+def _get_executor():
+    """
+    Process pool bersama untuk analyzer (CPU-bound), dibuat sekali per proses.
+    Memakai 'spawn' karena proses Streamlit sudah punya banyak thread.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def _run_analyzer(func, *args):
+    """Jalankan analyzer di process pool; kalau pool rusak, pool diganti lalu dijalankan di thread."""
+    global _executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    except BrokenProcessPool:
+        _executor = None
+        return await loop.run_in_executor(None, func, *args)
+
+
+def build_scorecard(df_metar, df_rason_bulanan, df_speci_bulanan, station_info_map):
+    """
+    Gabungkan hasil METAR, RASON, dan SPECI menjadi satu rapor bulanan per stasiun.
+    METAR & SPECI digabung lewat ICAO, RASON lewat WMO ID.
+    """
+    stations = StationRegistry.from_any(station_info_map)
+    df_score = pd.DataFrame(
+        [
+            {"ICAO": icao, "WMO ID": str(info.get("wmo_id", "-")), "Nama Stasiun": info.get("stasiun", "-")}
+            for icao, info in stations.items()
+        ],
+        columns=["ICAO", "WMO ID", "Nama Stasiun"],
+    )
+
+    # METAR: total laporan masuk vs diharapkan selama sebulan
+    if not df_metar.empty:
+        metar = df_metar.groupby("ICAO").agg(
+            METAR_Masuk=("Laporan Masuk", "sum"),
+            METAR_Diharapkan=("Laporan Diharapkan", "sum"),
+        ).reset_index()
+        metar["Ketersediaan METAR (%)"] = (
+            metar["METAR_Masuk"] / metar["METAR_Diharapkan"].where(metar["METAR_Diharapkan"] > 0) * 100
+        ).round(1)
+        metar = metar.rename(columns={"METAR_Masuk": "METAR Masuk", "METAR_Diharapkan": "METAR Diharapkan"})
+        df_score = df_score.merge(metar, on="ICAO", how="left")
+
+    # SPECI: jumlah laporan sebulan (0 kalau tidak ada)
+    if not df_speci_bulanan.empty:
+        df_score = df_score.merge(
+            df_speci_bulanan[["ICAO", "Jumlah SPECI Bulanan"]], on="ICAO", how="left"
+        )
+        df_score["Jumlah SPECI Bulanan"] = df_score["Jumlah SPECI Bulanan"].fillna(0).astype(int)
+
+    # RASON: ketersediaan bulanan per WMO ID; stasiun RASON yang tidak punya ICAO tetap ditampilkan
+    if not df_rason_bulanan.empty:
+        # satu WMO ID bisa muncul dengan beberapa variasi nama → jumlahkan dulu per WMO ID
+        rason = df_rason_bulanan.groupby("WMO ID").agg(
+            **{
+                "Nama Stasiun RASON": ("Nama Stasiun", "first"),
+                "RASON Masuk": ("Jumlah Laporan", "sum"),
+                "Target RASON": ("Target Bulanan", "first"),
+            }
+        ).reset_index()
+        rason["Ketersediaan RASON (%)"] = (
+            rason["RASON Masuk"] / rason["Target RASON"] * 100
+        ).round(1).clip(upper=100)
+        rason = rason.drop(columns=["Target RASON"])
+        df_score = df_score.merge(rason, on="WMO ID", how="outer")
+        df_score["ICAO"] = df_score["ICAO"].fillna("-")
+        df_score["Nama Stasiun"] = df_score["Nama Stasiun"].fillna(df_score["Nama Stasiun RASON"])
+        df_score = df_score.drop(columns=["Nama Stasiun RASON"])
+
+    return df_score.sort_values(["ICAO", "WMO ID"]).reset_index(drop=True)
+
+
+async def run_full_analysis(tahun, bulan, interval_mode, token, session, fetch_func, station_info_map):
+    """
+    Ambil data METAR, RASON (TEMP), dan SPECI sekaligus (satu session & token),
+    lalu jalankan ketiga analyzer paralel di process pool dan buat rapor per stasiun.
+    """
+
+    metar_data, rason_data, speci_data = await asyncio.gather(
+        memo_fetch(fetch_func, token, session, tahun, bulan, 4),  # METAR (type_message=4)
+        memo_fetch(fetch_func, token, session, tahun, bulan, 3),  # TEMP/RASON (type_message=3)
+        memo_fetch(fetch_func, token, session, tahun, bulan, 5),  # SPECI (type_message=5)
+    )
+
+    # hasil analisis yang sudah ada di cache memo tidak dikirim ulang ke process pool
+    stations = StationRegistry.from_any(station_info_map)
+    df_metar, (df_rason_harian, df_rason_bulanan), (df_speci_harian, df_speci_bulanan) = await asyncio.gather(
+        memo_analysis(4, tahun, bulan, interval_mode, metar_data, stations,
+                      lambda: _run_analyzer(analyze_metar, metar_data, stations, tahun, bulan, interval_mode)),
+        memo_analysis(3, tahun, bulan, "", rason_data, stations,
+                      lambda: _run_analyzer(analyze_rason, rason_data, stations, tahun, bulan)),
+        memo_analysis(5, tahun, bulan, "", speci_data, stations,
+                      lambda: _run_analyzer(analyze_speci, speci_data, stations, tahun, bulan)),
+    )
+
+    df_metar, = mark_completeness([df_metar], getattr(metar_data, "complete", True))
+    df_rason_harian, df_rason_bulanan = mark_completeness(
+        [df_rason_harian, df_rason_bulanan], getattr(rason_data, "complete", True)
+    )
+    df_speci_harian, df_speci_bulanan = mark_completeness(
+        [df_speci_harian, df_speci_bulanan], getattr(speci_data, "complete", True)
+    )
+
+    df_scorecard = build_scorecard(df_metar, df_rason_bulanan, df_speci_bulanan, stations)
+    complete = all(getattr(data, "complete", True) for data in (metar_data, rason_data, speci_data))
+    df_scorecard, = mark_completeness([df_scorecard], complete)
+
+    # Bulan tertutup yang lengkap → simpan agregat bulanan untuk tren (lihat trend.py)
+    try:
+        materialize_month(
+            tahun, bulan, interval_mode, df_metar, df_rason_harian, df_speci_harian, complete=complete
+        )
+    except Exception as e:
+        print(f"[WARNING] Gagal menyimpan agregat bulanan {tahun}-{bulan:02d}: {e}")
+
+    return df_metar, df_rason_harian, df_rason_bulanan, df_speci_harian, df_speci_bulanan, df_scorecard
+
+
+def mark_completeness(frames, complete):
+    """
+    Tempelkan penanda kelengkapan fetch ke DataFrame hasil analisis (df.attrs),
+    supaya UI bisa memberi peringatan kalau ada halaman yang gagal diambil.
+    Hasil analisis bisa dipakai bersama (cache memo, monitor live), jadi attrs dipasang pada
+    salinan dangkal (data tidak disalin); yang dikembalikan adalah list salinan tersebut.
+    """
+    hasil = []
+    for df in frames:
+        df = df.copy(deep=False)
+        df.attrs["fetch_complete"] = bool(complete)
+        hasil.append(df)
+    return hasil
+
+
+def is_complete(df):
+    return df.attrs.get("fetch_complete", True)
 
 
 # fetch & analyze per jenis → ambil + analisis hanya jenis tertentu sesuai kebutuhan.
-# cocok untuk per tab
+# cocok untuk per tab. Record mentah & hasil analisis di-memo untuk seluruh proses (memo.py):
+# ganti mode interval METAR cukup menjalankan ulang analyze_metar, tanpa fetch ulang.
+# Analyzer dijalankan di thread supaya event loop latar bersama (async_executor) tidak tertahan.
 
 async def fetch_and_analyze_metar (token, session, tahun, bulan, interval_mode,station_info_map, fetch_func):
-    metar_data = await fetch_func(token, session, tahun, bulan, 4)
-    df_metar = analyze_metar(metar_data, station_info_map, tahun, bulan, interval_mode)
+    metar_data = await memo_fetch(fetch_func, token, session, tahun, bulan, 4)
+    df_metar = await memo_analysis(
+        4, tahun, bulan, interval_mode, metar_data, station_info_map,
+        lambda: asyncio.to_thread(analyze_metar, metar_data, station_info_map, tahun, bulan, interval_mode),
+    )
+    df_metar, = mark_completeness([df_metar], getattr(metar_data, "complete", True))
     return df_metar
 
 async def fetch_and_analyze_rason(token, session, tahun, bulan, station_info_map, fetch_func):
-    rason_data = await fetch_func(token, session, tahun, bulan, 3)
-    df_rason_harian, df_rason_bulanan = analyze_rason(rason_data, station_info_map, tahun, bulan)
-    return df_rason_harian, df_rason_bulanan
+    rason_data = await memo_fetch(fetch_func, token, session, tahun, bulan, 3)
+    df_rason_harian, df_rason_bulanan = await memo_analysis(
+        3, tahun, bulan, "", rason_data, station_info_map,
+        lambda: asyncio.to_thread(analyze_rason, rason_data, station_info_map, tahun, bulan),
+    )
+    return tuple(mark_completeness([df_rason_harian, df_rason_bulanan], getattr(rason_data, "complete", True)))
 
 async def fetch_and_analyze_speci(token, session, tahun, bulan, station_info_map, fetch_func):
-    speci_data = await fetch_func(token, session, tahun, bulan, 5)
-    df_speci_harian, df_speci_bulanan = analyze_speci(speci_data, station_info_map, tahun, bulan)
-    return df_speci_harian, df_speci_bulanan
+    speci_data = await memo_fetch(fetch_func, token, session, tahun, bulan, 5)
+    df_speci_harian, df_speci_bulanan = await memo_analysis(
+        5, tahun, bulan, "", speci_data, station_info_map,
+        lambda: asyncio.to_thread(analyze_speci, speci_data, station_info_map, tahun, bulan),
+    )
+    return tuple(mark_completeness([df_speci_harian, df_speci_bulanan], getattr(speci_data, "complete", True)))
+
+
+# live → bulan berjalan: hanya record setelah timestamp_data terakhir yang diambil,
+# lalu baris untuk tanggal yang tersentuh saja yang dihitung ulang (lihat live.py).
+
+async def live_analyze_metar(token, session, tahun, bulan, interval_mode, station_info_map):
+    monitor = get_live_monitor(4, tahun, bulan, station_info_map)
+    await monitor.refresh(token, session, station_info_map)
+    df_metar, = mark_completeness([monitor.result(interval_mode)], monitor.complete)
+    return df_metar
+
+async def live_analyze_rason(token, session, tahun, bulan, station_info_map):
+    monitor = get_live_monitor(3, tahun, bulan, station_info_map)
+    await monitor.refresh(token, session, station_info_map)
+    return tuple(mark_completeness(list(monitor.result()), monitor.complete))
 
+async def live_analyze_speci(token, session, tahun, bulan, station_info_map):
+    monitor = get_live_monitor(5, tahun, bulan, station_info_map)
+    await monitor.refresh(token, session, station_info_map)
+    return tuple(mark_completeness(list(monitor.result()), monitor.complete))
@@ -1,20 +1,281 @@
+from collections.abc import Mapping
+import os
+import json
+import hashlib
+import time
+import asyncio
+import threading
 import aiohttp
+from auth import get_bmkg_token, invalidate_token
+from http_session import close_session
 
 # Endpoint API BMKG SATU untuk data stasiun
 BMKG_STATION_URL = "https://bmkgsatu.bmkg.go.id/db/bmkgsatu/@search"
 
-async def fetch_all_stations_info(token: str, session: aiohttp.ClientSession) -> dict:
+# Cache metadata stasiun di disk, dipakai bersama semua sesi Streamlit
+STATION_CACHE_PATH = os.environ.get("BMKG_STATION_CACHE_PATH", os.path.join("data", "stations.json"))
+STATION_CACHE_TTL = int(os.environ.get("BMKG_STATION_CACHE_TTL", 6 * 3600))  # detik
+
+# ==== Manual mapping WMO → Nama Stasiun (fallback) ====
+station_map_manual = {
+    "96035": "Stasiun Meteorologi Kualanamu",
+    "96147": "Stasiun Meteorologi Ranai",
+    "96237": "Stasiun Meteorologi Depati Amir",
+    "96253": "Stasiun Meteorologi Fatmawati Soekarno",
+    "96509": "Stasiun Meteorologi Juwata",
+    "96581": "Stasiun Meteorologi Supadio",
+    "96633": "Stasiun Meteorologi Sultan Aji Muhammad Sulaiman Sepinggan",
+    "96645": "Stasiun Meteorologi Iskandar",
+
+    "96685": "Stasiun Meteorologi Syamsudin Noor",
+    "96749": "Stasiun Meteorologi Soekarno Hatta",
+    "96805": "Stasiun Meteorologi Tunggul wulung",
+    
+    "96935": "Stasiun Meteorologi Juanda",
+    "97230": "Stasiun Meteorologi I Gusti Ngurah Rai",
+    "97372": "Stasiun Meteorologi Eltari",
+    
+    "97502": "Stasiun Meteorologi Domine Eduard Osok",
+    "97560": "Stasiun Meteorologi Frans Kaisiepo",
+    "97690": "Stasiun Meteorologi Sentani",
+    "97980": "Stasiun Meteorologi Mopah",
+    "97686": "Stasiun Meteorologi Wamena",
+    "97300": "Stasiun Meteorologi Fransiskus Xaverius Seda"
+  
+    
+}
+
+
+def normalize_icao(code):
+    """Kode ICAO dinormalisasi: tanpa spasi, huruf besar."""
+    return str(code or "").strip().upper()
+
+
+def normalize_wmo(code):
+    """WMO ID dinormalisasi ke string tanpa spasi ("-" / kosong → "")."""
+    code = str(code if code is not None else "").strip()
+    return "" if code == "-" else code
+
+
+class StationRegistry(Mapping):
+    """
+    Registry metadata stasiun BMKG.
+    Berperilaku seperti dict { ICAO: info } (jadi kode lama yang memanggil
+    .items() / .get() / `in` tetap jalan), plus indeks WMO → stasiun yang dibangun
+    sekali dan fallback nama manual yang sudah digabung di awal.
+    """
+
+    def __init__(self, stations=None, manual_names=None):
+        self._by_icao = {}
+        self._by_wmo = {}     # WMO ID → (ICAO, info), stasiun pertama yang cocok
+        self._wmo_names = {}  # WMO ID → nama stasiun (BMKG, lalu fallback manual)
+
+        for icao, info in (stations or {}).items():
+            key = normalize_icao(icao)
+            if not key:
+                continue
+            self._by_icao[key] = info
+
+            wmo_id = normalize_wmo(info.get("wmo_id"))
+            if wmo_id and wmo_id not in self._by_wmo:
+                self._by_wmo[wmo_id] = (key, info)
+                self._wmo_names[wmo_id] = info.get("stasiun") or info.get("station_name") or f"Stasiun {wmo_id}"
+
+        manual = station_map_manual if manual_names is None else manual_names
+        for wmo_id, nama in manual.items():
+            self._wmo_names.setdefault(normalize_wmo(wmo_id), nama)
+        self._fingerprint = None
+
+    @classmethod
+    def from_any(cls, stations):
+        """Pakai registry apa adanya, atau bangun dari dict { ICAO: info } biasa."""
+        if isinstance(stations, cls):
+            return stations
+        return cls(stations)
+
+    # --- Mapping ICAO → info ---
+    def __getitem__(self, icao):
+        return self._by_icao[normalize_icao(icao)]
+
+    def __iter__(self):
+        return iter(self._by_icao)
+
+    def __len__(self):
+        return len(self._by_icao)
+
+    # --- Lookup ---
+    def by_icao(self, icao):
+        return self._by_icao.get(normalize_icao(icao))
+
+    def by_wmo(self, wmo_id):
+        """(ICAO, info) untuk WMO ID, atau None kalau tidak terdaftar di BMKG."""
+        return self._by_wmo.get(normalize_wmo(wmo_id))
+
+    def name_for_wmo(self, wmo_id):
+        """Nama stasiun untuk WMO ID: data BMKG dulu, lalu mapping manual."""
+        nama = self._wmo_names.get(normalize_wmo(wmo_id))
+        return nama or f"Stasiun {wmo_id or 'Unknown'}"
+
+    def to_dict(self):
+        """dict { ICAO: info } biasa (mis. untuk disimpan sebagai JSON)."""
+        return dict(self._by_icao)
+
+    @property
+    def fingerprint(self):
+        """Hash isi registry (metadata + nama WMO); berubah kalau daftar / info stasiun berubah."""
+        if self._fingerprint is None:
+            isi = json.dumps([self._by_icao, self._wmo_names], sort_keys=True, ensure_ascii=False, default=str)
+            self._fingerprint = hashlib.sha1(isi.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+
+class StationCache:
     """
-    Ambil metadata semua stasiun BMKG dalam bentuk dict keyed by ICAO code.
+    Cache metadata stasiun untuk seluruh proses + salinan di disk (JSON) dengan TTL.
+    - Ada salinan segar → langsung dipakai.
+    - Salinan kedaluwarsa → tetap dipakai, sementara refresh berjalan di thread latar.
+    - Belum ada salinan sama sekali → ambil dari BMKG dan tunggu hasilnya.
+    """
+
+    def __init__(self, path=STATION_CACHE_PATH, ttl=STATION_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._registry = None
+        self._fetched_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        return time.time() - self._fetched_at > self.ttl
+
+    def _load_disk(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return StationRegistry(data["stations"]), float(data["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _save_disk(self, registry, fetched_at):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": fetched_at, "stations": registry.to_dict()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)  # tulis atomik supaya proses lain tidak membaca file setengah jadi
+
+    async def _run_loader(self, loader):
+        try:
+            return await loader()
+        finally:
+            await close_session()  # loop milik thread refresh akan ditutup
+
+    def _refresh(self, loader):
+        """Ambil ulang dari BMKG (di loop sendiri); hasil kosong tidak menimpa cache lama."""
+        try:
+            registry = StationRegistry.from_any(asyncio.run(self._run_loader(loader)))
+            if registry:
+                fetched_at = time.time()
+                with self._lock:
+                    self._registry, self._fetched_at = registry, fetched_at
+                try:
+                    self._save_disk(registry, fetched_at)
+                except OSError as e:
+                    print(f"Gagal menyimpan cache stasiun: {e}")
+            return registry
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _start_background_refresh(self, loader):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _target():
+            try:
+                self._refresh(loader)
+            except Exception as e:
+                print(f"Refresh cache stasiun gagal, tetap memakai salinan lama: {e}")
+
+        threading.Thread(target=_target, name="station-cache-refresh", daemon=True).start()
+
+    def get(self, loader):
+        """
+        Kembalikan StationRegistry. loader: coroutine function tanpa argumen yang
+        mengambil daftar stasiun dari BMKG (dipanggil di event loop milik thread sendiri).
+        """
+        with self._lock:
+            registry = self._registry
+        if registry is None:
+            registry, fetched_at = self._load_disk()
+            if registry:
+                with self._lock:
+                    self._registry, self._fetched_at = registry, fetched_at
+
+        if registry:
+            if self._is_stale():
+                self._start_background_refresh(loader)
+            return registry
+
+        # Cold start: belum ada salinan sama sekali → tunggu hasil fetch
+        hasil = {}
+
+        def _target():
+            try:
+                hasil["registry"] = self._refresh(loader)
+            except BaseException as e:
+                hasil["error"] = e
+
+        with self._lock:
+            self._refreshing = True
+        worker = threading.Thread(target=_target, name="station-cache-load", daemon=True)
+        worker.start()
+        worker.join()
+        if "error" in hasil:
+            raise hasil["error"]
+        return hasil["registry"]
+
+    def invalidate(self):
+        """Paksa refresh pada pemanggilan get() berikutnya (salinan lama tetap dilayani)."""
+        with self._lock:
+            self._fetched_at = 0.0
+
+
+station_cache = StationCache()
+
+async def _request_stations(token, session, params):
+    """GET daftar stasiun; 401 → token di-invalidate, login ulang, lalu dicoba sekali lagi."""
+    for percobaan in range(2):
+        headers = {"Authorization": f"Bearer {token}"}
+        async with session.get(BMKG_STATION_URL, headers=headers, params=params, timeout=30) as response:
+            if response.status == 401 and percobaan == 0:
+                invalidate_token(token)
+                token = await get_bmkg_token(session)
+                continue
+
+            response.raise_for_status()
+
+            # Pastikan respon JSON valid
+            try:
+                return await response.json()
+            except aiohttp.ContentTypeError:
+                raise RuntimeError("Respon dari BMKG bukan JSON yang valid.")
+
+
+async def fetch_all_stations_info(token: str, session: aiohttp.ClientSession) -> StationRegistry:
+    """
+    Ambil metadata semua stasiun BMKG dalam bentuk registry keyed by ICAO code.
     
     Args:
         token (str): JWT token BMKG SATU
         session (aiohttp.ClientSession): Session HTTP untuk request async
         
     Returns:
-        dict: { ICAO: {stasiun, wmo_id, jam_operasi, sends_half_hourly} }
+        StationRegistry: { ICAO: {stasiun, wmo_id, jam_operasi, sends_half_hourly} } + indeks WMO
     """
-    headers = {"Authorization": f"Bearer {token}"}
     params = {
         "type_name": "BmkgStation",
         "_metadata": (
@@ -27,47 +288,40 @@ async def fetch_all_stations_info(token: str, session: aiohttp.ClientSession) ->
     station_map = {}
 
     try:
-        async with session.get(BMKG_STATION_URL, headers=headers, params=params, timeout=30) as response:
-            response.raise_for_status()
-
-            # Pastikan respon JSON valid
-            try:
-                data = await response.json()
-            except aiohttp.ContentTypeError:
-                raise RuntimeError("Respon dari BMKG bukan JSON yang valid.")
+        data = await _request_stations(token, session, params)
 
-            items = data.get("items", [])
-            for item in items:
-                icao = item.get("station_icao")
-                if not icao:
-                    continue  # skip jika tidak ada kode ICAO
+        items = data.get("items", [])
+        for item in items:
+            icao = item.get("station_icao")
+            if not icao:
+                continue  # skip jika tidak ada kode ICAO
 
-                # Ambil jam operasi, fallback ke 24 jam jika tidak valid
-                op_hours = item.get("station_operating_hours", 24)
-                if not isinstance(op_hours, int) or not (0 < op_hours <= 24):
-                    op_hours = 24
+            # Ambil jam operasi, fallback ke 24 jam jika tidak valid
+            op_hours = item.get("station_operating_hours", 24)
+            if not isinstance(op_hours, int) or not (0 < op_hours <= 24):
+                op_hours = 24
 
-                station_map[icao] = {
-                
-                    "stasiun": item.get("station_name", "-"),
-                    "wmo_id": str(item.get("station_wmo_id", "-")).strip(),
-                    "jam_operasi": op_hours,
-                    "sends_half_hourly": bool(item.get("is_metar_half_hourly", False))
-                }
+            station_map[icao] = {
+            
+                "stasiun": item.get("station_name", "-"),
+                "wmo_id": str(item.get("station_wmo_id", "-")).strip(),
+                "jam_operasi": op_hours,
+                "sends_half_hourly": bool(item.get("is_metar_half_hourly", False))
+            }
 
-        return station_map
+        return StationRegistry(station_map)
 
     except aiohttp.ClientResponseError as e:
         print(f"HTTP Error saat mengambil data stasiun: {e.status} - {e.message}")
-        return {}
+        return StationRegistry()
 
     except aiohttp.ClientError as e:
         print(f"Kesalahan koneksi saat mengambil data stasiun: {e}")
-        return {}
+        return StationRegistry()
 
     except Exception as e:
         print(f"Kesalahan tidak terduga saat mengambil data stasiun: {e}")
-        return {}
+        return StationRegistry()
     
     
 
@@ -0,0 +1,332 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+from fetcher import FetchResult, fetch_gts_window, month_range, record_key
+
+# Lokasi file SQLite penyimpanan pesan GTS mentah (bisa diganti lewat env)
+STORE_PATH = os.environ.get("BMKG_STORE_PATH", os.path.join("data", "gts_store.sqlite3"))
+# Pesan GTS bisa terlambat masuk; bulan baru dianggap final (tidak diambil lagi)
+# setelah masa tenggang ini lewat dari akhir bulan
+COMPLETE_GRACE_HOURS = int(os.environ.get("BMKG_STORE_COMPLETE_GRACE_HOURS", 72))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gts_message (
+    type_message   INTEGER NOT NULL,
+    tahun          INTEGER NOT NULL,
+    bulan          INTEGER NOT NULL,
+    record_key     TEXT    NOT NULL,
+    timestamp_data TEXT,
+    timestamp_utc  TEXT,
+    payload        TEXT    NOT NULL,
+    PRIMARY KEY (type_message, tahun, bulan, record_key)
+);
+CREATE TABLE IF NOT EXISTS gts_partition (
+    type_message INTEGER NOT NULL,
+    tahun        INTEGER NOT NULL,
+    bulan        INTEGER NOT NULL,
+    complete     INTEGER NOT NULL DEFAULT 0,
+    synced_until TEXT,
+    updated_at   TEXT,
+    PRIMARY KEY (type_message, tahun, bulan)
+);
+CREATE TABLE IF NOT EXISTS monthly_aggregate (
+    jenis        TEXT    NOT NULL,
+    varian       TEXT    NOT NULL DEFAULT '',
+    tahun        INTEGER NOT NULL,
+    bulan        INTEGER NOT NULL,
+    station      TEXT    NOT NULL,
+    wmo_id       TEXT,
+    icao         TEXT,
+    nama_stasiun TEXT,
+    expected     INTEGER,
+    received     INTEGER NOT NULL,
+    persen       REAL,
+    hari_lengkap INTEGER NOT NULL DEFAULT 0,
+    hari_parsial INTEGER NOT NULL DEFAULT 0,
+    hari_kosong  INTEGER NOT NULL DEFAULT 0,
+    hari_anomali INTEGER NOT NULL DEFAULT 0,
+    updated_at   TEXT,
+    PRIMARY KEY (jenis, varian, tahun, bulan, station)
+);
+"""
+
+# Kolom agregat bulanan per stasiun (lihat trend.py)
+AGGREGATE_COLUMNS = [
+    "station", "wmo_id", "icao", "nama_stasiun", "expected", "received", "persen",
+    "hari_lengkap", "hari_parsial", "hari_kosong", "hari_anomali",
+]
+
+
+def _storage_key(item):
+    """Kunci baris di store: uid / tuple dari fetcher, atau hash payload untuk record key-value."""
+    key = record_key(item)
+    if key is None:
+        payload = json.dumps(item, sort_keys=True, ensure_ascii=False)
+        return "sha1:" + hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    if isinstance(key, tuple):
+        return json.dumps(key, ensure_ascii=False)
+    return str(key)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_closed_month(tahun, bulan, now=None):
+    """Bulan dianggap tertutup bila akhir bulannya sudah lewat (UTC)."""
+    _, end_date = month_range(tahun, bulan)
+    return end_date < (now or _utcnow())
+
+
+def is_settled_month(tahun, bulan, now=None):
+    """Bulan tertutup yang masa tenggang pesan terlambatnya (COMPLETE_GRACE_HOURS) juga sudah lewat."""
+    _, end_date = month_range(tahun, bulan)
+    return end_date + timedelta(hours=COMPLETE_GRACE_HOURS) < (now or _utcnow())
+
+
+def parse_timestamp(ts):
+    """Ubah timestamp_data ISO (boleh berakhiran Z / offset) menjadi datetime UTC naive."""
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def utc_text(ts):
+    """
+    timestamp_data → teks UTC seragam (YYYY-MM-DDTHH:MM:SS) yang urutan teksnya kronologis,
+    walau sumbernya campuran "Z" dan offset +hh:mm. None kalau tidak bisa dibaca.
+    """
+    try:
+        return parse_timestamp(ts).isoformat(timespec="seconds")
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class GtsStore:
+    """
+    Penyimpanan lokal (SQLite) untuk record GTSMessage mentah,
+    dipartisi per (type_message, tahun, bulan).
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            kolom = {row[1] for row in conn.execute("PRAGMA table_info(gts_partition)")}
+            if "synced_until" not in kolom:  # store lama, sebelum ada kolom synced_until
+                conn.execute("ALTER TABLE gts_partition ADD COLUMN synced_until TEXT")
+            kolom = {row[1] for row in conn.execute("PRAGMA table_info(gts_message)")}
+            if "timestamp_utc" not in kolom:  # store lama, sebelum ada kolom timestamp_utc
+                conn.execute("ALTER TABLE gts_message ADD COLUMN timestamp_utc TEXT")
+                rows = conn.execute(
+                    "SELECT rowid, timestamp_data FROM gts_message WHERE timestamp_data IS NOT NULL"
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE gts_message SET timestamp_utc = ? WHERE rowid = ?",
+                    [(utc_text(ts), rowid) for rowid, ts in rows],
+                )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:  # commit / rollback otomatis
+                yield conn
+        finally:
+            conn.close()
+
+    def get_records(self, type_message, tahun, bulan):
+        """Semua record tersimpan untuk satu partisi, urut berdasarkan waktu (UTC)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM gts_message "
+                "WHERE type_message = ? AND tahun = ? AND bulan = ? "
+                "ORDER BY COALESCE(timestamp_utc, timestamp_data, '')",
+                (type_message, tahun, bulan),
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def latest_timestamp(self, type_message, tahun, bulan):
+        """Waktu record terbaru yang sudah tersimpan, teks UTC (None jika partisi kosong)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MAX(timestamp_utc) FROM gts_message "
+                "WHERE type_message = ? AND tahun = ? AND bulan = ?",
+                (type_message, tahun, bulan),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_records(self, type_message, tahun, bulan, items):
+        """Simpan record baru; record yang sudah ada (kunci sama) diabaikan."""
+        rows = []
+        for item in items:
+            ts = item.get("timestamp_data") if isinstance(item, dict) else None
+            rows.append((
+                type_message, tahun, bulan,
+                _storage_key(item),
+                ts, utc_text(ts),
+                json.dumps(item, ensure_ascii=False),
+            ))
+        if not rows:
+            return 0
+        with self._lock, self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO gts_message "
+                "(type_message, tahun, bulan, record_key, timestamp_data, timestamp_utc, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def partition_state(self, type_message, tahun, bulan):
+        """(complete, synced_until) untuk satu partisi; synced_until = batas data yang pasti utuh."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT complete, synced_until FROM gts_partition "
+                "WHERE type_message = ? AND tahun = ? AND bulan = ?",
+                (type_message, tahun, bulan),
+            ).fetchone()
+        if not row:
+            return False, None
+        return bool(row[0]), row[1]
+
+    def is_complete(self, type_message, tahun, bulan):
+        return self.partition_state(type_message, tahun, bulan)[0]
+
+    def mark_partition(self, type_message, tahun, bulan, complete, synced_until=None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO gts_partition (type_message, tahun, bulan, complete, synced_until, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (type_message, tahun, bulan) "
+                "DO UPDATE SET complete = excluded.complete, "
+                "synced_until = COALESCE(excluded.synced_until, gts_partition.synced_until), "
+                "updated_at = excluded.updated_at",
+                (type_message, tahun, bulan, int(complete), synced_until,
+                 _utcnow().isoformat(timespec="seconds")),
+            )
+
+
+    # ==== Agregat bulanan (hasil analisis, bukan pesan mentah) ====
+    def save_aggregates(self, jenis, tahun, bulan, df, varian=""):
+        """Simpan agregat per stasiun satu bulan; agregat lama bulan tsb diganti seluruhnya."""
+        now = _utcnow().isoformat(timespec="seconds")
+        rows = [
+            (jenis, varian, tahun, bulan, *row, now)
+            for row in df[AGGREGATE_COLUMNS].astype(object).where(df[AGGREGATE_COLUMNS].notna(), None)
+            .itertuples(index=False, name=None)
+        ]
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM monthly_aggregate WHERE jenis = ? AND varian = ? AND tahun = ? AND bulan = ?",
+                (jenis, varian, tahun, bulan),
+            )
+            conn.executemany(
+                f"INSERT INTO monthly_aggregate (jenis, varian, tahun, bulan, {', '.join(AGGREGATE_COLUMNS)}, updated_at) "
+                f"VALUES ({', '.join('?' * (len(AGGREGATE_COLUMNS) + 5))})",
+                rows,
+            )
+        return len(rows)
+
+    def load_aggregates(self, jenis, varian="", awal=None, akhir=None):
+        """
+        Agregat bulanan satu jenis pesan, opsional dibatasi periode (tahun, bulan) inklusif.
+        Kolom: tahun, bulan + AGGREGATE_COLUMNS.
+        """
+        query = (
+            f"SELECT tahun, bulan, {', '.join(AGGREGATE_COLUMNS)} FROM monthly_aggregate "
+            "WHERE jenis = ? AND varian = ?"
+        )
+        params = [jenis, varian]
+        if awal:
+            query += " AND tahun * 12 + bulan >= ?"
+            params.append(awal[0] * 12 + awal[1])
+        if akhir:
+            query += " AND tahun * 12 + bulan <= ?"
+            params.append(akhir[0] * 12 + akhir[1])
+        with self._connect() as conn:
+            return pd.read_sql_query(query + " ORDER BY tahun, bulan, station", conn, params=params)
+
+    def aggregated_months(self, jenis, varian=""):
+        """Himpunan (tahun, bulan) yang sudah punya agregat tersimpan."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT tahun, bulan FROM monthly_aggregate WHERE jenis = ? AND varian = ?",
+                (jenis, varian),
+            ).fetchall()
+        return {(tahun, bulan) for tahun, bulan in rows}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store():
+    """Instance GtsStore bersama untuk seluruh proses."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = GtsStore()
+        return _default_store
+
+
+async def fetch_gts_data_stored(token, session, tahun, bulan, type_message,
+                                shard="hari", store=None, **fetch_kwargs):
+    """
+    Pengganti fetch_gts_data yang membaca dari store lokal.
+    - Bulan tertutup yang sudah lengkap → langsung dari disk, tanpa request.
+    - Bulan berjalan (dan bulan yang baru lewat, masih dalam COMPLETE_GRACE_HOURS) → hanya ambil
+      record >= waktu terbaru dari pengambilan lengkap terakhir.
+    - Setelah masa tenggang lewat → satu kali ambil ulang sebulan penuh (pesan yang terlambat
+      masuk dengan timestamp lama ikut terbawa), baru partisi ditandai lengkap.
+    Jika pengambilan tidak lengkap, record yang didapat tetap disimpan tetapi batas
+    sinkron tidak dimajukan, sehingga percobaan berikutnya mengulang rentang yang sama
+    (dan melanjutkan dari checkpoint halaman di fetcher).
+    """
+    store = store or get_store()
+
+    complete, synced_until = store.partition_state(type_message, tahun, bulan)
+    if complete:
+        return FetchResult(store.get_records(type_message, tahun, bulan))
+
+    settled = is_settled_month(tahun, bulan)
+    start_date, end_date = month_range(tahun, bulan)
+
+    if synced_until and not settled:
+        try:
+            start_date = max(start_date, parse_timestamp(synced_until))
+        except ValueError:
+            pass
+
+    items = await fetch_gts_window(
+        token, session, type_message, start_date, end_date, shard=shard, **fetch_kwargs
+    )
+    store.save_records(type_message, tahun, bulan, items)
+
+    fetch_complete = getattr(items, "complete", True)
+    if fetch_complete:
+        store.mark_partition(
+            type_message, tahun, bulan,
+            # Hanya pengambilan sebulan penuh setelah masa tenggang yang menandai lengkap,
+            # dan hanya jika memang ada data yang terkumpul
+            complete=settled and bool(items),
+            synced_until=store.latest_timestamp(type_message, tahun, bulan),
+        )
+
+    return FetchResult(
+        store.get_records(type_message, tahun, bulan),
+        complete=fetch_complete,
+        errors=getattr(items, "errors", []),
+    )
@@ -0,0 +1,111 @@
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# ==== TABEL BERHALAMAN (SERVER-SIDE) ====
+# st.dataframe mengirim seluruh frame ke browser tiap rerun; untuk sebulan METAR itu
+# puluhan ribu baris + string Catatan yang panjang. Di sini pencarian, pengurutan, dan
+# pemotongan halaman dilakukan di server, lalu hanya halaman yang terlihat yang dikirim.
+
+PAGE_SIZES = (25, 50, 100, 250, 500)
+DEFAULT_PAGE_SIZE = 50
+TABLE_HEIGHT_ROWS = 20  # tinggi tabel (baris) sebelum di-scroll di dalam halaman
+
+
+def search_rows(df, teks, rows=None):
+    """
+    Posisi baris yang memuat `teks` (tanpa beda huruf besar/kecil) di kolom non-numerik.
+    Kolom kategori dicocokkan per kategori, bukan per baris.
+    rows (opsional): hanya cari di posisi baris ini; hasil tetap posisi di df.
+    """
+    mask = np.zeros(len(df) if rows is None else len(rows), dtype=bool)
+    for kolom in df.columns:
+        s = df[kolom] if rows is None else df[kolom].iloc[rows]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            cocok = np.flatnonzero(
+                pd.Index(s.cat.categories.astype(str)).str.contains(teks, case=False, regex=False)
+            )
+            mask |= np.isin(s.cat.codes.to_numpy(), cocok)
+        elif pd.api.types.is_numeric_dtype(s):
+            continue
+        else:
+            mask |= s.astype(str).str.contains(teks, case=False, regex=False).to_numpy(dtype=bool)
+    return np.flatnonzero(mask) if rows is None else np.asarray(rows)[mask]
+
+
+def sort_rows(df, kolom, ascending=True, rows=None):
+    """Posisi baris (untuk .iloc) terurut menurut `kolom`; nilai kosong di akhir, urutan stabil."""
+    nilai = df[kolom] if rows is None else df[kolom].iloc[rows]
+    urutan = nilai.reset_index(drop=True).sort_values(
+        ascending=ascending, kind="stable", na_position="last"
+    ).index.to_numpy()
+    return urutan if rows is None else np.asarray(rows)[urutan]
+
+
+def paginated_table(df, key, hide_columns=(), default_sort=None, page_sizes=PAGE_SIZES, rows=None):
+    """
+    Tampilkan df sebagai tabel berhalaman dengan pencarian & pengurutan di server.
+    key: prefix unik untuk widget di halaman ini. hide_columns: kolom yang tidak ditampilkan.
+    rows: posisi baris hasil filter (FilterIndex.select; None = semua baris). Frame asli
+    tidak disalin; hanya baris halaman yang terlihat yang diambil.
+    """
+    kolom_tampil = [c for c in df.columns if c not in hide_columns]
+    if df.empty or not kolom_tampil or (rows is not None and not len(rows)):
+        st.dataframe(df.iloc[:0] if rows is not None else df, use_container_width=True, column_order=kolom_tampil)
+        return
+
+    col_cari, col_urut, col_arah, col_ukuran = st.columns([3, 2, 1, 1])
+    teks = col_cari.text_input("🔎 Cari", key=f"{key}_cari", placeholder="ICAO, nama stasiun, catatan...")
+    opsi_urut = ["(urutan asli)", *kolom_tampil]
+    urut = col_urut.selectbox(
+        "Urutkan", opsi_urut,
+        index=opsi_urut.index(default_sort) if default_sort in opsi_urut else 0,
+        key=f"{key}_urut",
+    )
+    arah = col_arah.selectbox("Arah", ["Naik", "Turun"], key=f"{key}_arah")
+    ukuran = col_ukuran.selectbox(
+        "Baris/hal.", page_sizes,
+        index=page_sizes.index(DEFAULT_PAGE_SIZE) if DEFAULT_PAGE_SIZE in page_sizes else 0,
+        key=f"{key}_ukuran",
+    )
+
+    jumlah_baris = len(df) if rows is None else len(rows)
+    if teks.strip():
+        rows = search_rows(df, teks.strip(), rows=rows)
+    if urut != "(urutan asli)":
+        rows = sort_rows(df, urut, ascending=arah == "Naik", rows=rows)
+    total = len(df) if rows is None else len(rows)
+
+    # pencarian / urutan / ukuran / filter berubah → kembali ke halaman 1
+    jumlah_halaman = max(1, math.ceil(total / ukuran))
+    tanda = (teks, urut, arah, ukuran, jumlah_baris)
+    if st.session_state.get(f"{key}_tanda") != tanda:
+        st.session_state[f"{key}_tanda"] = tanda
+        st.session_state[f"{key}_halaman"] = 1
+    elif st.session_state.get(f"{key}_halaman", 1) > jumlah_halaman:
+        st.session_state[f"{key}_halaman"] = jumlah_halaman
+
+    awal = (st.session_state.get(f"{key}_halaman", 1) - 1) * ukuran
+    # hanya baris halaman ini yang diserialisasi ke browser
+    halaman_df = df.iloc[awal:awal + ukuran] if rows is None else df.iloc[rows[awal:awal + ukuran]]
+
+    st.dataframe(
+        halaman_df,
+        use_container_width=True,
+        column_order=kolom_tampil,
+        height=min(len(halaman_df), TABLE_HEIGHT_ROWS) * 35 + 38,
+    )
+
+    col_info, col_halaman = st.columns([4, 1])
+    if total:
+        col_info.caption(
+            f"Menampilkan baris {awal + 1:,}–{awal + len(halaman_df):,} dari {total:,} "
+            f"(halaman {awal // ukuran + 1} dari {jumlah_halaman})"
+        )
+    else:
+        col_info.caption("Tidak ada baris yang cocok dengan pencarian.")
+    col_halaman.number_input(
+        "Halaman", min_value=1, max_value=jumlah_halaman, step=1,
+        key=f"{key}_halaman",
+    )
@@ -0,0 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzerMetar import analyze_metar
+
+
+STATIONS = {"WIII": {"wmo_id": "96749", "stasiun": "Stamet Soekarno-Hatta", "jam_operasi": 24}}
+
+
+def test_icao_record_dinormalisasi():
+    # cccc huruf kecil / berspasi tetap dihitung untuk stasiun WIII
+    data = [{"cccc": "wiii ", "timestamp_data": "2024-01-05T06:00:00Z"}]
+    df = analyze_metar(data, STATIONS, 2024, 1, "Otomatis")
+    baris = df[(df["ICAO"] == "WIII") & (df["Tanggal"] == "2024-01-05")]
+    assert baris["Laporan Masuk"].tolist() == [1]
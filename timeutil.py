@@ -0,0 +1,114 @@
+from datetime import datetime
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+
+# Bentuk umum timestamp_data BMKG SATU: "YYYY-MM-DD", "YYYY-MM-DDTHH:MM[:SS]" (+ opsional Z / ±HH:MM).
+# d = digit ASCII, T = "T" atau spasi, S = "+" / "-". Bentuk lain (pecahan detik, format basic,
+# dll.) jatuh ke jalur datetime.fromisoformat per elemen.
+_FAST_LAYOUTS = [
+    "dddd-dd-dd",
+    "dddd-dd-ddTdd:dd",
+    "dddd-dd-ddTdd:ddZ",
+    "dddd-dd-ddTdd:ddSdd:dd",
+    "dddd-dd-ddTdd:dd:dd",
+    "dddd-dd-ddTdd:dd:ddZ",
+    "dddd-dd-ddTdd:dd:ddSdd:dd",
+]
+_FAST_WIDTH = max(len(layout) for layout in _FAST_LAYOUTS)
+_HARI_PER_BULAN = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _match_layout(codes, layout):
+    """Mask baris (array kode karakter) yang persis mengikuti layout."""
+    ok = np.ones(len(codes), dtype=bool)
+    for pos, ch in enumerate(layout):
+        c = codes[:, pos]
+        if ch == "d":
+            ok &= (c >= ord("0")) & (c <= ord("9"))
+        elif ch == "T":
+            ok &= (c == ord("T")) | (c == ord(" "))
+        elif ch == "S":
+            ok &= (c == ord("+")) | (c == ord("-"))
+        else:
+            ok &= c == ord(ch)
+    return ok
+
+
+def _digits(codes, pos, width):
+    out = np.zeros(len(codes), dtype=np.int64)
+    for i in range(pos, pos + width):
+        out = out * 10 + (codes[:, i].astype(np.int64) - ord("0"))
+    return out
+
+
+def parse_iso_wallclock(values):
+    """
+    Parse banyak timestamp ISO sekaligus, setara dengan
+    datetime.fromisoformat(ts.replace("Z", "+00:00")) per elemen: tanggal & jam dibaca
+    apa adanya (jam dinding sesuai offset di string, tidak dikonversi ke UTC).
+
+    Returns:
+        dict of numpy array: year, month, day, minute (menit sejak 00:00), valid (bool)
+    """
+    values = list(values)
+    n = len(values)
+    year = np.zeros(n, dtype=np.int64)
+    month = np.zeros(n, dtype=np.int64)
+    day = np.zeros(n, dtype=np.int64)
+    minute = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+    if n == 0:
+        return {"year": year, "month": month, "day": day, "minute": minute, "valid": valid}
+
+    is_str = np.fromiter((type(v) is str for v in values), dtype=bool, count=n)
+    panjang = np.fromiter((len(v) if type(v) is str else -1 for v in values), dtype=np.int64, count=n)
+    pendek = panjang <= _FAST_WIDTH
+
+    # Kode karakter [baris, posisi] untuk string pendek, tanpa loop per karakter di Python
+    teks = np.array([v if ok else "" for v, ok in zip(values, is_str & pendek)], dtype=f"U{_FAST_WIDTH}")
+    codes = teks.view(np.uint32).reshape(n, _FAST_WIDTH)
+
+    fast = np.zeros(n, dtype=bool)
+    for layout in _FAST_LAYOUTS:
+        rows = np.flatnonzero(panjang == len(layout))
+        if not len(rows):
+            continue
+        sub = codes[rows]
+        rows = rows[_match_layout(sub, layout)]
+        if not len(rows):
+            continue
+        sub = codes[rows]
+        fast[rows] = True
+
+        y, mo, d = _digits(sub, 0, 4), _digits(sub, 5, 2), _digits(sub, 8, 2)
+        h = _digits(sub, 11, 2) if len(layout) > 10 else np.zeros(len(rows), dtype=np.int64)
+        mi = _digits(sub, 14, 2) if len(layout) > 10 else np.zeros(len(rows), dtype=np.int64)
+        ok = (y >= 1) & (mo >= 1) & (mo <= 12) & (h < 24) & (mi < 60)
+        if layout[16:19] == ":dd":
+            ok &= _digits(sub, 17, 2) < 60
+        if "S" in layout:
+            tz = layout.index("S")
+            # offset harus < 24 jam (menit offset boleh ≥ 60, seperti fromisoformat)
+            ok &= _digits(sub, tz + 1, 2) * 60 + _digits(sub, tz + 4, 2) < MINUTES_PER_DAY
+
+        # Validasi hari dalam bulan (termasuk kabisat)
+        kabisat = ((y % 4 == 0) & (y % 100 != 0)) | (y % 400 == 0)
+        maks_hari = _HARI_PER_BULAN[np.clip(mo, 0, 12)] + ((mo == 2) & kabisat)
+        ok &= (d >= 1) & (d <= maks_hari)
+
+        year[rows], month[rows], day[rows] = y, mo, d
+        minute[rows] = h * 60 + mi
+        valid[rows] = ok
+
+    # Jalur lambat untuk string yang tidak cocok pola cepat
+    for i in np.flatnonzero(is_str & ~fast):
+        try:
+            dt = datetime.fromisoformat(values[i].replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        year[i], month[i], day[i] = dt.year, dt.month, dt.day
+        minute[i] = dt.hour * 60 + dt.minute
+        valid[i] = True
+
+    return {"year": year, "month": month, "day": day, "minute": minute, "valid": valid}
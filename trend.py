@@ -0,0 +1,224 @@
+import calendar
+import numpy as np
+import pandas as pd
+from analyzerMetar import STATUS_ANOMALI, STATUS_KOSONG, STATUS_KURANG, STATUS_OK, status_code
+from store import AGGREGATE_COLUMNS, get_store, is_closed_month
+
+# ==== AGREGAT BULANAN & TREN ====
+# Hasil analisis bulan yang sudah tertutup diringkas menjadi satu baris per stasiun
+# (diharapkan, masuk, persen, jumlah hari per status) dan disimpan di store.
+# Tren 3/6/12 bulan, selisih tahun-ke-tahun, dan peringkat dihitung dari agregat ini saja,
+# tanpa mengambil / mem-parsing ulang pesan GTS.
+
+ROLLING_WINDOWS = (3, 6, 12)
+TREND_MONTHS = 12  # panjang tampilan tren default
+
+
+def _periode(tahun, bulan):
+    """Nomor bulan berurutan (tahun * 12 + bulan - 1) supaya selisih bulan cukup dikurangkan."""
+    return tahun * 12 + bulan - 1
+
+
+def _persen(received, expected):
+    expected = pd.Series(expected, dtype="float64")
+    return (pd.Series(received, dtype="float64") / expected.where(expected > 0) * 100).round(1)
+
+
+# ==== Ringkas hasil analisis → agregat per stasiun ====
+def summarize_metar(df_metar):
+    """Agregat bulanan METAR per ICAO dari DataFrame analyze_metar."""
+    if df_metar.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+
+    kode = status_code(df_metar["Laporan Masuk"].to_numpy(), df_metar["Laporan Diharapkan"].to_numpy())
+    df = pd.DataFrame({
+        "station": df_metar["ICAO"].to_numpy(),
+        "wmo_id": df_metar["WMO ID"].to_numpy(),
+        "nama_stasiun": df_metar["Nama Stasiun"].to_numpy(),
+        "expected": df_metar["Laporan Diharapkan"].to_numpy(),
+        "received": df_metar["Laporan Masuk"].to_numpy(),
+        "hari_lengkap": kode == STATUS_OK,
+        "hari_parsial": kode == STATUS_KURANG,
+        "hari_kosong": kode == STATUS_KOSONG,
+        "hari_anomali": kode == STATUS_ANOMALI,
+    })
+    agg = df.groupby("station", sort=True).agg(
+        wmo_id=("wmo_id", "first"),
+        nama_stasiun=("nama_stasiun", "first"),
+        expected=("expected", "sum"),
+        received=("received", "sum"),
+        hari_lengkap=("hari_lengkap", "sum"),
+        hari_parsial=("hari_parsial", "sum"),
+        hari_kosong=("hari_kosong", "sum"),
+        hari_anomali=("hari_anomali", "sum"),
+    ).reset_index()
+    agg["icao"] = agg["station"]
+    agg["persen"] = _persen(agg["received"], agg["expected"])
+    return agg[AGGREGATE_COLUMNS]
+
+
+def summarize_rason(df_rason_harian, tahun, bulan):
+    """Agregat bulanan RASON per WMO ID (target = 2 pengamatan per hari)."""
+    if df_rason_harian.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+
+    # satu WMO ID bisa punya beberapa variasi nama → jumlahkan dulu per (WMO ID, Tanggal)
+    per_hari = df_rason_harian.groupby(["WMO ID", "Tanggal"]).agg(
+        nama_stasiun=("Nama Stasiun", "first"),
+        jumlah=("Jumlah Laporan", "sum"),
+    ).reset_index()
+    jumlah = per_hari["jumlah"].to_numpy()
+    per_hari["hari_lengkap"] = jumlah == 2
+    per_hari["hari_parsial"] = (jumlah > 0) & (jumlah < 2)
+    per_hari["hari_anomali"] = jumlah > 2
+
+    jumlah_hari = calendar.monthrange(tahun, bulan)[1]
+    agg = per_hari.groupby("WMO ID", sort=True).agg(
+        nama_stasiun=("nama_stasiun", "first"),
+        received=("jumlah", "sum"),
+        hari_ada=("jumlah", lambda s: int((s > 0).sum())),
+        hari_lengkap=("hari_lengkap", "sum"),
+        hari_parsial=("hari_parsial", "sum"),
+        hari_anomali=("hari_anomali", "sum"),
+    ).reset_index().rename(columns={"WMO ID": "station"})
+    agg["wmo_id"] = agg["station"]
+    agg["icao"] = None
+    agg["expected"] = jumlah_hari * 2
+    agg["hari_kosong"] = jumlah_hari - agg["hari_ada"]
+    agg["persen"] = _persen(agg["received"], agg["expected"]).clip(upper=100)
+    return agg[AGGREGATE_COLUMNS]
+
+
+def summarize_speci(df_speci_harian):
+    """Agregat bulanan SPECI per ICAO (tidak ada target → expected/persen kosong)."""
+    if df_speci_harian.empty:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+
+    agg = df_speci_harian.groupby("ICAO", sort=True).agg(
+        wmo_id=("WMO ID", "first"),
+        nama_stasiun=("Nama Stasiun", "first"),
+        received=("Jumlah SPECI Harian", "sum"),
+        hari_lengkap=("Tanggal", "nunique"),  # hari yang punya SPECI
+    ).reset_index().rename(columns={"ICAO": "station"})
+    agg["icao"] = agg["station"]
+    agg["expected"] = None
+    agg["persen"] = np.nan
+    agg["hari_parsial"] = agg["hari_kosong"] = agg["hari_anomali"] = 0
+    return agg[AGGREGATE_COLUMNS]
+
+
+def materialize_month(tahun, bulan, interval_mode, df_metar, df_rason_harian, df_speci_harian,
+                      complete=True, store=None):
+    """
+    Simpan agregat bulanan hasil analisis gabungan.
+    Hanya bulan yang sudah tertutup dan pengambilannya lengkap yang disimpan,
+    supaya tren tidak dibangun dari data setengah jadi. Mengembalikan True bila tersimpan.
+    """
+    if not complete or not is_closed_month(tahun, bulan):
+        return False
+
+    store = store or get_store()
+    store.save_aggregates("METAR", tahun, bulan, summarize_metar(df_metar), varian=interval_mode)
+    store.save_aggregates("RASON", tahun, bulan, summarize_rason(df_rason_harian, tahun, bulan))
+    store.save_aggregates("SPECI", tahun, bulan, summarize_speci(df_speci_harian))
+    return True
+
+
+def missing_months(jenis, tahun, bulan, months=TREND_MONTHS, varian="", store=None):
+    """Bulan tertutup dalam jendela tren yang belum punya agregat (urut lama → baru)."""
+    store = store or get_store()
+    ada = store.aggregated_months(jenis, varian)
+    akhir = _periode(tahun, bulan)
+    hasil = []
+    for p in range(akhir - months + 1, akhir + 1):
+        th, bl = divmod(p, 12)
+        if (th, bl + 1) not in ada and is_closed_month(th, bl + 1):
+            hasil.append((th, bl + 1))
+    return hasil
+
+
+# ==== Trend engine ====
+def _grid(agg, kolom, periode):
+    """Matriks [stasiun × periode] dari agregat; bulan tanpa agregat diisi 0."""
+    return agg.pivot_table(index="station", columns="periode", values=kolom, aggfunc="sum").reindex(
+        columns=periode, fill_value=0
+    ).fillna(0)
+
+
+def rolling_availability(agg, windows=ROLLING_WINDOWS):
+    """
+    Ketersediaan bergulir per stasiun per bulan: total masuk / total diharapkan
+    selama N bulan terakhir (bulan tanpa agregat tidak ikut dihitung).
+    Hasil: DataFrame panjang (station, tahun, bulan, persen, roll_3, roll_6, ...).
+    """
+    if agg.empty:
+        return pd.DataFrame(columns=["station", "tahun", "bulan", "persen", *[f"roll_{n}" for n in windows]])
+
+    agg = agg.assign(periode=_periode(agg["tahun"], agg["bulan"]))
+    periode = np.arange(agg["periode"].min(), agg["periode"].max() + 1)
+    received = _grid(agg, "received", periode)
+    expected = _grid(agg, "expected", periode)
+
+    hasil = {"persen": received / expected.where(expected > 0) * 100}
+    for n in windows:
+        r = received.T.rolling(n, min_periods=1).sum().T
+        e = expected.T.rolling(n, min_periods=1).sum().T
+        hasil[f"roll_{n}"] = r / e.where(e > 0) * 100
+
+    df = pd.concat({k: v.stack() for k, v in hasil.items()}, axis=1).round(1).reset_index()
+    df["tahun"], df["bulan"] = df["periode"] // 12, df["periode"] % 12 + 1
+    # hanya bulan yang memang punya agregat untuk stasiun tsb
+    ada = agg[["station", "periode"]].drop_duplicates()
+    df = df.merge(ada, on=["station", "periode"], how="inner")
+    return df.drop(columns="periode")[["station", "tahun", "bulan", "persen", *[f"roll_{n}" for n in windows]]]
+
+
+def yoy_delta(agg, tahun, bulan):
+    """Selisih ketersediaan (poin persen) bulan ini vs bulan yang sama tahun lalu, per stasiun."""
+    kini = agg[(agg["tahun"] == tahun) & (agg["bulan"] == bulan)].set_index("station")["persen"]
+    lalu = agg[(agg["tahun"] == tahun - 1) & (agg["bulan"] == bulan)].set_index("station")["persen"]
+    return (kini - lalu.reindex(kini.index)).round(1).rename("yoy")
+
+
+def station_ranking(roll, tahun, bulan, window=TREND_MONTHS):
+    """Peringkat stasiun (1 = terbaik) berdasarkan ketersediaan bergulir N bulan pada bulan tsb."""
+    kolom = f"roll_{window}"
+    kini = roll[(roll["tahun"] == tahun) & (roll["bulan"] == bulan)].set_index("station")[kolom]
+    return kini.rank(ascending=False, method="min").astype("Int64").rename("rank")
+
+
+def trend_table(jenis, tahun, bulan, varian="", months=TREND_MONTHS, windows=ROLLING_WINDOWS, store=None):
+    """
+    Tabel tren per stasiun untuk bulan (tahun, bulan), dibaca dari agregat tersimpan:
+    ketersediaan bulan ini, rata-rata bergulir 3/6/12 bulan, selisih YoY, dan peringkat.
+    """
+    store = store or get_store()
+    akhir = _periode(tahun, bulan)
+    # ambil secukupnya: jendela terpanjang + pembanding tahun lalu
+    awal = divmod(akhir - max(max(windows), months, 13) + 1, 12)
+    agg = store.load_aggregates(jenis, varian, awal=(awal[0], awal[1] + 1), akhir=(tahun, bulan))
+    if agg.empty:
+        return pd.DataFrame()
+
+    roll = rolling_availability(agg, windows)
+    kini = roll[(roll["tahun"] == tahun) & (roll["bulan"] == bulan)].set_index("station")
+    if kini.empty:
+        return pd.DataFrame()
+
+    info = agg.sort_values(["tahun", "bulan"]).groupby("station")[["wmo_id", "icao", "nama_stasiun"]].last()
+    df = kini.join(info).join(yoy_delta(agg, tahun, bulan)).join(station_ranking(roll, tahun, bulan, max(windows)))
+    df = df.reset_index().sort_values(["rank", "station"], na_position="last")
+
+    return df.rename(columns={
+        "station": "Stasiun",
+        "wmo_id": "WMO ID",
+        "icao": "ICAO",
+        "nama_stasiun": "Nama Stasiun",
+        "persen": "Ketersediaan (%)",
+        **{f"roll_{n}": f"Rata-rata {n} Bulan (%)" for n in windows},
+        "yoy": "Δ Tahun Lalu (poin)",
+        "rank": "Peringkat",
+    })[
+        ["Peringkat", "Stasiun", "WMO ID", "ICAO", "Nama Stasiun", "Ketersediaan (%)",
+         *[f"Rata-rata {n} Bulan (%)" for n in windows], "Δ Tahun Lalu (poin)"]
+    ].reset_index(drop=True)
@@ -1,7 +1,18 @@
+import os
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 from plotly.express import colors
+from filter_index import cached_for_frame
+
+# Grafik garis dengan banyak titik (banyak stasiun × hari) lambat kalau digambar sebagai SVG.
+# Di atas WEBGL_POINT_THRESHOLD titik → Scattergl (WebGL); di atas TEXT_POINT_THRESHOLD
+# label angka per titik & marker dihilangkan supaya grafik tetap terbaca dan ringan.
+WEBGL_POINT_THRESHOLD = int(os.environ.get("BMKG_WEBGL_POINT_THRESHOLD", 1000))
+TEXT_POINT_THRESHOLD = int(os.environ.get("BMKG_TEXT_POINT_THRESHOLD", 150))
+HEATMAP_ROW_HEIGHT = 14  # piksel per stasiun di heatmap
 
 
 def fix_figure_colors(fig):
@@ -20,7 +31,104 @@ def safe_export_png(fig, filename):
     except Exception:
         st.plotly_chart(fig, use_container_width=True)
         st.warning("PNG export gagal, tampilkan chart langsung")
-        
+
+
+def line_chart(df, x, y, color, title, text_digits=None, **kwargs):
+    """
+    px.line per stasiun yang menyesuaikan kepadatan data:
+    sedikit titik → SVG + marker + label angka; banyak titik → WebGL tanpa label.
+    """
+    n_titik = len(df)
+    padat = n_titik > TEXT_POINT_THRESHOLD
+    if text_digits is not None and not padat:
+        df = df.assign(_label=df[y].round(text_digits))
+        kwargs["text"] = "_label"
+    fig = px.line(
+        df, x=x, y=y, color=color, title=title,
+        markers=not padat,
+        render_mode="webgl" if n_titik > WEBGL_POINT_THRESHOLD else "svg",
+        color_discrete_sequence=px.colors.qualitative.Vivid,
+        **kwargs,
+    )
+    if "text" in kwargs:
+        fig.update_traces(textposition="top center")
+    return fig
+
+
+def station_day_matrix(df, station_col, day_col, value_col, fill=np.nan):
+    """
+    Matriks [stasiun × hari] (nilai dijumlah bila ada beberapa baris per sel).
+    Sel tanpa baris diisi `fill`. Hasil: (daftar stasiun, daftar hari, matriks).
+    """
+    st_codes, stations = pd.factorize(df[station_col], sort=True)
+    day_codes, days = pd.factorize(df[day_col], sort=True)
+    ok = (st_codes >= 0) & (day_codes >= 0)
+    st_codes, day_codes = st_codes[ok], day_codes[ok]
+    nilai = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)[ok]
+
+    z = np.zeros((len(stations), len(days)))
+    ada = np.zeros((len(stations), len(days)), dtype=bool)
+    np.add.at(z, (st_codes, day_codes), np.nan_to_num(nilai))
+    ada[st_codes, day_codes] = True
+    z[~ada] = fill
+    return list(stations), list(days), z
+
+
+def availability_heatmap(df, station_col, day_col, value_col, title, fill=np.nan,
+                         colorscale="Blues", zmin=None, zmax=None, colorbar_title=""):
+    """
+    Heatmap stasiun × hari untuk seluruh jaringan dalam satu trace.
+    Matriksnya di-cache per objek df, jadi frame hasil filter sebaiknya dari filter_index.take_rows
+    (objek yang sama selama filternya sama).
+    """
+    # NaN tidak sama dengan dirinya sendiri → pakai penanda tetap di kunci cache
+    stations, days, z = cached_for_frame(
+        df, ("heatmap", station_col, day_col, value_col, "nan" if pd.isna(fill) else fill),
+        lambda: station_day_matrix(df, station_col, day_col, value_col, fill),
+    )
+    fig = go.Figure(go.Heatmap(
+        z=z, x=[str(d) for d in days], y=stations,
+        colorscale=colorscale, zmin=zmin, zmax=zmax,
+        colorbar=dict(title=colorbar_title),
+        hovertemplate="%{y}<br>%{x}<br>%{z}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=title,
+        height=int(np.clip(len(stations) * HEATMAP_ROW_HEIGHT + 150, 350, 1400)),
+        yaxis=dict(autorange="reversed", type="category"),
+        xaxis=dict(type="category"),
+    )
+    return fig
+
+
+def _group_codes(series):
+    """Kode grup + label grup (kolom kategori pakai kategorinya langsung)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    return pd.factorize(series, sort=True)
+
+
+def group_mean(df, key_col, value_col):
+    """Rata-rata value_col per key_col lewat bincount (pengganti groupby().mean())."""
+    codes, labels = _group_codes(df[key_col])
+    nilai = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)
+    ok = (codes >= 0) & ~np.isnan(nilai)
+    jumlah = np.bincount(codes[ok], weights=nilai[ok], minlength=len(labels))
+    banyak = np.bincount(codes[ok], minlength=len(labels))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rata = jumlah / banyak
+    out = pd.DataFrame({key_col: np.asarray(labels), value_col: rata})
+    return out[banyak > 0]
+
+
+def category_counts(series):
+    """Jumlah baris per nilai (hanya yang muncul), lewat bincount kode kategori."""
+    codes, labels = _group_codes(series)
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    ada = counts > 0
+    return pd.DataFrame({"Status": np.asarray(labels)[ada], "Jumlah": counts[ada]})
+
+
 # === Visualisasi METAR ===
 # === Visualisasi METAR ===
 # === Visualisasi METAR ===
@@ -28,7 +136,16 @@ def show_metar_visualizations(df_metar: pd.DataFrame, return_figs=True):
     st.markdown("<h4 style='color:#0d47a1;'>⚠️ Visualisasi Laporan METAR</h4>", unsafe_allow_html=True)
     figs = []
 
-    daftar_stasiun = df_metar["ICAO"].unique().tolist()
+    # agregat untuk bar & pie dihitung sekali per hasil (lihat cached_for_frame)
+    mean_df = cached_for_frame(
+        df_metar, "viz_metar_mean",
+        lambda: group_mean(df_metar, "ICAO", "Ketersediaan (%)").sort_values(
+            by="Ketersediaan (%)", ascending=False, kind="stable"
+        ),
+    )
+    pie_data = cached_for_frame(df_metar, "viz_metar_pie", lambda: category_counts(df_metar["Catatan"]))
+
+    daftar_stasiun = pd.unique(df_metar["ICAO"]).tolist()
     stasiun_terpilih = st.multiselect(
         "Pilih Stasiun untuk Ditampilkan di Grafik:",
         options=daftar_stasiun,
@@ -38,26 +155,27 @@ def show_metar_visualizations(df_metar: pd.DataFrame, return_figs=True):
     df_filter = df_metar[df_metar["ICAO"].isin(stasiun_terpilih)]
 
     if not df_filter.empty:
-        # Line chart per stasiun
-        fig1 = px.line(
-            df_filter,
-            x="Tanggal",
-            y="Ketersediaan (%)",
-            color="ICAO",
-            markers=True,
-            title="Tren Ketersediaan Harian METAR per Stasiun",
-            color_discrete_sequence=px.colors.qualitative.Vivid
+        # Line chart per stasiun (WebGL & tanpa label angka kalau titiknya banyak)
+        fig1 = line_chart(
+            df_filter, "Tanggal", "Ketersediaan (%)", "ICAO",
+            title="Tren Ketersediaan Harian METAR per Stasiun", text_digits=1,
         )
-        fig1.update_traces(text=df_filter["Ketersediaan (%)"].round(1), textposition='top center')
         st.plotly_chart(fig1, use_container_width=True)
         figs.append(("tren_ketersediaan.png", fig1))
     else:
         st.info("Silakan pilih minimal satu stasiun untuk menampilkan grafik.")
 
-    # Bar chart rata-rata ketersediaan - continuous color
-    mean_df = df_metar.groupby("ICAO")["Ketersediaan (%)"].mean().reset_index()
-    mean_df = mean_df.sort_values(by="Ketersediaan (%)", ascending=False)
+    # Heatmap seluruh jaringan: stasiun × hari dalam satu trace
+    if not df_metar.empty:
+        fig_heat = availability_heatmap(
+            df_metar, "ICAO", "Tanggal", "Ketersediaan (%)",
+            title="Peta Ketersediaan METAR (Stasiun × Hari)",
+            zmin=0, zmax=100, colorbar_title="%",
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
+        figs.append(("heatmap_ketersediaan.png", fig_heat))
 
+    # Bar chart rata-rata ketersediaan - continuous color
     fig4 = px.bar(
         mean_df,
         x="ICAO",
@@ -65,7 +183,7 @@ def show_metar_visualizations(df_metar: pd.DataFrame, return_figs=True):
         color="Ketersediaan (%)",  # gunakan numerik untuk continuous
         color_continuous_scale=px.colors.sequential.Blues,  
         title="Rata-rata Ketersediaan METAR per Stasiun",
-        text=mean_df["Ketersediaan (%)"].round(1)
+        text=mean_df["Ketersediaan (%)"].round(1) if len(mean_df) <= TEXT_POINT_THRESHOLD else None
     )
     fig4.update_traces(textposition='outside')
     fig4.update_layout(uniformtext_minsize=8, uniformtext_mode='hide')
@@ -73,9 +191,7 @@ def show_metar_visualizations(df_metar: pd.DataFrame, return_figs=True):
     figs.append(("bar_avg_ketersediaan_continuous.png", fig4))
 
 
-    # Pie chart status
-    pie_data = df_metar["Catatan"].value_counts().reset_index()
-    pie_data.columns = ["Status", "Jumlah"]
+    # Pie chart status (Catatan kategori yang tidak muncul setelah filter sudah dibuang)
     fig2 = px.pie(
         pie_data,
         names="Status",
@@ -103,8 +219,8 @@ def show_rason_visualizations(df_rason_harian: pd.DataFrame,
     st.markdown("<h4 style='color:#0d47a1;'>⚠️ Visualisasi Laporan RASON </h4>", unsafe_allow_html=True)
     figs = []
 
-    dfh = df_rason_harian.copy()
-    dfb = df_rason_bulanan.copy()
+    dfh = df_rason_harian
+    dfb = df_rason_bulanan
    
     # Filter stasiun
     stasiun_list = dfh["Nama Stasiun"].dropna().unique().tolist()
@@ -113,22 +229,34 @@ def show_rason_visualizations(df_rason_harian: pd.DataFrame,
                                       default=stasiun_list[:3])
 
     if stasiun_selected:
-        df_day = dfh[dfh["Nama Stasiun"].isin(stasiun_selected)].copy()
-        df_day["Total Laporan"] = df_day[["00Z", "12Z"]].notna().sum(axis=1)
+        df_day = dfh[dfh["Nama Stasiun"].isin(stasiun_selected)]
+        df_day = df_day.assign(**{"Total Laporan": df_day[["00Z", "12Z"]].notna().sum(axis=1)})
 
         # --- Grafik 1: Time Series jumlah laporan per hari
-        fig_daily = px.line(
-            df_day,
-            x="Tanggal", y="Total Laporan",
-            color="Nama Stasiun",
+        fig_daily = line_chart(
+            df_day, "Tanggal", "Total Laporan", "Nama Stasiun",
             title=f"Jumlah Laporan Harian Per Stasiun",
-            markers=True,
-            color_discrete_sequence=px.colors.qualitative.Vivid
         )
         fig_daily.update_yaxes(range=[-0.1, 2.1], dtick=1, title="Jumlah Laporan (0–2)")
         st.plotly_chart(fig_daily, use_container_width=True)
         figs.append((f"time_series_rason.png", fig_daily))
 
+    # --- Heatmap seluruh stasiun RASON: jumlah pengamatan per hari (0–2)
+    if not dfh.empty and "Tanggal" in dfh:
+        df_total = cached_for_frame(
+            dfh, "viz_rason_total",
+            lambda: dfh[["Nama Stasiun", "Tanggal"]].assign(
+                **{"Total Laporan": dfh[["00Z", "12Z"]].notna().sum(axis=1)}
+            ),
+        )
+        fig_heat = availability_heatmap(
+            df_total, "Nama Stasiun", "Tanggal", "Total Laporan",
+            title="Peta Pengamatan RASON (Stasiun × Hari)",
+            fill=0, zmin=0, zmax=2, colorbar_title="Laporan",
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
+        figs.append(("heatmap_rason.png", fig_heat))
+
     
     # --- Grafik 3: Bar Chart per stasiun
     dfb_sorted = dfb.sort_values(by="Ketersediaan (%)", ascending=False).reset_index(drop=True)
@@ -154,7 +282,7 @@ def show_rason_visualizations(df_rason_harian: pd.DataFrame,
         x="Nama Stasiun", y="Ketersediaan (%)",
         color="Highlight",
         color_discrete_map=color_map,
-        text=dfb_sorted["Ketersediaan (%)"].round(1),
+        text=dfb_sorted["Ketersediaan (%)"].round(1) if len(dfb_sorted) <= TEXT_POINT_THRESHOLD else None,
         hover_data=["Jumlah Laporan"],
         title="Ketersediaan Bulanan RASON per Stasiun"
     )
@@ -171,8 +299,9 @@ def show_rason_visualizations(df_rason_harian: pd.DataFrame,
 
 
     # --- Pie Chart Persentase Laporan 00Z vs 12Z ---
-    total_00z = dfh["00Z"].notna().sum()
-    total_12z = dfh["12Z"].notna().sum()
+    total_00z, total_12z = cached_for_frame(
+        dfh, "viz_rason_pie", lambda: (int(dfh["00Z"].notna().sum()), int(dfh["12Z"].notna().sum()))
+    )
 
     df_pie = pd.DataFrame({
         "Jam": ["00Z", "12Z"],
@@ -211,7 +340,7 @@ def show_speci_visualizations(df_speci_harian: pd.DataFrame, df_speci_bulanan: p
     figs = []
 
     # --- 1. Line Chart SPECI Harian per Stasiun ---
-    daftar_stasiun = df_speci_harian["ICAO"].unique().tolist()
+    daftar_stasiun = pd.unique(df_speci_harian["ICAO"]).tolist()
     stasiun_terpilih = st.multiselect(
         "Pilih Stasiun untuk Ditampilkan di Grafik:",
         options=daftar_stasiun,
@@ -222,19 +351,10 @@ def show_speci_visualizations(df_speci_harian: pd.DataFrame, df_speci_bulanan: p
     df_filter_speci = df_speci_harian[df_speci_harian["ICAO"].isin(stasiun_terpilih)]
 
     if not df_filter_speci.empty:
-        fig_harian = px.line(
-            df_filter_speci,
-            x="Tanggal",
-            y="Jumlah SPECI Harian",
-            color="ICAO",
-            markers=True,
-            title="Jumlah SPECI Harian per Stasiun",
-            color_discrete_sequence=px.colors.qualitative.Vivid,
-            hover_data=["Nama Stasiun"]
-        )
-        fig_harian.update_traces(
-            text=df_filter_speci["Jumlah SPECI Harian"].round(1),
-            textposition="top center"
+        fig_harian = line_chart(
+            df_filter_speci, "Tanggal", "Jumlah SPECI Harian", "ICAO",
+            title="Jumlah SPECI Harian per Stasiun", text_digits=1,
+            hover_data=["Nama Stasiun"],
         )
         fig_harian.update_layout(template="plotly_white")
         st.plotly_chart(fig_harian, use_container_width=True)
@@ -242,17 +362,30 @@ def show_speci_visualizations(df_speci_harian: pd.DataFrame, df_speci_bulanan: p
     else:
         st.info("Silakan pilih minimal satu stasiun untuk menampilkan grafik.")
 
-    df_sorted = df_speci_bulanan.sort_values(by="Jumlah SPECI Bulanan", ascending=False)
+    # --- Heatmap seluruh jaringan: jumlah SPECI per stasiun × hari (hari tanpa SPECI = 0)
+    if not df_speci_harian.empty and "Tanggal" in df_speci_harian:
+        fig_heat = availability_heatmap(
+            df_speci_harian, "ICAO", "Tanggal", "Jumlah SPECI Harian",
+            title="Peta SPECI Harian (Stasiun × Hari)",
+            fill=0, colorscale="Oranges", zmin=0, colorbar_title="SPECI",
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
+        figs.append(("heatmap_speci.png", fig_heat))
 
     # --- 2. Top 10 Stasiun Kirim SPECI Terbanyak ---
-    top10 = df_sorted[df_sorted["Jumlah SPECI Bulanan"] > 0].head(10)
+    top10 = cached_for_frame(
+        df_speci_bulanan, "viz_speci_top10",
+        lambda: df_speci_bulanan[df_speci_bulanan["Jumlah SPECI Bulanan"] > 0].sort_values(
+            by="Jumlah SPECI Bulanan", ascending=False
+        ).head(10),
+    )
 
     fig_top10 = px.bar(
         top10,
         x="ICAO", y="Jumlah SPECI Bulanan",
         color="Jumlah SPECI Bulanan",
         color_continuous_scale=px.colors.sequential.Blues,
-        hover_data=["Nama Stasiun"],
+        hover_data=["Nama Stasiun", "Jam Puncak (UTC)"],
         title="Top 10 Stasiun dengan SPECI Terbanyak",
         text="Jumlah SPECI Bulanan"
     )